@@ -0,0 +1,113 @@
+"""
+Authorization claims in access tokens
+
+Access tokens carry the user's admin flag ("admin") and auth_version
+("ver") next to "sub". With AUTH_TRUST_TOKEN_CLAIMS enabled,
+require_admin and routes that only need the caller's id and admin flag
+use those verified claims instead of loading the User row.
+
+Demoting an admin bumps users.auth_version, and tokens with an older
+"ver" are refused. Each process caches users' current auth_version for
+AUTH_VERSION_CACHE_SECONDS, so a change made through this process applies
+on the next request and one made elsewhere applies within that window.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import hooks, metrics
+from app.core.config import settings
+from app.models.user import User
+
+VERSION_CACHE_MAX_ENTRIES = 100_000
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The caller as described by a verified access token."""
+    id: int
+    admin: bool
+    version: int
+
+
+def access_token_claims(user: User) -> dict:
+    return {"sub": str(user.id), "admin": bool(user.admin), "ver": user.auth_version}
+
+
+def principal_from_claims(claims: dict) -> Optional[Principal]:
+    """Principal for tokens that carry authorization claims, else None."""
+    admin = claims.get("admin")
+    version = claims.get("ver")
+    if not isinstance(admin, bool) or not isinstance(version, int):
+        return None
+    try:
+        return Principal(id=int(claims["sub"]), admin=admin, version=version)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class AuthVersionCache:
+    """user id -> current auth_version, each entry trusted for ttl seconds."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def put(self, user_id: int, version: int) -> None:
+        with self._lock:
+            if len(self._entries) >= VERSION_CACHE_MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[user_id] = (version, time.monotonic())
+
+    def discard(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+version_cache = AuthVersionCache(settings.AUTH_VERSION_CACHE_SECONDS)
+
+
+def current_auth_version(db: Session, user_id: int, at_least: int = 0) -> Optional[int]:
+    """
+    The user's auth_version, from the cache when possible. A cached value
+    older than at_least (a token minted after the cache was filled) is
+    refreshed. Returns None for users that no longer exist.
+    """
+    version = version_cache.get(user_id)
+    if version is not None and version >= at_least:
+        metrics.inc("auth.version_cache_hits")
+        return version
+    metrics.inc("auth.version_lookups")
+    version = db.scalar(select(User.auth_version).where(User.id == user_id))
+    if version is not None:
+        version_cache.put(user_id, version)
+    return version
+
+
+def is_current(db: Session, principal: Principal) -> bool:
+    """Whether the token's authorization claims are still valid."""
+    current = current_auth_version(db, principal.id, at_least=principal.version)
+    if current is None or principal.version < current:
+        metrics.inc("auth.tokens_outdated")
+        return False
+    return True
+
+
+@hooks.on("user.updated")
+def _forget_version(user_id, **_):
+    version_cache.discard(user_id)
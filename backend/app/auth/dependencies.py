@@ -1,9 +1,10 @@
-from typing import Generator
-from fastapi import Depends, HTTPException, status
+from typing import Generator, Optional, Union
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.auth.claims import Principal, is_current, principal_from_claims
+from app.auth.tokens import ExpiredTokenError, TokenError, get_token_service
 from app.database import get_db
 from app.schemas.user import UserOut
 from app.models.user import User
@@ -11,54 +12,85 @@ from app.models.user import User
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 
+def _credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decode_token(token: str) -> dict:
+    if not token:
+        raise _credentials_exception("No Bearer token provided")
+    try:
+        claims = get_token_service().decode(token)
+    except ExpiredTokenError:
+        raise _credentials_exception("Token has expired")
+    except TokenError:
+        raise _credentials_exception()
+    if "typ" in claims:
+        # Purpose-bound tokens (upload tokens, local upload policies) are
+        # signed with the same key but are never bearer credentials
+        raise _credentials_exception()
+    return claims
+
+
+def _remember_user(db: Session, request: Optional[Request], user_id: int) -> None:
+    # Lets the session layer route this user's reads to the primary right
+    # after they write (see app.database.RoutingSession)
+    db.info["user_id"] = user_id
+    if request is not None:
+        request.state.user_id = user_id
+
+
 def require_user(
     db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
+    token: str = Depends(oauth2_scheme),
+    request: Request = None
 ) -> User:
     """
     Get current authenticated user
-    TODO: Implement token verification and user retrieval
-    - Decode JWT token
-    - Verify token payload
-    - Get user from database
-    - Validate user is active
     """
-
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No Bearer token provided",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
+    token_data = _decode_token(token)
     try:
-        token_data = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         user = db.get(User, int(token_data.get("sub")))
-        if user is None:
-            raise credentials_exception
-        
-    except jwt.ExpiredSignatureError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=e,
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=e,
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
+    except (TypeError, ValueError):
+        raise _credentials_exception()
+    if user is None:
+        raise _credentials_exception()
+
+    version = token_data.get("ver")
+    if isinstance(version, int) and version < user.auth_version:
+        raise _credentials_exception("Token has been revoked")
+
+    _remember_user(db, request, user.id)
     return user
 
-def require_admin(user: User = Depends(require_user)) -> User:
+
+def require_principal(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    request: Request = None
+) -> Union[Principal, User]:
+    """
+    The authenticated caller, for routes that only need its id and admin flag
+
+    With AUTH_TRUST_TOKEN_CLAIMS this is built from the verified token
+    claims and the User row isn't loaded (see app.auth.claims); otherwise,
+    or for tokens without those claims, it is the User from require_user.
+    """
+    if settings.AUTH_TRUST_TOKEN_CLAIMS:
+        principal = principal_from_claims(_decode_token(token))
+        if principal is not None:
+            if not is_current(db, principal):
+                raise _credentials_exception("Token has been revoked")
+            _remember_user(db, request, principal.id)
+            return principal
+    return require_user(db=db, token=token, request=request)
+
+
+def require_admin(user: Union[Principal, User] = Depends(require_principal)) -> Union[Principal, User]:
     """
     Dependency to ensure the current user is an admin
     """
@@ -1,8 +1,8 @@
 from datetime import datetime, timedelta, UTC
 from typing import Optional
-from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.auth.tokens import get_token_service
 from functools import wraps
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,7 +19,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now(UTC) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = get_token_service().encode(to_encode)
     return encoded_jwt
 
 
@@ -30,7 +30,7 @@ def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(UTC) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = get_token_service().encode(to_encode)
     return encoded_jwt
 
 
@@ -0,0 +1,216 @@
+"""
+JWT signing and verification
+
+TokenService does the work python-jose does per call once, up front: the
+key is parsed (or the HMAC key schedule computed) when the service is
+built and the encoded header is precomputed. Verification checks the
+header against the expected one, the signature, and then only the claims
+this app relies on (exp, and nbf when present).
+
+Supported algorithms (settings.ALGORITHM):
+
+- HS256 / HS384 / HS512: shared secret (settings.SECRET_KEY)
+- ES256: ECDSA P-256, keys from settings.JWT_PRIVATE_KEY / JWT_PUBLIC_KEY
+- EdDSA: Ed25519, same settings
+
+With an asymmetric algorithm other services can verify tokens using the
+public key alone, published at /.well-known/jwks.json.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+
+from app.core.config import settings
+
+HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+ASYMMETRIC_ALGORITHMS = ("ES256", "EdDSA")
+
+
+class TokenError(Exception):
+    """The token is malformed, badly signed or otherwise not acceptable."""
+
+
+class ExpiredTokenError(TokenError):
+    """The token was valid but its exp has passed."""
+
+
+def b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _json(data: dict) -> bytes:
+    return json.dumps(data, separators=(",", ":"), default=_json_default).encode()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class TokenService:
+    def __init__(
+        self,
+        algorithm: str,
+        secret: Optional[str] = None,
+        private_key_pem: Optional[str] = None,
+        public_key_pem: Optional[str] = None,
+        key_id: Optional[str] = None,
+    ):
+        self.algorithm = algorithm
+        self.key_id = key_id or None
+        self._hmac = None
+        self._private_key = None
+        self._public_key = None
+
+        if algorithm in HMAC_ALGORITHMS:
+            if not secret:
+                raise ValueError(f"{algorithm} needs a secret")
+            self._hmac = hmac.new(secret.encode(), digestmod=HMAC_ALGORITHMS[algorithm])
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            if private_key_pem:
+                self._private_key = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+                self._public_key = self._private_key.public_key()
+            if public_key_pem:
+                self._public_key = serialization.load_pem_public_key(public_key_pem.encode())
+            if self._public_key is None:
+                raise ValueError(f"{algorithm} needs JWT_PRIVATE_KEY or JWT_PUBLIC_KEY")
+            expected = ed25519.Ed25519PublicKey if algorithm == "EdDSA" else ec.EllipticCurvePublicKey
+            if not isinstance(self._public_key, expected):
+                raise ValueError(f"Key type doesn't match {algorithm}")
+            if algorithm == "ES256" and self._public_key.curve.name != "secp256r1":
+                raise ValueError("ES256 needs a P-256 key")
+        else:
+            raise ValueError(f"Unsupported JWT algorithm: {algorithm}")
+
+        header = {"alg": algorithm, "typ": "JWT"}
+        if self.key_id:
+            header["kid"] = self.key_id
+        self._header = b64encode(_json(header))
+
+    @property
+    def can_sign(self) -> bool:
+        return self._hmac is not None or self._private_key is not None
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        if self._hmac is not None:
+            mac = self._hmac.copy()
+            mac.update(signing_input)
+            return mac.digest()
+        if self._private_key is None:
+            raise TokenError("No private key configured; this service can only verify")
+        if self.algorithm == "EdDSA":
+            return self._private_key.sign(signing_input)
+        r, s = decode_dss_signature(self._private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def _verify(self, signing_input: bytes, signature: bytes) -> bool:
+        if self._hmac is not None:
+            return hmac.compare_digest(self._sign(signing_input), signature)
+        try:
+            if self.algorithm == "EdDSA":
+                self._public_key.verify(signature, signing_input)
+            else:
+                if len(signature) != 64:
+                    return False
+                der = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+                self._public_key.verify(der, signing_input, ec.ECDSA(hashes.SHA256()))
+        except InvalidSignature:
+            return False
+        return True
+
+    def encode(self, claims: dict) -> str:
+        signing_input = self._header + b"." + b64encode(_json(claims))
+        return (signing_input + b"." + b64encode(self._sign(signing_input))).decode()
+
+    def decode(self, token: str) -> dict:
+        """Verify a token and return its claims. Raises TokenError."""
+        try:
+            raw = token.encode("ascii")
+            header, payload, signature = raw.split(b".")
+        except (AttributeError, UnicodeEncodeError, ValueError):
+            raise TokenError("Malformed token")
+
+        if header != self._header:
+            # Not our exact header (e.g. another kid or key order): parse it,
+            # but never let the token pick the algorithm
+            try:
+                parsed = json.loads(b64decode(header))
+            except ValueError:
+                raise TokenError("Malformed token header")
+            if not isinstance(parsed, dict) or parsed.get("alg") != self.algorithm:
+                raise TokenError("Unexpected token algorithm")
+
+        try:
+            signature = b64decode(signature)
+        except ValueError:
+            raise TokenError("Malformed token signature")
+        if not self._verify(header + b"." + payload, signature):
+            raise TokenError("Invalid token signature")
+
+        try:
+            claims = json.loads(b64decode(payload))
+        except ValueError:
+            raise TokenError("Malformed token payload")
+        if not isinstance(claims, dict):
+            raise TokenError("Malformed token payload")
+
+        now = time.time()
+        exp = claims.get("exp")
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise TokenError("Invalid exp claim")
+            if exp <= now:
+                raise ExpiredTokenError("Token has expired")
+        nbf = claims.get("nbf")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or nbf > now):
+            raise TokenError("Token not yet valid")
+        return claims
+
+    def jwks(self) -> dict:
+        """Public verification keys as a JWK Set (empty for HMAC)."""
+        if self._public_key is None:
+            return {"keys": []}
+        if self.algorithm == "EdDSA":
+            encoding, public_format = serialization.Encoding.Raw, serialization.PublicFormat.Raw
+        else:
+            encoding, public_format = serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+        raw = self._public_key.public_bytes(encoding, public_format)
+        if self.algorithm == "EdDSA":
+            key = {"kty": "OKP", "crv": "Ed25519", "x": b64encode(raw).decode()}
+        else:
+            key = {"kty": "EC", "crv": "P-256", "x": b64encode(raw[1:33]).decode(), "y": b64encode(raw[33:]).decode()}
+        key.update({"alg": self.algorithm, "use": "sig"})
+        if self.key_id:
+            key["kid"] = self.key_id
+        return {"keys": [key]}
+
+
+@lru_cache
+def _build_service(algorithm: str, secret: str, private_key: str, public_key: str, key_id: str) -> TokenService:
+    return TokenService(algorithm, secret, private_key, public_key, key_id)
+
+
+def get_token_service() -> TokenService:
+    """Token service for the current settings, built once."""
+    return _build_service(
+        settings.ALGORITHM,
+        settings.SECRET_KEY,
+        settings.JWT_PRIVATE_KEY,
+        settings.JWT_PUBLIC_KEY,
+        settings.JWT_KEY_ID,
+    )
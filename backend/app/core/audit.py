@@ -0,0 +1,291 @@
+"""
+Audit log
+
+Routes call audit_log.record() to note who did what. Recording only
+appends to an in-memory buffer; a background thread writes the buffer out
+in batches, as soon as AUDIT_BATCH_SIZE entries are waiting and at least
+every AUDIT_FLUSH_INTERVAL_SECONDS. Requests never wait on the audit write.
+
+The destination is picked by AUDIT_BACKEND:
+
+- "table": the append-only audit_log table (one multi-row INSERT per batch)
+- "file": one gzip member per batch appended to
+  AUDIT_FILE_PATH/audit-<UTC date>.jsonl.gz (concatenated members read back
+  as one gzip stream, e.g. with zcat)
+
+Entries show up in query() once flushed, so within
+AUDIT_FLUSH_INTERVAL_SECONDS. The buffer is flushed on shutdown. If
+writing fails the batch is kept for the next attempt; if that goes on long
+enough for AUDIT_MAX_BUFFERED entries to pile up, the oldest are dropped
+and counted.
+
+Entry ids sort by time (nanoseconds, then a random suffix), so they double
+as keyset cursors for both backends.
+
+Metrics: audit.recorded, audit.flushed, audit.batches, audit.flush_errors,
+audit.dropped, audit.buffered (gauge)
+"""
+import atexit
+import gzip
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import datetime, UTC
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.audit import AuditEntry
+
+Entry = Dict[str, Any]
+
+# What new_id returns: nanoseconds since the epoch, then random hex
+ID_PATTERN = r"^\d{20}-[0-9a-f]{10}$"
+
+
+def new_id(now_ns: int) -> str:
+    return f"{now_ns:020d}-{secrets.token_hex(5)}"
+
+
+def _timestamp(entry: Entry) -> datetime:
+    return datetime.fromisoformat(entry["created_at"])
+
+
+class AuditLog:
+    def __init__(self):
+        self._entries: Deque[Entry] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._exit_hook = False
+        # Sessions for the "table" backend; defaults to app.database.SessionLocal
+        self.session_factory: Optional[Callable[[], Session]] = None
+
+    def record(
+        self,
+        action: str,
+        actor_id: Optional[int] = None,
+        target_type: Optional[str] = None,
+        target_id: Any = None,
+        **details: Any,
+    ) -> Entry:
+        """Buffer an entry. Never touches the database or disk."""
+        now_ns = time.time_ns()
+        entry = {
+            "id": new_id(now_ns),
+            "created_at": datetime.fromtimestamp(now_ns / 1e9, UTC).replace(tzinfo=None).isoformat(),
+            "actor_id": actor_id,
+            "action": action,
+            "target_type": target_type,
+            "target_id": None if target_id is None else str(target_id),
+            "details": details or None,
+        }
+        with self._lock:
+            if len(self._entries) >= settings.AUDIT_MAX_BUFFERED:
+                self._entries.popleft()
+                metrics.inc("audit.dropped")
+            self._entries.append(entry)
+            buffered = len(self._entries)
+        metrics.inc("audit.recorded")
+        metrics.set_gauge("audit.buffered", buffered)
+        self._ensure_running()
+        if buffered >= settings.AUDIT_BATCH_SIZE:
+            self._wake.set()
+        return entry
+
+    def _ensure_running(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.stop)
+                self._exit_hook = True
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(settings.AUDIT_FLUSH_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                metrics.inc("audit.flush_errors")
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns how many entries were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._entries)
+                self._entries.clear()
+            if not batch:
+                return 0
+            try:
+                _write(batch, self.session_factory)
+            except Exception:
+                with self._lock:
+                    # Keep the batch ahead of anything recorded meanwhile
+                    self._entries.extendleft(reversed(batch))
+                    while len(self._entries) > settings.AUDIT_MAX_BUFFERED:
+                        self._entries.popleft()
+                        metrics.inc("audit.dropped")
+                raise
+            metrics.inc("audit.flushed", len(batch))
+            metrics.inc("audit.batches")
+            metrics.set_gauge("audit.buffered", len(self._entries))
+            return len(batch)
+
+    def stop(self) -> None:
+        """Stop the background thread and write whatever is left."""
+        thread = self._thread
+        if thread is not None:
+            self._stopping = True
+            self._wake.set()
+            thread.join(timeout=10)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            metrics.inc("audit.flush_errors")
+
+
+def _write(batch: List[Entry], session_factory: Optional[Callable[[], Session]]) -> None:
+    if settings.AUDIT_BACKEND == "file":
+        _write_file(batch)
+    elif settings.AUDIT_BACKEND == "table":
+        _write_table(batch, session_factory)
+    else:
+        raise ValueError(f"Unknown audit backend: {settings.AUDIT_BACKEND}")
+
+
+def _write_table(batch: List[Entry], session_factory: Optional[Callable[[], Session]]) -> None:
+    if session_factory is None:
+        from app.database import SessionLocal
+        session_factory = SessionLocal
+    db = session_factory()
+    try:
+        db.execute(insert(AuditEntry), [{**entry, "created_at": _timestamp(entry)} for entry in batch])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _file_for(day: str) -> str:
+    return os.path.join(settings.AUDIT_FILE_PATH, f"audit-{day}.jsonl.gz")
+
+
+def _write_file(batch: List[Entry]) -> None:
+    os.makedirs(settings.AUDIT_FILE_PATH, exist_ok=True)
+    by_day: Dict[str, List[Entry]] = {}
+    for entry in batch:
+        by_day.setdefault(entry["created_at"][:10], []).append(entry)
+    for day, entries in by_day.items():
+        lines = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        # One write per batch: a complete gzip member appended to the day's file
+        with open(_file_for(day), "ab") as f:
+            f.write(gzip.compress(lines.encode()))
+
+
+def _day_of(entry_id: str) -> str:
+    """The UTC date an entry id was issued on."""
+    return datetime.fromtimestamp(int(entry_id[:20]) / 1e9, UTC).date().isoformat()
+
+
+def _file_days(
+    since: Optional[datetime], until: Optional[datetime], before: Optional[str]
+) -> Iterator[List[Entry]]:
+    """Each day file's entries in the range, newest file first."""
+    if not os.path.isdir(settings.AUDIT_FILE_PATH):
+        return
+    first_day = since.date().isoformat() if since else ""
+    last_day = until.date().isoformat() if until else "9999"
+    if before is not None:
+        last_day = min(last_day, _day_of(before))
+    for name in sorted(os.listdir(settings.AUDIT_FILE_PATH), reverse=True):
+        if not (name.startswith("audit-") and name.endswith(".jsonl.gz")):
+            continue
+        day = name[len("audit-"):-len(".jsonl.gz")]
+        if first_day <= day <= last_day:
+            with gzip.open(os.path.join(settings.AUDIT_FILE_PATH, name), "rt") as f:
+                yield [json.loads(line) for line in f if line.strip()]
+
+
+def query(
+    db: Session,
+    actor_id: Optional[int] = None,
+    target_type: Optional[str] = None,
+    target_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Entry], Optional[str]]:
+    """
+    Flushed entries matching every given filter, newest first, and the
+    cursor for the next page (an entry id; None on the last page). since
+    is inclusive and until exclusive; both are naive UTC.
+    """
+    if settings.AUDIT_BACKEND == "file":
+        entries = []
+        # Every entry in a day file is newer than those in earlier days' files,
+        # so stop at the first file that completes the page
+        for day_entries in _file_days(since, until, before):
+            matches = [
+                entry for entry in day_entries
+                if (actor_id is None or entry["actor_id"] == actor_id)
+                and (target_type is None or entry["target_type"] == target_type)
+                and (target_id is None or entry["target_id"] == target_id)
+                and (since is None or _timestamp(entry) >= since)
+                and (until is None or _timestamp(entry) < until)
+                and (before is None or entry["id"] < before)
+            ]
+            # Batches from different processes can interleave within a file
+            matches.sort(key=lambda entry: entry["id"], reverse=True)
+            entries.extend(matches[:limit + 1 - len(entries)])
+            if len(entries) > limit:
+                break
+    else:
+        stmt = select(AuditEntry).order_by(AuditEntry.id.desc()).limit(limit + 1)
+        if actor_id is not None:
+            stmt = stmt.where(AuditEntry.actor_id == actor_id)
+        if target_type is not None:
+            stmt = stmt.where(AuditEntry.target_type == target_type)
+        if target_id is not None:
+            stmt = stmt.where(AuditEntry.target_id == target_id)
+        if since is not None:
+            stmt = stmt.where(AuditEntry.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(AuditEntry.created_at < until)
+        if before is not None:
+            stmt = stmt.where(AuditEntry.id < before)
+        entries = [
+            {
+                "id": row.id,
+                "created_at": row.created_at.isoformat(),
+                "actor_id": row.actor_id,
+                "action": row.action,
+                "target_type": row.target_type,
+                "target_id": row.target_id,
+                "details": row.details,
+            }
+            for row in db.scalars(stmt)
+        ]
+    if len(entries) > limit:
+        entries = entries[:limit]
+        return entries, entries[-1]["id"]
+    return entries, None
+
+
+audit_log = AuditLog()
+record = audit_log.record
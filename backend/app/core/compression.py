@@ -0,0 +1,257 @@
+"""
+Response compression
+
+CompressionMiddleware compresses text-like responses (JSON, NDJSON, HTML,
+...) with brotli when the client accepts it and the brotli package is
+installed, otherwise gzip.
+
+- Bodies smaller than COMPRESSION_MIN_SIZE are sent as-is; the framing
+  overhead isn't worth it.
+- Streaming responses are compressed as they stream. NDJSON chunks are
+  flushed individually so each record reaches the client immediately.
+- Compressed bodies of cacheable responses (with an ETag or a public
+  max-age) are kept in a small LRU keyed by the body's hash, so popular
+  identical payloads are compressed once.
+- Server-sent events and anything already encoded are left alone.
+
+Metrics: compression.responses, compression.bytes_in, compression.bytes_out,
+compression.cache_hits, compression.cache_misses, compression.skipped_small
+"""
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core import metrics
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+NEVER_COMPRESS_TYPES = ("text/event-stream",)
+FLUSH_EACH_CHUNK_TYPES = ("application/x-ndjson",)
+THREADPOOL_MIN_BYTES = 256 * 1024
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding the client accepts: "br", "gzip" or None."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class StreamCompressor:
+    """Incremental compressor for one response."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + self._compressor.flush() if flush else out
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies, bounded by total compressed size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def key(body: bytes, encoding: str) -> Tuple[str, bytes]:
+        return encoding, hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key) -> Optional[bytes]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+
+def is_cacheable(headers: Headers) -> bool:
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return False
+    return "etag" in headers or "public" in cache_control or "max-age" in cache_control
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: Optional[int] = None, cache_max_bytes: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.cache = CompressedBodyCache(
+            settings.COMPRESSION_CACHE_MAX_BYTES if cache_max_bytes is None else cache_max_bytes
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSender(self, encoding, send))
+
+
+class _CompressingSender:
+    """Send callable that rewrites one response."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        self.passthrough = False
+        self.stream: Optional[StreamCompressor] = None
+        self.flush_each_chunk = False
+
+    def _eligible(self, message) -> bool:
+        headers = Headers(raw=message.get("headers", []))
+        content_type = headers.get("content-type", "").lower()
+        if "content-encoding" in headers or message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        if content_type.startswith(NEVER_COMPRESS_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _encoded_headers(self, message, length: Optional[int]) -> dict:
+        headers = MutableHeaders(raw=list(message.get("headers", [])))
+        headers["content-encoding"] = self.encoding
+        if length is None:
+            if "content-length" in headers:
+                del headers["content-length"]
+        else:
+            headers["content-length"] = str(length)
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # Compressed bytes differ from the identity representation
+            headers["etag"] = f"W/{etag}"
+        return {**message, "headers": headers.raw}
+
+    async def __call__(self, message):
+        if self.passthrough:
+            return await self.send(message)
+
+        if message["type"] == "http.response.start":
+            if self._eligible(message):
+                self.start = message
+            else:
+                self.passthrough = True
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body":
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is None and not more_body:
+            await self._send_whole(body)
+            return
+
+        if self.stream is None:
+            content_type = Headers(raw=self.start.get("headers", [])).get("content-type", "").lower()
+            self.flush_each_chunk = content_type.startswith(FLUSH_EACH_CHUNK_TYPES)
+            self.stream = StreamCompressor(self.encoding)
+            await self.send(self._encoded_headers(self.start, None))
+            metrics.inc("compression.responses")
+
+        metrics.inc("compression.bytes_in", len(body))
+        if more_body:
+            out = self.stream.compress(body, flush=self.flush_each_chunk)
+        else:
+            out = self.stream.compress(body) + self.stream.finish()
+        metrics.inc("compression.bytes_out", len(out))
+        if out or not more_body:
+            await self.send({"type": "http.response.body", "body": out, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes) -> None:
+        if len(body) < self.middleware.minimum_size:
+            metrics.inc("compression.skipped_small")
+            headers = MutableHeaders(raw=list(self.start.get("headers", [])))
+            headers.add_vary_header("Accept-Encoding")
+            await self.send({**self.start, "headers": headers.raw})
+            await self.send({"type": "http.response.body", "body": body})
+            return
+
+        cache = self.middleware.cache
+        key = None
+        compressed = None
+        if is_cacheable(Headers(raw=self.start.get("headers", []))):
+            key = cache.key(body, self.encoding)
+            compressed = cache.get(key)
+            metrics.inc("compression.cache_hits" if compressed is not None else "compression.cache_misses")
+        if compressed is None:
+            if len(body) >= THREADPOOL_MIN_BYTES:
+                compressed = await run_in_threadpool(compress, body, self.encoding)
+            else:
+                compressed = compress(body, self.encoding)
+            if key is not None:
+                cache.put(key, compressed)
+
+        metrics.inc("compression.responses")
+        metrics.inc("compression.bytes_in", len(body))
+        metrics.inc("compression.bytes_out", len(compressed))
+        await self.send(self._encoded_headers(self.start, len(compressed)))
+        await self.send({"type": "http.response.body", "body": compressed})
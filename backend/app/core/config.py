@@ -21,6 +21,27 @@ class Settings(BaseSettings):
             return "sqlite:///./app.db"
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    # SQLite tuning (USE_SQLITE only): WAL, a single queued writer
+    # connection and a pool of read-only connections
+    SQLITE_TUNED: bool = False
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_READ_POOL_SIZE: int = 8
+    SQLITE_WRITE_TIMEOUT_SECONDS: float = 30.0
+
+    # Read replicas (optional). Read-only endpoints use a replica whose lag
+    # is within DATABASE_REPLICA_MAX_LAG_SECONDS, otherwise the primary.
+    DATABASE_REPLICA_URLS: List[str] = []
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DATABASE_REPLICA_LAG_CHECK_SECONDS: float = 2.0
+    # After a request commits a write, that client's reads stay on the
+    # primary for this long. The marker travels with the client in the
+    # DATABASE_READ_AFTER_WRITE_COOKIE cookie, so it holds whichever worker
+    # process or host serves the next request; clients that drop cookies
+    # only get the per-process fallback keyed by user id.
+    DATABASE_READ_AFTER_WRITE_SECONDS: float = 5.0
+    DATABASE_READ_AFTER_WRITE_COOKIE: str = "last_write"
+
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
     
@@ -29,11 +50,109 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # PEM keys for ES256 / EdDSA; a verify-only service sets just the public key
+    JWT_PRIVATE_KEY: str = ""
+    JWT_PUBLIC_KEY: str = ""
+    JWT_KEY_ID: str = ""
+    # Let require_admin and id-only routes trust the token's admin/ver
+    # claims instead of loading the user (see app.auth.claims)
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False
+    AUTH_VERSION_CACHE_SECONDS: float = 30.0
     
+    # Image storage: "s3" or "local"
+    STORAGE_BACKEND: str = "s3"
+    LOCAL_STORAGE_PATH: str = "./storage"
+
     # AWS S3 (optional)
     S3_BUCKET_NAME: str = ""
     AWS_REGION: str = "us-east-1"
-    
+    S3_ENDPOINT_URL: str = ""  # e.g. a local moto/minio server
+    S3_MAX_POOL_CONNECTIONS: int = 10
+    S3_MAX_CONCURRENT_TRANSFERS: int = 4
+    S3_PRESIGN_EXPIRE_SECONDS: int = 900
+
+    # Image uploads
+    IMAGE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    IMAGE_ALLOWED_CONTENT_TYPES: List[str] = ["image/jpeg", "image/png", "image/webp", "image/gif"]
+
+    # Image proxy cache (S3 backend only)
+    IMAGE_CACHE_PATH: str = "./cache/images"
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    IMAGE_CACHE_MAX_OBJECT_BYTES: int = 10 * 1024 * 1024  # larger objects stream straight from S3
+    IMAGE_CACHE_MAX_AGE_SECONDS: int = 365 * 24 * 60 * 60
+
+    # Listing feeds (see app.core.timelines)
+    TIMELINE_MAX_ENTRIES: int = 1000  # newest listings kept per parish timeline
+
+    # Push notifications (see app.core.events)
+    EVENTS_QUEUE_SIZE: int = 100  # pending events per connection before it is dropped
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_RETRY_MILLISECONDS: int = 3000  # SSE reconnect delay suggested to clients
+
+    # Email/SMS notifications (see app.core.notifications). "console" prints
+    # messages instead of sending them; python -m app.core.smtp_sink is a
+    # local SMTP server for trying the "smtp" backend
+    NOTIFY_EMAIL_BACKEND: str = "console"  # "smtp" or "console"
+    NOTIFY_SMS_BACKEND: str = "console"  # "http" or "console"
+    NOTIFY_CONSOLE_DELIVERS: bool = False  # development: log console messages in full and mark them sent
+    NOTIFY_FROM_EMAIL: str = "KCK Swap Shop <no-reply@localhost>"
+    NOTIFY_BATCH_SIZE: int = 100  # messages sent per delivery job
+    NOTIFY_BATCH_DELAY_SECONDS: float = 2.0  # wait this long to gather a batch
+    NOTIFY_MAX_ATTEMPTS: int = 5
+    NOTIFY_RATE_LIMIT: int = 10  # messages per recipient per NOTIFY_RATE_WINDOW_SECONDS
+    NOTIFY_RATE_WINDOW_SECONDS: int = 3600
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 1025
+    SMTP_USERNAME: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = False
+    NOTIFY_POOL_SIZE: int = 4  # SMTP/SMS provider connections kept per worker process
+    SMTP_MAX_IDLE_SECONDS: float = 60.0  # older idle connections are reopened
+    SMS_PROVIDER_URL: str = ""  # receives POST {"to": ..., "body": ...}
+    SMS_PROVIDER_TOKEN: str = ""
+
+    # Idempotency-Key handling for POST requests (see app.core.idempotency)
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60  # how long a key's response is replayed
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0  # how long a duplicate waits for the first request before 409
+    IDEMPOTENCY_LOCK_SECONDS: int = 60  # after this an unfinished first request is presumed dead
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = 1024 * 1024  # larger responses aren't stored
+
+    # Audit log (see app.core.audit)
+    AUDIT_BACKEND: str = "table"  # "table" or "file" (gzipped JSON lines under AUDIT_FILE_PATH)
+    AUDIT_FILE_PATH: str = "./audit"
+    AUDIT_BATCH_SIZE: int = 100  # flush as soon as this many entries are buffered
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = 2.0  # ...and at least this often
+    AUDIT_MAX_BUFFERED: int = 10000  # oldest entries are dropped beyond this if writes keep failing
+
+    # Background jobs
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF_SECONDS: float = 2.0
+    JOB_RETRY_BACKOFF_MAX_SECONDS: float = 300.0
+    JOB_STALE_AFTER_SECONDS: int = 600
+
+    # Response compression (brotli needs the optional brotli package)
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Request profiling (see app.core.profiling)
+    PROFILE_SAMPLE_EVERY: int = 0  # profile 1 in N requests; 0 = only on demand
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = 0.005
+    PROFILE_STORE_PATH: str = "./profiles"
+    PROFILE_STORE_MAX: int = 200
+
+    # Production server (python -m app.server)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # 0 = one per available CPU core
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEPALIVE_SECONDS: int = 75  # keep above the load balancer's idle timeout
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"
+
     class Config:
         env_file = ".env"
         case_sensitive = True
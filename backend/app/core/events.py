@@ -0,0 +1,150 @@
+"""
+In-process pub/sub for push notifications
+
+Each SSE or WebSocket connection subscribes to a few topics (its user and
+its parish) and gets a bounded queue. Publishing puts the event on every
+subscriber's queue and never waits: a consumer whose queue is full is too
+slow to keep up, so it is dropped (its stream ends with a "dropped"
+event) instead of holding memory or slowing everyone else down. Clients
+reconnect and refetch what they missed.
+
+publish() may be called from any thread (sync routes run in the
+threadpool); delivery always happens on the subscriber's event loop.
+
+The hub is per process. With several workers each one only reaches the
+connections it holds, so events are published by the process where the
+change happened.
+
+Metrics: events.connections (gauge), events.published, events.delivered,
+events.dropped_consumers
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from typing import DefaultDict, Iterable, Optional, Set
+
+from app.core import hooks, metrics
+from app.core.config import settings
+
+ALL_PARISHES = "*"
+DROPPED = {"type": "dropped"}
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def parish_topic(parish: Optional[str]) -> str:
+    return f"parish:{parish or ALL_PARISHES}"
+
+
+class Subscription:
+    """One connection's topics and queue of pending events."""
+
+    def __init__(self, hub: "Hub", topics: Iterable[str], maxsize: int):
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.dropped = False
+
+    def _deliver(self, event: dict) -> None:
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+            metrics.inc("events.delivered")
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(DROPPED)
+            self.hub.unsubscribe(self)
+            metrics.inc("events.dropped_consumers")
+
+    async def get(self) -> dict:
+        """Next event; DROPPED once the subscription has been cut off."""
+        return await self.queue.get()
+
+
+class Hub:
+    def __init__(self):
+        self._topics: DefaultDict[str, Set[Subscription]] = defaultdict(set)
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def connections(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, topics: Iterable[str], maxsize: Optional[int] = None) -> Subscription:
+        """Subscribe the calling event loop's connection to topics."""
+        subscription = Subscription(self, topics, maxsize or settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for topic in subscription.topics:
+                self._topics[topic].add(subscription)
+            metrics.set_gauge("events.connections", len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+            metrics.set_gauge("events.connections", len(self._subscriptions))
+
+    def publish(self, topic: str, event: dict) -> int:
+        """Queue event for every subscriber of topic. Returns how many there were."""
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        metrics.inc("events.published")
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for subscription in subscribers:
+            if subscription.loop is current:
+                subscription._deliver(event)
+            else:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+                except RuntimeError:  # loop already closed
+                    self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+hub = Hub()
+
+
+@hooks.on("listing.created")
+def _publish_listing_created(listing_id, owner_id, parish):
+    event = {"type": "listing.created", "listing_id": listing_id, "owner_id": owner_id, "parish": parish}
+    if parish:
+        hub.publish(parish_topic(parish), event)
+    hub.publish(parish_topic(None), event)
+
+
+@hooks.on("listing.deleted")
+def _publish_listing_deleted(listing_id, parish):
+    event = {"type": "listing.deleted", "listing_id": listing_id, "parish": parish}
+    if parish:
+        hub.publish(parish_topic(parish), event)
+    hub.publish(parish_topic(None), event)
+
+
+@hooks.on("user.updated")
+def _publish_user_updated(user_id, version, changes):
+    hub.publish(user_topic(user_id), {"type": "user.updated", "version": version})
+
+
+@hooks.on("message.created")
+def _publish_message_created(conversation_id, message_id, sender_id, recipient_ids):
+    event = {"type": "message.created", "conversation_id": conversation_id, "message_id": message_id,
+             "sender_id": sender_id}
+    for user_id in recipient_ids:
+        hub.publish(user_topic(user_id), event)
@@ -0,0 +1,127 @@
+"""
+Radius search without spatial extensions
+
+Rows with a location also store `geocell`: the index of the fixed
+CELL_DEGREES x CELL_DEGREES grid cell they fall in, numbered row by row
+from (-90, -180). Cells in one grid row are consecutive integers, so a
+bounding box is a handful of `geocell BETWEEN a AND b` ranges (one per
+grid row it spans) that a plain B-tree index answers on Postgres and
+SQLite alike. Candidates are then trimmed to the box by latitude and
+longitude, and the exact great-circle distance is checked in Python
+(SQLite has no trigonometric functions by default).
+
+0.01 degrees is about 1.1 km north-south, so a 5 km search covers ten grid
+rows. Changing CELL_DEGREES invalidates stored cells; recompute them with
+`python -m app.core.geo rebuild`.
+
+Boxes are clipped at the poles and at the antimeridian rather than wrapped.
+"""
+import argparse
+import math
+from typing import List, Optional, Tuple, Type, TypeVar
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEGREES = 0.01
+ROWS = round(180 / CELL_DEGREES)
+COLUMNS = round(360 / CELL_DEGREES)
+
+T = TypeVar("T")
+
+
+def _row(lat: float) -> int:
+    return min(int((lat + 90) / CELL_DEGREES), ROWS - 1)
+
+
+def _column(lon: float) -> int:
+    return min(int((lon + 180) / CELL_DEGREES), COLUMNS - 1)
+
+
+def cell_for(lat: Optional[float], lon: Optional[float]) -> Optional[int]:
+    """The grid cell containing (lat, lon); None without a location."""
+    if lat is None or lon is None:
+        return None
+    return _row(lat) * COLUMNS + _column(lon)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) enclosing the circle, clipped to the globe."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if south == -90.0 or north == 90.0:
+        return south, -180.0, north, 180.0
+    # Widest east-west extent of the circle (not at its centre latitude)
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return south, -180.0, north, 180.0
+    dlon = math.degrees(math.asin(ratio))
+    return south, max(lon - dlon, -180.0), north, min(lon + dlon, 180.0)
+
+
+def cell_ranges(south: float, west: float, north: float, east: float) -> List[Tuple[int, int]]:
+    """Inclusive geocell ranges covering the box, one per grid row."""
+    first, last = _column(west), _column(east)
+    return [(row * COLUMNS + first, row * COLUMNS + last) for row in range(_row(south), _row(north) + 1)]
+
+
+def nearby(
+    db: Session, model: Type[T], lat: float, lon: float, radius_km: float, limit: int
+) -> List[Tuple[T, float]]:
+    """
+    Rows of model (which has latitude, longitude and geocell columns) within
+    radius_km of (lat, lon), nearest first, with their distances.
+    """
+    south, west, north, east = bounding_box(lat, lon, radius_km)
+    query = select(model).where(
+        or_(*(model.geocell.between(low, high) for low, high in cell_ranges(south, west, north, east))),
+        and_(model.latitude.between(south, north), model.longitude.between(west, east)),
+    )
+    matches = []
+    for row in db.scalars(query):
+        distance = distance_km(lat, lon, row.latitude, row.longitude)
+        if distance <= radius_km:
+            matches.append((row, distance))
+    matches.sort(key=lambda match: match[1])
+    return matches[:limit]
+
+
+def rebuild(db: Session, model) -> int:
+    """Recompute geocell for every located row of model. The caller commits."""
+    rows = db.execute(
+        select(model.id, model.latitude, model.longitude).where(model.latitude.is_not(None))
+    ).all()
+    if rows:
+        db.execute(update(model), [{"id": row_id, "geocell": cell_for(lat, lon)} for row_id, lat, lon in rows])
+    return len(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain geocell columns")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+
+    from app.database import SessionLocal
+    from app.models.listing import Listing
+    from app.models.user import User
+
+    db = SessionLocal()
+    try:
+        for model in (User, Listing):
+            print(f"{model.__tablename__}: {rebuild(db, model)} rows")
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
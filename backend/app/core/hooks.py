@@ -0,0 +1,43 @@
+"""
+In-process event hooks
+
+Lets subsystems react to domain changes (cache invalidation, counters,
+notifications) without the routes knowing about them:
+
+    @hooks.on("user.updated")
+    def invalidate(user_id, version, changes): ...
+
+    hooks.emit("user.updated", user_id=user.id, version=user.version, changes=changes)
+
+Hooks run synchronously after the change is committed. A failing hook is
+counted in metrics and does not fail the request.
+"""
+from collections import defaultdict
+from typing import Callable, DefaultDict, List
+
+from app.core import metrics
+
+_handlers: DefaultDict[str, List[Callable]] = defaultdict(list)
+
+
+def on(event: str):
+    """Register a function to be called when event is emitted."""
+    def decorator(fn: Callable) -> Callable:
+        _handlers[event].append(fn)
+        return fn
+    return decorator
+
+
+def emit(event: str, **kwargs) -> None:
+    """Call every handler for event with the given keyword arguments."""
+    for handler in list(_handlers.get(event, ())):
+        try:
+            handler(**kwargs)
+        except Exception:
+            metrics.inc(f"hooks.errors.{event}")
+
+
+def remove(event: str, fn: Callable) -> None:
+    """Unregister a handler (used by tests)."""
+    if fn in _handlers.get(event, ()):
+        _handlers[event].remove(fn)
@@ -0,0 +1,319 @@
+"""
+Idempotency-Key support for POST requests
+
+A client that retries a POST after a timeout or a dropped connection sends
+the same Idempotency-Key header each time. The first request to use a key
+runs normally and its response is stored in idempotency_keys for
+IDEMPOTENCY_TTL_SECONDS. Later requests with that key (from the same
+principal) get the stored response back, marked `Idempotent-Replayed:
+true`, without the handler running again. So a retried register doesn't
+hash the password twice or answer "already exists", and a retried listing
+isn't created twice.
+
+- Claiming a key is one INSERT ... ON CONFLICT DO NOTHING, so when
+  duplicates arrive concurrently exactly one of them runs. The others wait
+  up to IDEMPOTENCY_WAIT_SECONDS for that response, then get 409.
+- Keys are scoped per principal: the bearer token's subject, or
+  "anonymous" (register). Reusing a key for a different method, path or
+  body is a 422.
+- The request body is buffered to fingerprint it, so bodies over
+  IMAGE_MAX_UPLOAD_BYTES are refused with 413 before anything else runs.
+- 5xx responses, exceptions, responses over IDEMPOTENCY_MAX_RESPONSE_BYTES
+  and responses marked `Cache-Control: no-store` (anything carrying
+  credentials, such as the login token) aren't stored; the key is released
+  so a retry runs again. A first request that never finishes (a crashed
+  worker) gives up its key after IDEMPOTENCY_LOCK_SECONDS.
+
+Expired keys are replaced when reused. To purge them in bulk, run
+`python -m app.core.idempotency purge`.
+
+Metrics: idempotency.executed, idempotency.replayed, idempotency.waited,
+idempotency.conflicts, idempotency.mismatches
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, UTC
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from app.core import metrics
+from app.core.config import settings
+from app.database import get_db, insert_or_ignore
+from app.models.idempotency import IdempotencyKey
+
+HEADER = "idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+CLAIMED = "claimed"
+REPLAY = "replay"
+BUSY = "busy"
+MISMATCH = "mismatch"
+
+StoredResponse = Tuple[int, List[List[str]], bytes]
+
+
+def utcnow() -> datetime:
+    """Naive UTC, matching the DateTime columns."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def fingerprint(method: str, path: str, query: bytes, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def principal_for(headers: Headers) -> str:
+    """Who the key belongs to. Invalid tokens count as anonymous; the route rejects them."""
+    from app.auth.tokens import TokenError, get_token_service
+
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = get_token_service().decode(token).get("sub")
+        except TokenError:
+            subject = None
+        if subject is not None:
+            return f"user:{subject}"
+    return "anonymous"
+
+
+def _sessions(app):
+    """get_db as the app resolves it (tests override it)."""
+    overrides = getattr(app, "dependency_overrides", {})
+    return overrides.get(get_db, get_db)()
+
+
+def claim(app, key: str, principal: str, request_fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+    """
+    Try to become the request that runs for key. Returns (CLAIMED, None),
+    (REPLAY, stored response), (BUSY, None) while another request holds the
+    key, or (MISMATCH, None) if the key was used for a different request.
+    """
+    sessions = _sessions(app)
+    db = next(sessions)
+    try:
+        now = utcnow()
+        values = {
+            "fingerprint": request_fingerprint,
+            "status_code": None,
+            "headers": None,
+            "body": None,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+        }
+        row = insert_or_ignore(db, IdempotencyKey, {"key": key, "principal": principal, **values})
+        if row is not None:
+            db.commit()
+            return CLAIMED, None
+
+        existing = db.get(IdempotencyKey, (key, principal))
+        if existing is None:  # released in between; try again
+            return BUSY, None
+        abandoned = existing.status_code is None and (
+            existing.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        )
+        if existing.expires_at <= now or abandoned:
+            # Take the key over; the created_at check makes this a compare-and-set
+            taken = db.execute(
+                update(IdempotencyKey)
+                .where(
+                    IdempotencyKey.key == key,
+                    IdempotencyKey.principal == principal,
+                    IdempotencyKey.created_at == existing.created_at,
+                )
+                .values(**values)
+            ).rowcount
+            db.commit()
+            return (CLAIMED, None) if taken else (BUSY, None)
+        if existing.fingerprint != request_fingerprint:
+            return MISMATCH, None
+        if existing.status_code is None:
+            return BUSY, None
+        return REPLAY, (existing.status_code, existing.headers, existing.body)
+    finally:
+        db.rollback()
+        sessions.close()
+
+
+def complete(app, key: str, principal: str, response: Optional[StoredResponse]) -> None:
+    """Store the claimed request's response, or release the key when response is None."""
+    sessions = _sessions(app)
+    db = next(sessions)
+    try:
+        target = (IdempotencyKey.key == key, IdempotencyKey.principal == principal,
+                  IdempotencyKey.status_code.is_(None))
+        if response is None:
+            db.execute(delete(IdempotencyKey).where(*target))
+        else:
+            status_code, headers, body = response
+            db.execute(update(IdempotencyKey).where(*target).values(
+                status_code=status_code, headers=headers, body=body
+            ))
+        db.commit()
+    finally:
+        sessions.close()
+
+
+def purge_expired(db) -> int:
+    """Delete expired keys. The caller commits."""
+    return db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= utcnow())).rowcount
+
+
+async def _read_body(receive, max_bytes: int) -> Optional[bytes]:
+    """The whole request body, or None once it grows past max_bytes."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > max_bytes:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _storable(start) -> bool:
+    """Whether a response may be kept for replay."""
+    if start is None or start["status"] >= 500:
+        return False
+    cache_control = Headers(raw=start.get("headers", [])).get("cache-control", "").lower()
+    return "no-store" not in cache_control
+
+
+async def _send_json(send, status_code: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, response: StoredResponse) -> None:
+    status_code, headers, body = response
+    raw = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    await send({"type": "http.response.start", "status": status_code, "headers": raw + [(REPLAYED_HEADER, b"true")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Honour Idempotency-Key on the given methods (POST by default)."""
+
+    def __init__(self, app, methods=("POST",)):
+        self.app = app
+        self.methods = frozenset(methods)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        key = headers.get(HEADER)
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await _send_json(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        length = headers.get("content-length", "")
+        if length.isdigit() and int(length) > settings.IMAGE_MAX_UPLOAD_BYTES:
+            return await _send_json(send, 413, "Request body too large")
+        body = await _read_body(receive, settings.IMAGE_MAX_UPLOAD_BYTES)
+        if body is None:
+            return await _send_json(send, 413, "Request body too large")
+        app = scope.get("app", self.app)
+        principal = principal_for(headers)
+        request_fingerprint = fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        waited = False
+        while True:
+            outcome, stored = await run_in_threadpool(claim, app, key, principal, request_fingerprint)
+            if outcome != BUSY:
+                break
+            if time.monotonic() >= deadline:
+                metrics.inc("idempotency.conflicts")
+                return await _send_json(send, 409, "A request with this Idempotency-Key is still in progress")
+            waited = True
+            await asyncio.sleep(0.05)
+        if waited:
+            metrics.inc("idempotency.waited")
+
+        if outcome == MISMATCH:
+            metrics.inc("idempotency.mismatches")
+            return await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+        if outcome == REPLAY:
+            metrics.inc("idempotency.replayed")
+            return await _replay(send, stored)
+
+        metrics.inc("idempotency.executed")
+        await self._run(scope, body, send, app, key, principal)
+
+    async def _run(self, scope, body: bytes, send, app, key: str, principal: str) -> None:
+        """Run the request once, recording its response under the claimed key."""
+        sent_body = False
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        start = None
+        chunks: List[bytes] = []
+        size = 0
+
+        async def recording_send(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, receive, recording_send)
+            if _storable(start) and size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                headers = [
+                    [name.decode("latin-1"), value.decode("latin-1")] for name, value in start.get("headers", [])
+                ]
+                response = (start["status"], headers, b"".join(chunks))
+        finally:
+            await run_in_threadpool(complete, app, key, principal, response)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain stored Idempotency-Key responses")
+    parser.add_argument("command", choices=["purge"])
+    parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Purged {purge_expired(db)} expired keys")
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+On-disk LRU cache for images proxied from S3
+
+Objects are immutable (keys are never rewritten), so a cached copy never
+goes stale and only needs evicting for space. Least recently served objects
+are removed first. Concurrent misses for the same key share one download.
+
+Each process keeps its own index, so each one caches into its own slot
+directory under IMAGE_CACHE_PATH (slot-0, slot-1, ...), held with an
+exclusive flock for the life of the process. A restarted worker takes over
+a free slot with its files warm; nothing outside the slot is ever touched,
+so one worker's evictions and startup cleanup can't remove files another
+worker is serving. IMAGE_CACHE_MAX_BYTES is the budget for the whole
+directory and is split evenly between the SERVER_WORKERS processes (one
+per core when it is 0, as for the server).
+
+Paths returned by lookup() and fetch() are pinned: they aren't evicted
+until release() is called, so a file can't disappear while it is being
+sent.
+
+Metrics (see app.core.metrics):
+- image_cache.hits / image_cache.misses
+- image_cache.bytes_saved: bytes served from disk instead of S3
+- image_cache.bytes_fetched: bytes downloaded from S3
+- image_cache.evictions
+- image_cache.size_bytes (gauge)
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Awaitable, BinaryIO, Callable, Dict, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, one slot per process id
+    fcntl = None
+
+Downloader = Callable[[str, BinaryIO], Awaitable[None]]
+
+
+def _claim_slot(base: str) -> Tuple[str, Optional[int]]:
+    """The first slot directory no other process holds, and the fd holding it."""
+    if fcntl is None:
+        root = os.path.join(base, f"pid-{os.getpid()}")
+        shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root)
+        return root, None
+    number = 0
+    while True:
+        root = os.path.join(base, f"slot-{number}")
+        os.makedirs(root, exist_ok=True)
+        fd = os.open(os.path.join(root, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            number += 1
+            continue
+        return root, fd
+
+
+class ImageCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.base = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        os.makedirs(self.base, exist_ok=True)
+        self.root, self._slot_fd = _claim_slot(self.base)
+        self._load()
+
+    def close(self) -> None:
+        """Give up the slot (its files stay for the next process to take it)."""
+        if self._slot_fd is not None:
+            os.close(self._slot_fd)
+            self._slot_fd = None
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def _load(self) -> None:
+        """Index files left by the slot's previous owner, oldest access first."""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename == ".lock":
+                    continue
+                if filename.startswith("tmp"):
+                    # An interrupted download of the previous owner; the slot is ours now
+                    os.unlink(os.path.join(dirpath, filename))
+                    continue
+                stat = os.stat(os.path.join(dirpath, filename))
+                found.append((stat.st_atime, filename, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self) -> None:
+        # Caller holds the lock (or is the constructor). Pinned files are
+        # skipped; they go once released if the cache is still over budget.
+        if self._size > self.max_bytes:
+            for name in list(self._entries):
+                if self._size <= self.max_bytes:
+                    break
+                if name in self._pins:
+                    continue
+                self._size -= self._entries.pop(name)
+                try:
+                    os.unlink(self._path(name))
+                except FileNotFoundError:
+                    pass
+                metrics.inc("image_cache.evictions")
+        metrics.set_gauge("image_cache.size_bytes", self._size)
+
+    def _pin(self, name: str) -> Optional[int]:
+        # Caller holds the lock
+        size = self._entries.get(name)
+        if size is not None:
+            self._entries.move_to_end(name)
+            self._pins[name] = self._pins.get(name, 0) + 1
+        return size
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        Path of the cached object, marking it recently used, or None. The
+        file is pinned until release(path).
+        """
+        name = self._name(key)
+        with self._lock:
+            size = self._pin(name)
+        if size is None:
+            return None
+        metrics.inc("image_cache.hits")
+        metrics.inc("image_cache.bytes_saved", size)
+        return self._path(name)
+
+    def release(self, path: str) -> None:
+        """Unpin a path returned by lookup() or fetch()."""
+        name = os.path.basename(path)
+        with self._lock:
+            pins = self._pins.get(name, 0) - 1
+            if pins > 0:
+                self._pins[name] = pins
+                return
+            self._pins.pop(name, None)
+            self._evict()
+
+    def _add(self, name: str, tmp_path: str) -> str:
+        path = self._path(name)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if name in self._entries:
+                self._size -= self._entries[name]
+            self._entries[name] = size
+            self._size += size
+            self._pins[name] = self._pins.get(name, 0) + 1
+            self._evict()
+        metrics.inc("image_cache.bytes_fetched", size)
+        return path
+
+    async def fetch(self, key: str, download: Downloader) -> str:
+        """
+        Return a local path for the object, downloading it on a miss.
+        download(key, file_obj) must write the whole object to file_obj.
+        The file is pinned until release(path).
+        """
+        path = self.lookup(key)
+        if path is not None:
+            return path
+
+        name = self._name(key)
+        pending = self._inflight.get(name)
+        if pending is not None:
+            await asyncio.shield(pending)
+            with self._lock:
+                if self._pin(name) is not None:
+                    return self._path(name)
+            # Already evicted again (tiny budget); fetch it ourselves
+            return await self.fetch(key, download)
+
+        metrics.inc("image_cache.misses")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[name] = future
+        try:
+            directory = os.path.dirname(self._path(name))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="tmp")
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    await download(key, tmp)
+                path = self._add(name, tmp_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be awaiting; don't warn about an unretrieved error
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(name, None)
+
+    def stats(self) -> dict:
+        hits = metrics.get("image_cache.hits")
+        misses = metrics.get("image_cache.misses")
+        total = hits + misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+            "bytes_saved": metrics.get("image_cache.bytes_saved"),
+            "bytes_fetched": metrics.get("image_cache.bytes_fetched"),
+            "evictions": metrics.get("image_cache.evictions"),
+        }
+
+
+@lru_cache
+def _build_cache(root: str, max_bytes: int, pid: int) -> ImageCache:
+    return ImageCache(root, max_bytes)
+
+
+def get_image_cache() -> ImageCache:
+    """
+    This process's cache for the configured path, with its share of
+    IMAGE_CACHE_MAX_BYTES. Keyed by pid so a forked worker never reuses its
+    parent's slot. SERVER_WORKERS=0 means one per core, as app.server reads it.
+    """
+    from app.server import default_workers
+
+    processes = settings.SERVER_WORKERS or default_workers()
+    return _build_cache(settings.IMAGE_CACHE_PATH, settings.IMAGE_CACHE_MAX_BYTES // processes, os.getpid())
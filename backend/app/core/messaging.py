@@ -0,0 +1,158 @@
+"""
+Buyer-seller messaging
+
+Conversations are keyed by (listing, buyer); each participant has a
+conversation_members row carrying their unread counter and the id of the
+conversation's latest message, so:
+
+- the inbox is a range scan over (user_id, last_message_id DESC)
+- a conversation's history is a range scan over (conversation_id, id DESC)
+- sending a message is one INSERT plus one UPDATE that bumps the other
+  participant's unread_count and everyone's last_message_id
+- marking any number of conversations read is one UPDATE, and the unread
+  total is a SUM over the user's conversations rather than a COUNT over
+  messages
+
+Both lists page with keyset cursors (?before=<id>), so deep pages cost the
+same as the first.
+"""
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.database import insert_or_ignore
+from app.models.listing import Listing
+from app.models.message import Conversation, ConversationMember, Message
+
+
+def start_conversation(db: Session, listing: Listing, buyer_id: int) -> Conversation:
+    """
+    The buyer's conversation about listing, created if needed. Safe against
+    concurrent first messages. The caller commits.
+    """
+    conversation = insert_or_ignore(db, Conversation, {
+        "listing_id": listing.id,
+        "buyer_id": buyer_id,
+        "seller_id": listing.owner_id,
+    })
+    if conversation is None:
+        return db.scalars(
+            select(Conversation).where(Conversation.listing_id == listing.id, Conversation.buyer_id == buyer_id)
+        ).one()
+    db.execute(insert(ConversationMember), [
+        {"conversation_id": conversation.id, "user_id": buyer_id},
+        {"conversation_id": conversation.id, "user_id": listing.owner_id},
+    ])
+    return conversation
+
+
+def membership(db: Session, conversation_id: int, user_id: int) -> Optional[ConversationMember]:
+    return db.get(ConversationMember, (conversation_id, user_id))
+
+
+def send(db: Session, conversation_id: int, sender_id: int, body: str) -> Tuple[Message, List[int]]:
+    """
+    Append a message and update every member's counters. Returns the
+    message and the ids of the other participants. The caller commits.
+    """
+    message = db.scalars(
+        insert(Message)
+        .values(conversation_id=conversation_id, sender_id=sender_id, body=body)
+        .returning(Message)
+    ).one()
+    is_recipient = ConversationMember.user_id != sender_id
+    recipients = db.scalars(
+        update(ConversationMember)
+        .where(ConversationMember.conversation_id == conversation_id)
+        .values(
+            unread_count=case(
+                (is_recipient, ConversationMember.unread_count + 1), else_=ConversationMember.unread_count
+            ),
+            last_message_id=message.id,
+            last_read_message_id=case((is_recipient, ConversationMember.last_read_message_id), else_=message.id),
+        )
+        .returning(ConversationMember.user_id)
+    ).all()
+    return message, [user_id for user_id in recipients if user_id != sender_id]
+
+
+def inbox(
+    db: Session, user_id: int, limit: int, before: Optional[int] = None
+) -> Tuple[List[Tuple[Conversation, ConversationMember]], Optional[int]]:
+    """
+    The user's conversations, most recently active first, and the cursor
+    for the next page (a last_message_id; None on the last page).
+    """
+    query = (
+        select(Conversation, ConversationMember)
+        .join(ConversationMember, ConversationMember.conversation_id == Conversation.id)
+        .where(ConversationMember.user_id == user_id, ConversationMember.last_message_id.is_not(None))
+        .order_by(ConversationMember.last_message_id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(ConversationMember.last_message_id < before)
+    rows = [tuple(row) for row in db.execute(query)]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][1].last_message_id
+    return rows, None
+
+
+def history(
+    db: Session, conversation_id: int, limit: int, before: Optional[int] = None
+) -> Tuple[List[Message], Optional[int]]:
+    """Messages newest first, and the cursor for the next page."""
+    query = (
+        select(Message)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(Message.id < before)
+    messages = list(db.scalars(query))
+    if len(messages) > limit:
+        messages = messages[:limit]
+        return messages, messages[-1].id
+    return messages, None
+
+
+def mark_read(db: Session, user_id: int, conversation_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Mark the given conversations (default: all of them) read in one
+    statement. Returns how many had unread messages. The caller commits.
+    """
+    stmt = (
+        update(ConversationMember)
+        .where(ConversationMember.user_id == user_id, ConversationMember.unread_count > 0)
+        .values(unread_count=0, last_read_message_id=ConversationMember.last_message_id)
+    )
+    if conversation_ids is not None:
+        stmt = stmt.where(ConversationMember.conversation_id.in_(list(conversation_ids)))
+    return db.execute(stmt).rowcount
+
+
+def unread_total(db: Session, user_id: int) -> Tuple[int, int]:
+    """(unread messages, conversations with unread messages) for the user."""
+    total, conversations = db.execute(
+        select(func.coalesce(func.sum(ConversationMember.unread_count), 0), func.count())
+        .where(ConversationMember.user_id == user_id, ConversationMember.unread_count > 0)
+    ).one()
+    return total, conversations
+
+
+def delete_user_conversations(db: Session, user_id: int) -> int:
+    """
+    Remove every conversation the user takes part in, for account deletion.
+    Returns how many were removed. The caller commits.
+    """
+    conversation_ids = select(ConversationMember.conversation_id).where(ConversationMember.user_id == user_id)
+    ids = db.scalars(conversation_ids).all()
+    if not ids:
+        return 0
+    db.execute(delete(Message).where(Message.conversation_id.in_(ids)))
+    db.execute(delete(ConversationMember).where(ConversationMember.conversation_id.in_(ids)))
+    db.execute(delete(Conversation).where(Conversation.id.in_(ids)))
+    return len(ids)
@@ -0,0 +1,46 @@
+"""
+In-process metrics
+
+A minimal counter/gauge registry. Values are per process; with several
+workers each one reports its own numbers. Exposed to admins via
+GET /metrics.
+"""
+import threading
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+
+
+def inc(name: str, value: float = 1) -> None:
+    """Increase a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """Set a gauge to an absolute value."""
+    with _lock:
+        _gauges[name] = value
+
+
+def get(name: str) -> float:
+    """Current value of a counter or gauge (0 if never set)."""
+    with _lock:
+        if name in _counters:
+            return _counters[name]
+        return _gauges.get(name, 0)
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Copy of all counters and gauges."""
+    with _lock:
+        return {"counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def reset() -> None:
+    """Clear everything (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
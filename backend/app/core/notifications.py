@@ -0,0 +1,413 @@
+"""
+Email and SMS notifications
+
+Request handlers call notify(), which only writes a row to the
+notifications table (in the caller's transaction) and makes sure a
+notifications.deliver job is queued. Sending happens in the job worker:
+
+- Delivery is batched. The job waits NOTIFY_BATCH_DELAY_SECONDS so
+  notifications from the same burst share a run, then sends up to
+  NOTIFY_BATCH_SIZE messages per channel over one connection.
+- SMTP connections are pooled per worker process (SMTPPool) and reused
+  across batches until idle for SMTP_MAX_IDLE_SECONDS. The SMS provider is
+  called through one keep-alive HTTP client.
+- Each notification has a dedupe_key (unique). By default it is a hash of
+  the channel, recipient, content and UTC date, so an identical message is
+  sent at most once a day. Callers pass their own key for "once per event"
+  semantics (e.g. one listing-interest email per conversation).
+- Recipients get at most NOTIFY_RATE_LIMIT messages per
+  NOTIFY_RATE_WINDOW_SECONDS. Extra messages are recorded as rate_limited
+  and never sent. The count runs after the dedupe insert, so duplicates
+  never use up the limit.
+- Failed messages are retried with the job queue's backoff, up to
+  NOTIFY_MAX_ATTEMPTS.
+
+Backends come from NOTIFY_EMAIL_BACKEND ("smtp" or "console") and
+NOTIFY_SMS_BACKEND ("http" or "console"). The console backend logs
+messages instead of sending them; unless NOTIFY_CONSOLE_DELIVERS is set (for
+development) it logs without the content and records them as not sent.
+
+Metrics: notifications.queued, notifications.deduplicated,
+notifications.rate_limited, notifications.sent, notifications.failed,
+notifications.retried, notifications.smtp.connects, notifications.smtp.reused
+"""
+import hashlib
+import logging
+import queue
+import smtplib
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta, UTC
+from email.message import EmailMessage
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.database import insert_or_ignore
+from app.models.notification import Notification, NotificationStatus
+
+EMAIL = "email"
+SMS = "sms"
+DELIVER_TASK = "notifications.deliver"
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp, as stored in the notifications table."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class Sender(ABC):
+    """Sends one channel's messages. send_batch returns an error (or None) per message."""
+
+    @abstractmethod
+    def send_batch(self, notifications: List[Notification]) -> List[Optional[str]]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class ConsoleSender(Sender):
+    """
+    Logs messages instead of sending them. Only counts them as delivered
+    when delivers is set (development); otherwise each one is an error.
+    """
+
+    def __init__(self, channel: str, delivers: bool = False):
+        self.channel = channel
+        self.delivers = delivers
+
+    def send_batch(self, notifications: List[Notification]) -> List[Optional[str]]:
+        if not self.delivers:
+            for notification in notifications:
+                logger.warning("%s notification %s not sent: console backend", self.channel, notification.id)
+            return [f"{self.channel} backend is console; not sent"] * len(notifications)
+        for notification in notifications:
+            subject = f" [{notification.subject}]" if notification.subject else ""
+            logger.info("%s to %s%s: %s", self.channel, notification.recipient, subject, notification.body)
+        return [None] * len(notifications)
+
+
+class SMTPPool:
+    """Idle SMTP connections, reused until they have sat unused for max_idle_seconds."""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP], size: int, max_idle_seconds: float):
+        self.connect = connect
+        self.max_idle_seconds = max_idle_seconds
+        self._idle: "queue.LifoQueue" = queue.LifoQueue(maxsize=size)
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                smtp, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                metrics.inc("notifications.smtp.connects")
+                return self.connect()
+            if time.monotonic() - last_used <= self.max_idle_seconds:
+                metrics.inc("notifications.smtp.reused")
+                return smtp
+            _quit(smtp)
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """A connection that goes back to the pool unless the block raised."""
+        smtp = self._checkout()
+        try:
+            yield smtp
+        except BaseException:
+            _quit(smtp)
+            raise
+        try:
+            self._idle.put_nowait((smtp, time.monotonic()))
+        except queue.Full:
+            _quit(smtp)
+
+    def close(self) -> None:
+        while True:
+            try:
+                smtp, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _quit(smtp)
+
+
+def _quit(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
+
+class SMTPSender(Sender):
+    def __init__(self, host: str, port: int, username: str = "", password: str = "",
+                 starttls: bool = False, pool_size: int = 4, max_idle_seconds: float = 60.0,
+                 from_address: str = ""):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.starttls = starttls
+        self.from_address = from_address
+        self.pool = SMTPPool(self._connect, pool_size, max_idle_seconds)
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _message(self, notification: Notification) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.from_address
+        message["To"] = notification.recipient
+        message["Subject"] = notification.subject or ""
+        message.set_content(notification.body)
+        return message
+
+    def send_batch(self, notifications: List[Notification]) -> List[Optional[str]]:
+        errors: List[Optional[str]] = []
+        pending = list(notifications)
+        retried_connection = False
+        while pending:
+            try:
+                with self.pool.connection() as smtp:
+                    while pending:
+                        try:
+                            smtp.send_message(self._message(pending[0]))
+                            errors.append(None)
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError,
+                                smtplib.SMTPSenderRefused) as exc:
+                            # This message is refused; the connection is still good
+                            errors.append(f"{type(exc).__name__}: {exc}")
+                        pending.pop(0)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as exc:
+                if retried_connection:
+                    errors.extend(f"{type(exc).__name__}: {exc}" for _ in pending)
+                    return errors
+                # A pooled connection the server has since closed; retry once on a fresh one
+                retried_connection = True
+        return errors
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class HTTPSMSSender(Sender):
+    """
+    Posts {"to", "body"} to an SMS provider's API over keep-alive
+    connections. Needs httpx (installed with the test requirements).
+    """
+
+    def __init__(self, url: str, token: str = "", pool_size: int = 4):
+        import httpx
+
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.url = url
+        self.client = httpx.Client(
+            headers=headers, timeout=30,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def send_batch(self, notifications: List[Notification]) -> List[Optional[str]]:
+        import httpx
+
+        errors: List[Optional[str]] = []
+        for notification in notifications:
+            try:
+                self.client.post(self.url, json={"to": notification.recipient, "body": notification.body}) \
+                    .raise_for_status()
+                errors.append(None)
+            except httpx.HTTPError as exc:
+                errors.append(f"{type(exc).__name__}: {exc}")
+        return errors
+
+    def close(self) -> None:
+        self.client.close()
+
+
+@lru_cache
+def _build_sender(channel: str, backend: str) -> Sender:
+    if backend == "console":
+        return ConsoleSender(channel, settings.NOTIFY_CONSOLE_DELIVERS)
+    if channel == EMAIL and backend == "smtp":
+        return SMTPSender(
+            settings.SMTP_HOST, settings.SMTP_PORT, settings.SMTP_USERNAME, settings.SMTP_PASSWORD,
+            settings.SMTP_STARTTLS, settings.NOTIFY_POOL_SIZE, settings.SMTP_MAX_IDLE_SECONDS,
+            settings.NOTIFY_FROM_EMAIL,
+        )
+    if channel == SMS and backend == "http":
+        return HTTPSMSSender(settings.SMS_PROVIDER_URL, settings.SMS_PROVIDER_TOKEN, settings.NOTIFY_POOL_SIZE)
+    raise ValueError(f"Unknown {channel} backend: {backend}")
+
+
+def get_sender(channel: str) -> Sender:
+    """Sender for channel selected by the current settings (shared per process)."""
+    backend = settings.NOTIFY_EMAIL_BACKEND if channel == EMAIL else settings.NOTIFY_SMS_BACKEND
+    return _build_sender(channel, backend)
+
+
+def default_dedupe_key(channel: str, recipient: str, subject: Optional[str], body: str, now: datetime) -> str:
+    digest = hashlib.sha256()
+    for part in (channel, recipient, subject or "", body, now.date().isoformat()):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return f"content:{digest.hexdigest()}"
+
+
+def _ensure_delivery(db: Session, delay_seconds: float) -> None:
+    """Queue a delivery job unless one is already waiting (which will pick this up)."""
+    from app.jobs.queue import enqueue
+    from app.models.job import Job, JobStatus
+
+    waiting = db.scalars(
+        select(Job.id).where(Job.name == DELIVER_TASK, Job.status == JobStatus.QUEUED).limit(1)
+    ).first()
+    if waiting is None:
+        enqueue(db, DELIVER_TASK, delay_seconds=delay_seconds, commit=False)
+
+
+def notify(
+    db: Session,
+    channel: str,
+    recipient: str,
+    body: str,
+    *,
+    subject: Optional[str] = None,
+    kind: str = "general",
+    user_id: Optional[int] = None,
+    dedupe_key: Optional[str] = None,
+) -> Optional[Notification]:
+    """
+    Queue a notification. Returns it, or None if it duplicates one already
+    queued or sent. The caller commits; nothing is sent until then.
+    """
+    if channel not in (EMAIL, SMS):
+        raise ValueError(f"Unknown channel: {channel}")
+    now = utcnow()
+    values = {
+        "user_id": user_id,
+        "channel": channel,
+        "recipient": recipient,
+        "kind": kind,
+        "subject": subject,
+        "body": body,
+        "attempts": 0,
+        "created_at": now,
+        "next_attempt_at": now,
+    }
+
+    # Dedupe first, so a duplicate is dropped rather than counted against the limit
+    notification = insert_or_ignore(db, Notification, {
+        **values,
+        "status": NotificationStatus.QUEUED,
+        "dedupe_key": dedupe_key or default_dedupe_key(channel, recipient, subject, body, now),
+    })
+    if notification is None:
+        metrics.inc("notifications.deduplicated")
+        return None
+
+    # This message and the ones inserted before it
+    sent_before = db.scalar(
+        select(func.count()).select_from(Notification).where(
+            Notification.recipient == recipient,
+            Notification.created_at > now - timedelta(seconds=settings.NOTIFY_RATE_WINDOW_SECONDS),
+            Notification.status != NotificationStatus.RATE_LIMITED,
+            Notification.id <= notification.id,
+        )
+    )
+    if sent_before > settings.NOTIFY_RATE_LIMIT:
+        metrics.inc("notifications.rate_limited")
+        notification.status = NotificationStatus.RATE_LIMITED
+        notification.next_attempt_at = None
+        db.flush()
+        return notification
+
+    metrics.inc("notifications.queued")
+    _ensure_delivery(db, settings.NOTIFY_BATCH_DELAY_SECONDS)
+    return notification
+
+
+def _claim_batch(db: Session, now: datetime) -> List[Notification]:
+    # Put back messages from a delivery run that died mid-batch
+    db.execute(
+        update(Notification)
+        .where(
+            Notification.status == NotificationStatus.SENDING,
+            Notification.last_attempt_at < now - timedelta(seconds=settings.JOB_STALE_AFTER_SECONDS),
+        )
+        .values(status=NotificationStatus.QUEUED)
+    )
+    ids = db.scalars(
+        select(Notification.id)
+        .where(Notification.status == NotificationStatus.QUEUED, Notification.next_attempt_at <= now)
+        .order_by(Notification.id)
+        .limit(settings.NOTIFY_BATCH_SIZE)
+    ).all()
+    if not ids:
+        db.commit()
+        return []
+    claimed = db.scalars(
+        update(Notification)
+        .where(Notification.id.in_(ids), Notification.status == NotificationStatus.QUEUED)
+        .values(status=NotificationStatus.SENDING, last_attempt_at=now, attempts=Notification.attempts + 1)
+        .returning(Notification),
+        execution_options={"synchronize_session": False},
+    ).all()
+    db.commit()
+    return sorted(claimed, key=lambda notification: notification.id)
+
+
+def deliver(db: Session) -> Dict[str, int]:
+    """
+    Send one batch of due notifications and record the outcomes. Queues the
+    next delivery job if anything is left. Returns counts by outcome.
+    """
+    from app.jobs.queue import retry_delay
+
+    now = utcnow()
+    batch = _claim_batch(db, now)
+    by_channel: Dict[str, List[Notification]] = {}
+    for notification in batch:
+        by_channel.setdefault(notification.channel, []).append(notification)
+
+    outcome = {"sent": 0, "failed": 0, "retrying": 0}
+    for channel, notifications in by_channel.items():
+        try:
+            errors = get_sender(channel).send_batch(notifications)
+        except Exception as exc:  # misconfigured backend: record it on every message
+            errors = [f"{type(exc).__name__}: {exc}"] * len(notifications)
+        finished = utcnow()
+        for notification, error in zip(notifications, errors):
+            if error is None:
+                notification.status = NotificationStatus.SENT
+                notification.sent_at = finished
+                notification.error = None
+                outcome["sent"] += 1
+            elif notification.attempts < settings.NOTIFY_MAX_ATTEMPTS:
+                notification.status = NotificationStatus.QUEUED
+                notification.next_attempt_at = finished + timedelta(seconds=retry_delay(notification.attempts))
+                notification.error = error
+                outcome["retrying"] += 1
+            else:
+                notification.status = NotificationStatus.FAILED
+                notification.error = error
+                outcome["failed"] += 1
+    db.commit()
+    for name in ("sent", "failed"):
+        metrics.inc(f"notifications.{name}", outcome[name])
+    metrics.inc("notifications.retried", outcome["retrying"])
+
+    next_due = db.scalar(
+        select(func.min(Notification.next_attempt_at)).where(Notification.status == NotificationStatus.QUEUED)
+    )
+    if next_due is not None:
+        _ensure_delivery(db, max((next_due - utcnow()).total_seconds(), 0))
+        db.commit()
+    return outcome
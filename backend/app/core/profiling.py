@@ -0,0 +1,294 @@
+"""
+Sampling profiler for individual requests
+
+A background thread snapshots the Python stacks of the threads that serve
+requests at a fixed interval while a request runs, and the samples are
+written in the "folded stacks" format understood by flamegraph.pl,
+speedscope and inferno (one "root;caller;callee count" line per distinct
+stack). Each stack starts with the thread name; async routes run on the
+event loop thread, sync routes and dependencies in threadpool workers.
+
+Only the event loop thread and busy threadpool workers are sampled, so
+background threads (job workers, the audit flusher) stay out of the
+profile. Other requests in flight in the same process share those threads
+and can still show up; profile against an otherwise idle worker to see one
+request on its own.
+
+Two ways to profile:
+
+- On demand: an admin sends `X-Profile: store` (or `?profile=store`) and
+  gets an `X-Profile-Id` header; the profile is then available from
+  GET /profiles/{id}. `X-Profile: return` replaces the response body with
+  the profile itself.
+- Sampled: with PROFILE_SAMPLE_EVERY = N > 0, one request in N is profiled
+  and stored. Requests that aren't sampled only pay for a counter check.
+
+At most one profile runs at a time per process; requests arriving while
+one is running are served without profiling.
+"""
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Callable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, QueryParams
+
+from app.core import metrics
+from app.core.config import settings
+
+PROFILE_HEADER = "x-profile"
+PROFILE_MODES = ("store", "return")
+# anyio's name for the threadpool threads run_in_threadpool uses
+WORKER_THREAD_NAME = "AnyIO worker thread"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    cwd = os.getcwd()
+    if path.startswith(cwd):
+        path = os.path.relpath(path, cwd)
+    else:
+        path = "/".join(path.split(os.sep)[-2:])
+    return f"{code.co_name} ({path}:{frame.f_lineno})".replace(";", ":")
+
+
+def _idle(frame) -> bool:
+    """Whether frame is a pool thread waiting for work (Queue.get called from the thread's run())."""
+    while frame is not None:
+        if frame.f_code is queue.Queue.get.__code__:
+            return frame.f_back is not None and frame.f_back.f_code.co_name == "run"
+        frame = frame.f_back
+    return False
+
+
+def request_threads(loop_thread: int) -> Callable[[threading.Thread], bool]:
+    """Matches the event loop thread and the threadpool workers."""
+    return lambda thread: thread.ident == loop_thread or thread.name.startswith(WORKER_THREAD_NAME)
+
+
+class Sampler:
+    """
+    Collects stack samples until stopped: from the threads include() accepts
+    (all other threads by default), skipping idle pool threads.
+    """
+
+    def __init__(self, interval: float, include: Optional[Callable[[threading.Thread], bool]] = None):
+        self.interval = interval
+        self.include = include
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                thread = threads.get(ident)
+                if ident == me or (self.include is not None and (thread is None or not self.include(thread))):
+                    continue
+                if _idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(thread.name if thread is not None else f"thread-{ident}")
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def folded(samples: Counter) -> str:
+    """Samples as folded stacks, most frequent first."""
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class ProfileStore:
+    """
+    Profiles on disk, so any worker process can serve them. Keeps the
+    newest max_profiles and deletes older ones.
+    """
+
+    def __init__(self, root: str, max_profiles: int):
+        self.root = os.path.abspath(root)
+        self.max_profiles = max_profiles
+
+    def _path(self, profile_id: str, ext: str) -> str:
+        return os.path.join(self.root, f"{profile_id}.{ext}")
+
+    def save(self, profile_id: str, samples: Counter, meta: dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(profile_id, "folded"), "w") as out:
+            out.write(folded(samples))
+        with open(self._path(profile_id, "json"), "w") as out:
+            json.dump({"id": profile_id, "samples": sum(samples.values()), **meta}, out)
+        self._trim()
+
+    def _trim(self) -> None:
+        entries = self.list()
+        for meta in entries[self.max_profiles:]:
+            for ext in ("folded", "json"):
+                try:
+                    os.unlink(self._path(meta["id"], ext))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[dict]:
+        """Stored profile metadata, newest first."""
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(entries, key=lambda meta: meta.get("started_at", 0), reverse=True)
+
+    def get(self, profile_id: str) -> Optional[str]:
+        try:
+            uuid.UUID(profile_id)
+        except ValueError:
+            return None
+        try:
+            with open(self._path(profile_id, "folded")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def get_profile_store() -> ProfileStore:
+    return ProfileStore(settings.PROFILE_STORE_PATH, settings.PROFILE_STORE_MAX)
+
+
+def _is_admin(scope) -> bool:
+    """Run the require_admin dependency chain for this request's token."""
+    from app.auth.dependencies import require_admin, require_principal
+    from app.database import get_db
+
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+
+    app = scope.get("app")
+    overrides = getattr(app, "dependency_overrides", {})
+    sessions = overrides.get(get_db, get_db)()
+    db = next(sessions)
+    try:
+        require_admin(require_principal(db=db, token=token))
+        return True
+    except Exception:
+        return False
+    finally:
+        sessions.close()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests on demand or by sampling."""
+
+    def __init__(self, app):
+        self.app = app
+        self._counter = itertools.count(1)
+        self._busy = threading.Lock()
+
+    def _requested_mode(self, scope) -> Optional[str]:
+        mode = Headers(scope=scope).get(PROFILE_HEADER)
+        if mode is None:
+            mode = QueryParams(scope.get("query_string", b"")).get("profile")
+        if mode is None:
+            return None
+        mode = mode.lower()
+        if mode in ("1", "true"):
+            mode = "store"
+        return mode if mode in PROFILE_MODES else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode = self._requested_mode(scope)
+        if mode is not None and not await run_in_threadpool(_is_admin, scope):
+            mode = None
+        if mode is None and settings.PROFILE_SAMPLE_EVERY > 0:
+            if next(self._counter) % settings.PROFILE_SAMPLE_EVERY == 0:
+                mode = "store"
+        if mode is None:
+            return await self.app(scope, receive, send)
+
+        if not self._busy.acquire(blocking=False):
+            metrics.inc("profiling.skipped_busy")
+            return await self.app(scope, receive, send)
+        try:
+            await self._profile(scope, receive, send, mode)
+        finally:
+            self._busy.release()
+
+    async def _profile(self, scope, receive, send, mode: str) -> None:
+        profile_id = str(uuid.uuid4())
+        status = {}
+        started_at = time.time()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if mode == "return":
+                    return
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            elif message["type"] == "http.response.body" and mode == "return":
+                return
+            await send(message)
+
+        include = request_threads(threading.get_ident())
+        sampler = Sampler(settings.PROFILE_SAMPLE_INTERVAL_SECONDS, include).start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            samples = sampler.stop()
+            metrics.inc("profiling.requests_profiled")
+
+        meta = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status.get("code"),
+            "started_at": started_at,
+            "duration_seconds": time.perf_counter() - started,
+            "interval_seconds": settings.PROFILE_SAMPLE_INTERVAL_SECONDS,
+        }
+        if mode == "store":
+            await run_in_threadpool(get_profile_store().save, profile_id, samples, meta)
+            return
+
+        body = folded(samples).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-id", profile_id.encode()),
+                (b"x-profile-status", str(meta["status"]).encode()),
+                (b"x-profile-duration", f"{meta['duration_seconds']:.6f}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,26 +1,179 @@
-import os
-from typing import BinaryIO
+import hashlib
+from functools import lru_cache
+from typing import BinaryIO, List, Optional, Tuple
 import uuid
 import boto3
 from botocore.client import Config
+from sqlalchemy import update, delete, select, func, bindparam
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from botocore.exceptions import ClientError, NoCredentialsError
-from app.models.image import Image
+from botocore.exceptions import ClientError
+from app.core.config import settings
+from app.models.image import Image, StoredObject
 
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
-S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "my-default-bucket")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@lru_cache
+def _build_client(region: str, endpoint_url: str):
+    return boto3.client(
+        "s3",
+        region_name=region,
+        endpoint_url=endpoint_url or None,
+        config=Config(s3={"addressing_style": "path"}),
+    )
+
+
+def get_client():
+    """Blocking S3 client for the configured region and endpoint, created on first use."""
+    return _build_client(settings.AWS_REGION, settings.S3_ENDPOINT_URL)
 
-s3 = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    config=Config(s3={"addressing_style": "path"}),
-)
 
 def generate_s3_key(filename: str) -> str:
     """Generate a unique S3 key for the given filename."""
     unique_id = str(uuid.uuid4())
     return f"uploads/{unique_id}/{filename}"
 
+
+def generate_content_key(content_hash: str) -> str:
+    """
+    S3 key for a new stored object, grouped under its content hash. Each
+    registration gets a fresh generation suffix, so bytes uploaded again
+    after their object was released never land on the key a pending
+    images.delete_object job is about to remove.
+    """
+    return f"objects/{content_hash[:2]}/{content_hash}/{uuid.uuid4().hex}"
+
+
+def hash_file(file_obj: BinaryIO, chunk_size: int = HASH_CHUNK_SIZE) -> Tuple[str, int]:
+    """
+    Stream the file once, returning its SHA-256 hex digest and size.
+    The file pointer is rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest(), size
+
+
+def acquire_object(db: Session, content_hash: str) -> Optional[StoredObject]:
+    """
+    Take a reference on an existing stored object.
+    Returns None if no object with this hash exists yet. A miss rolls the
+    transaction back, so the caller holds no connection or write lock while
+    it uploads the new object.
+    """
+    result = db.execute(
+        update(StoredObject)
+        .where(StoredObject.content_hash == content_hash)
+        .values(ref_count=StoredObject.ref_count + 1)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        return None
+    return db.get(StoredObject, content_hash, populate_existing=True)
+
+
+def register_object(
+    db: Session,
+    content_hash: str,
+    s3_key: str,
+    size: int,
+    content_type: str,
+) -> StoredObject:
+    """
+    Record a freshly uploaded object with one reference. If another request
+    registered the same content first, take a reference on theirs instead.
+    """
+    stored = StoredObject(
+        content_hash=content_hash,
+        s3_key=s3_key,
+        size=size,
+        content_type=content_type,
+        ref_count=1,
+    )
+    try:
+        with db.begin_nested():
+            db.add(stored)
+    except IntegrityError:
+        stored = acquire_object(db, content_hash)
+    return stored
+
+
+def release_image(db: Session, image: Image) -> Optional[str]:
+    """
+    Delete an Image row and drop its reference on the stored object.
+    Returns the S3 key to delete once the last reference is gone, or None
+    if the object is still in use. The caller commits.
+    """
+    s3_key = image.s3_key
+    content_hash = image.content_hash
+    db.delete(image)
+    db.flush()
+
+    if content_hash is None:
+        # Not deduplicated, the object belongs to this image alone
+        return s3_key
+
+    db.execute(
+        update(StoredObject)
+        .where(StoredObject.content_hash == content_hash)
+        .values(ref_count=StoredObject.ref_count - 1)
+    )
+    result = db.execute(
+        delete(StoredObject)
+        .where(StoredObject.content_hash == content_hash, StoredObject.ref_count <= 0)
+    )
+    return s3_key if result.rowcount else None
+
+
+def release_owner_images(db: Session, owner_id: int) -> Tuple[int, List[str]]:
+    """
+    Set-based release_image for every image a user owns: one grouped SELECT,
+    one batched reference-count UPDATE and two DELETEs regardless of how many
+    images there are. Returns (images deleted, object keys no longer
+    referenced). The caller commits.
+    """
+    refs = db.execute(
+        select(Image.content_hash, func.count())
+        .where(Image.owner_id == owner_id, Image.content_hash.is_not(None))
+        .group_by(Image.content_hash)
+    ).all()
+    unshared_keys = list(db.scalars(
+        select(Image.s3_key).where(Image.owner_id == owner_id, Image.content_hash.is_(None))
+    ))
+
+    deleted = db.execute(delete(Image).where(Image.owner_id == owner_id)).rowcount
+
+    orphaned_keys: List[str] = []
+    if refs:
+        hashes = [content_hash for content_hash, _ in refs]
+        stored = StoredObject.__table__
+        db.execute(
+            update(stored)
+            .where(stored.c.content_hash == bindparam("hash"))
+            .values(ref_count=stored.c.ref_count - bindparam("refs")),
+            [{"hash": content_hash, "refs": count} for content_hash, count in refs],
+        )
+        orphaned_keys = list(db.scalars(
+            select(StoredObject.s3_key)
+            .where(StoredObject.content_hash.in_(hashes), StoredObject.ref_count <= 0)
+        ))
+        db.execute(
+            delete(StoredObject)
+            .where(StoredObject.content_hash.in_(hashes), StoredObject.ref_count <= 0)
+        )
+
+    return deleted, unshared_keys + orphaned_keys
+
+
 def upload_file(
     file_obj: BinaryIO,
     filename: str,
@@ -36,9 +189,9 @@ def upload_file(
         s3_key = generate_s3_key(filename)
 
     # Upload to S3
-    s3.upload_fileobj(
+    get_client().upload_fileobj(
         Fileobj=file_obj,
-        Bucket=S3_BUCKET_NAME,
+        Bucket=settings.S3_BUCKET_NAME,
         Key=s3_key,
         ExtraArgs={
             "ContentType": content_type,
@@ -49,30 +202,34 @@ def upload_file(
 
     return s3_key
 
+
 def create_presigned_download_url(s3_key: str, expires_in: int = 3600) -> str:
     try:
-        return s3.generate_presigned_url(
+        return get_client().generate_presigned_url(
             "get_object",
-            Params={"Bucket": S3_BUCKET_NAME, "Key": s3_key},
+            Params={"Bucket": settings.S3_BUCKET_NAME, "Key": s3_key},
             ExpiresIn=expires_in,
         )
     except ClientError as e:
         # Log error in real code
         raise RuntimeError("Failed to generate presigned URL") from e
-    
+
+
 def delete_image(db: Session, image_id):
     image = db.get(Image, image_id)
     if not image:
         return
 
-    # Delete from S3
-    try:
-        s3.delete_object(Bucket=S3_BUCKET_NAME, Key=image.s3_key)
-    except NoCredentialsError:
-        # In test environments or misconfigured environments, do not
-        # fail hard — just skip deletion. Tests monkeypatch this where
-        # needed, but be defensive here as well.
+    s3_key = release_image(db, image)
+    db.commit()
+    if s3_key is None:
+        # Other images still reference the object
         return
+
+    # Delete from S3. Missing credentials are a configuration error and
+    # propagate; use STORAGE_BACKEND=local when running without AWS.
+    try:
+        get_client().delete_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
     except ClientError:
         # Could not delete for some reason; in production we'd log/raise
         # For tests, swallow the error to avoid failing the suite.
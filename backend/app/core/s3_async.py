@@ -0,0 +1,247 @@
+"""
+Asynchronous S3 helpers
+
+Non-blocking counterparts of the functions in app.core.s3, built on aioboto3.
+A single client (and therefore a single connection pool) is shared per
+process and event loop, and transfers are bounded by a semaphore so a burst
+of uploads can't exhaust the pool.
+"""
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, BinaryIO, List, Optional
+
+import aioboto3
+from aiobotocore.config import AioConfig
+from botocore.exceptions import ClientError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.s3 import generate_s3_key, release_image
+from app.models.image import Image
+
+S3_DELETE_BATCH_SIZE = 1000  # DeleteObjects limit
+
+_session: Optional[aioboto3.Session] = None
+_client: Any = None
+_client_stack: Optional[AsyncExitStack] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_client_lock: Optional[asyncio.Lock] = None
+_transfer_semaphore: Optional[asyncio.Semaphore] = None
+
+
+async def get_s3_client():
+    """
+    Return the process-wide async S3 client, creating it on first use.
+
+    The client is tied to the event loop it was created on; if called from a
+    different loop (e.g. between test cases) a fresh client is created.
+    """
+    global _session, _client, _client_stack, _client_loop, _client_lock, _transfer_semaphore
+
+    loop = asyncio.get_running_loop()
+    if _client is not None and _client_loop is loop:
+        return _client
+
+    if _client_loop is not loop:
+        _client_lock = asyncio.Lock()
+        _client = None
+        _client_stack = None
+        _client_loop = loop
+
+    async with _client_lock:
+        if _client is None:
+            if _session is None:
+                _session = aioboto3.Session()
+            stack = AsyncExitStack()
+            _client = await stack.enter_async_context(
+                _session.client(
+                    "s3",
+                    region_name=settings.AWS_REGION,
+                    endpoint_url=settings.S3_ENDPOINT_URL or None,
+                    config=AioConfig(
+                        s3={"addressing_style": "path"},
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                    ),
+                )
+            )
+            _client_stack = stack
+            _transfer_semaphore = asyncio.Semaphore(settings.S3_MAX_CONCURRENT_TRANSFERS)
+    return _client
+
+
+async def close_s3_client() -> None:
+    """Close the shared client and release its connection pool."""
+    global _client, _client_stack, _client_loop, _transfer_semaphore
+
+    if _client_stack is not None:
+        await _client_stack.aclose()
+    _client = None
+    _client_stack = None
+    _client_loop = None
+    _transfer_semaphore = None
+
+
+async def upload_file(
+    file_obj: BinaryIO,
+    filename: str,
+    content_type: str,
+    s3_key: Optional[str] = None,
+) -> str:
+    """
+    Upload a file object to S3 without blocking the event loop.
+    Returns the S3 key the object was stored under.
+    """
+    client = await get_s3_client()
+    file_obj.seek(0)
+
+    if s3_key is None:
+        s3_key = generate_s3_key(filename)
+
+    async with _transfer_semaphore:
+        await client.upload_fileobj(
+            file_obj,
+            settings.S3_BUCKET_NAME,
+            s3_key,
+            ExtraArgs={
+                "ContentType": content_type,
+                "ACL": "private",
+                "ServerSideEncryption": "AES256",
+            },
+        )
+
+    return s3_key
+
+
+async def create_presigned_download_url(s3_key: str, expires_in: int = 3600) -> str:
+    client = await get_s3_client()
+    try:
+        return await client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": settings.S3_BUCKET_NAME, "Key": s3_key},
+            ExpiresIn=expires_in,
+        )
+    except ClientError as e:
+        raise RuntimeError("Failed to generate presigned URL") from e
+
+
+async def create_presigned_post(
+    s3_key: str,
+    content_type: str,
+    max_size: int,
+    expires_in: int = 900,
+) -> dict:
+    """
+    Create a presigned POST policy that lets a browser upload a single object
+    straight to S3. The policy pins the key and content type and bounds the
+    body size, so the client can't use it to store anything else.
+    """
+    client = await get_s3_client()
+    fields = {
+        "Content-Type": content_type,
+        "acl": "private",
+        "x-amz-server-side-encryption": "AES256",
+    }
+    conditions = [
+        {"Content-Type": content_type},
+        {"acl": "private"},
+        {"x-amz-server-side-encryption": "AES256"},
+        ["content-length-range", 1, max_size],
+    ]
+    try:
+        return await client.generate_presigned_post(
+            Bucket=settings.S3_BUCKET_NAME,
+            Key=s3_key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expires_in,
+        )
+    except ClientError as e:
+        raise RuntimeError("Failed to generate presigned POST") from e
+
+
+async def head_object(s3_key: str) -> Optional[dict]:
+    """
+    Return the object's metadata, or None if it doesn't exist.
+    """
+    client = await get_s3_client()
+    try:
+        return await client.head_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+async def download_fileobj(s3_key: str, file_obj: BinaryIO) -> None:
+    """Download a whole object into a writable file object."""
+    client = await get_s3_client()
+    async with _transfer_semaphore:
+        await client.download_fileobj(settings.S3_BUCKET_NAME, s3_key, file_obj)
+
+
+async def get_object(s3_key: str, byte_range: Optional[str] = None) -> dict:
+    """
+    Start a GetObject request, optionally for an HTTP Range. The caller
+    reads (and closes) the streaming "Body".
+    """
+    client = await get_s3_client()
+    params = {"Bucket": settings.S3_BUCKET_NAME, "Key": s3_key}
+    if byte_range:
+        params["Range"] = byte_range
+    return await client.get_object(**params)
+
+
+async def delete_object(s3_key: str) -> None:
+    """Delete a single object by key."""
+    client = await get_s3_client()
+    async with _transfer_semaphore:
+        await client.delete_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+
+
+async def delete_objects(s3_keys: List[str]) -> None:
+    """
+    Delete many objects using DeleteObjects, up to 1000 keys per request.
+    Raises RuntimeError listing the keys S3 failed to delete.
+    """
+    client = await get_s3_client()
+    failed = []
+    for start in range(0, len(s3_keys), S3_DELETE_BATCH_SIZE):
+        batch = s3_keys[start:start + S3_DELETE_BATCH_SIZE]
+        async with _transfer_semaphore:
+            response = await client.delete_objects(
+                Bucket=settings.S3_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        failed.extend(error["Key"] for error in response.get("Errors", []))
+    if failed:
+        raise RuntimeError(f"Failed to delete {len(failed)} objects: {failed[:10]}")
+
+
+def _release(db: Session, image_id) -> Optional[str]:
+    image = db.get(Image, image_id)
+    if not image:
+        return None
+    s3_key = release_image(db, image)
+    db.commit()
+    return s3_key
+
+
+async def delete_image(db: Session, image_id) -> bool:
+    """
+    Delete an image, and its S3 object once no other image references it.
+    Returns True if the object was deleted, False if the image doesn't exist,
+    the object is still shared, or S3 refused the request. Missing
+    credentials are a configuration error and are raised.
+    """
+    # The session is synchronous; keep its queries off the event loop
+    s3_key = await asyncio.to_thread(_release, db, image_id)
+    if s3_key is None:
+        return False
+
+    client = await get_s3_client()
+    try:
+        async with _transfer_semaphore:
+            await client.delete_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+    except ClientError:
+        return False
+    return True
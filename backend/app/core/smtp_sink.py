@@ -0,0 +1,178 @@
+"""
+Local SMTP sink
+
+A minimal SMTP server that accepts every message and keeps it in memory,
+standing in for a real mail server in tests and local development:
+
+    python -m app.core.smtp_sink --port 1025
+
+then run the API with NOTIFY_EMAIL_BACKEND=smtp (SMTP_HOST/SMTP_PORT default
+to localhost:1025); received messages are printed.
+
+In tests:
+
+    with SMTPSink() as sink:
+        ... send to localhost:sink.port ...
+        sink.messages, sink.connections
+
+Addresses in sink.reject are refused at RCPT TO, to exercise failures.
+"""
+import argparse
+import socketserver
+import threading
+from dataclasses import dataclass
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from typing import List, Optional, Set
+
+
+@dataclass
+class ReceivedMessage:
+    mail_from: str
+    recipients: List[str]
+    data: bytes
+
+    @property
+    def message(self) -> EmailMessage:
+        return message_from_bytes(self.data, policy=policy.default)
+
+
+def _address(argument: str) -> str:
+    """The address in 'FROM:<a@b> SIZE=..' / 'TO:<a@b>'."""
+    _, _, value = argument.partition(":")
+    value = value.strip()
+    if value.startswith("<"):
+        value = value[1:value.find(">")]
+    return value.split()[0] if value else ""
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        sink: SMTPSink = self.server.sink
+        sink._connected()
+        self._reply("220 smtp-sink ready")
+        mail_from: Optional[str] = None
+        recipients: List[str] = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+            command = command.upper()
+            if command == "EHLO":
+                self._reply("250-smtp-sink")
+                self._reply("250-8BITMIME")
+                self._reply("250 SMTPUTF8")
+            elif command == "HELO":
+                self._reply("250 smtp-sink")
+            elif command == "MAIL":
+                mail_from, recipients = _address(argument), []
+                self._reply("250 OK")
+            elif command == "RCPT":
+                address = _address(argument)
+                if address in sink.reject:
+                    self._reply("550 Mailbox unavailable")
+                else:
+                    recipients.append(address)
+                    self._reply("250 OK")
+            elif command == "DATA":
+                if mail_from is None or not recipients:
+                    self._reply("503 Need MAIL and RCPT first")
+                    continue
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                sink._received(ReceivedMessage(mail_from, recipients, b"".join(lines)))
+                mail_from, recipients = None, []
+                self._reply("250 OK")
+            elif command == "RSET":
+                mail_from, recipients = None, []
+                self._reply("250 OK")
+            elif command == "NOOP":
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """SMTP server on a background thread; use as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, echo: bool = False):
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.echo = echo
+        self.messages: List[ReceivedMessage] = []
+        self.connections = 0
+        self.reject: Set[str] = set()
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _connected(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _received(self, received: ReceivedMessage) -> None:
+        with self._lock:
+            self.messages.append(received)
+        if self.echo:
+            message = received.message
+            print(f"--- {received.mail_from} -> {', '.join(received.recipients)}: {message['subject']}")
+            print(message.get_content().rstrip())
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "SMTPSink":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local SMTP server that prints what it receives")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args(argv)
+
+    sink = SMTPSink(args.host, args.port, echo=True)
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    try:
+        sink._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
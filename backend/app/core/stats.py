@@ -0,0 +1,123 @@
+"""
+Admin dashboard statistics
+
+Reads the counters in stat_counters (see app.models.stats), which are kept
+up to date as users and listings change. If they ever drift (e.g. after a manual SQL
+fix), recompute them from the source tables:
+
+    python -m app.core.stats rebuild
+"""
+import argparse
+from datetime import date, datetime, timedelta, UTC
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.orm import Session
+
+from app.models.listing import Listing
+from app.models.stats import (
+    LISTINGS_BY_PARISH,
+    LISTINGS_CREATED,
+    LISTINGS_TOTAL,
+    StatCounter,
+    USERS_ADMINS,
+    USERS_BY_PARISH,
+    USERS_SIGNUPS,
+    USERS_TOTAL,
+    adjust_counters,
+)
+from app.models.user import User
+
+UNASSIGNED_PARISH = "unassigned"
+
+
+def get_summary(db: Session, days: int = 30) -> dict:
+    """Dashboard totals plus signups and new listings for each of the last `days` days."""
+    rows = db.execute(select(StatCounter.metric, StatCounter.key, StatCounter.value)).all()
+
+    totals = {}
+    by_parish = {USERS_BY_PARISH: {}, LISTINGS_BY_PARISH: {}}
+    per_day = {USERS_SIGNUPS: {}, LISTINGS_CREATED: {}}
+    for metric, key, value in rows:
+        if metric in by_parish:
+            if value:
+                by_parish[metric][key or UNASSIGNED_PARISH] = value
+        elif metric in per_day:
+            per_day[metric][key] = value
+        else:
+            totals[metric] = value
+
+    today = datetime.now(UTC).date()
+    first = today - timedelta(days=days - 1)
+    window = [first + timedelta(days=i) for i in range(days)]
+    return {
+        "users_total": totals.get(USERS_TOTAL, 0),
+        "admins": totals.get(USERS_ADMINS, 0),
+        "users_by_parish": by_parish[USERS_BY_PARISH],
+        "signups_per_day": [
+            {"date": day, "count": per_day[USERS_SIGNUPS].get(day.isoformat(), 0)} for day in window
+        ],
+        "listings_total": totals.get(LISTINGS_TOTAL, 0),
+        "listings_by_parish": by_parish[LISTINGS_BY_PARISH],
+        "listings_per_day": [
+            {"date": day, "count": per_day[LISTINGS_CREATED].get(day.isoformat(), 0)} for day in window
+        ],
+    }
+
+
+def _day_key(day) -> str:
+    return day.isoformat() if isinstance(day, date) else str(day)
+
+
+def rebuild(db: Session) -> int:
+    """
+    Recompute every counter from the source tables in one transaction.
+    Returns the number of counters written.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Hold off writers so no change lands between the scan and the swap
+        db.execute(text("LOCK TABLE users, listings IN SHARE MODE"))
+
+    deltas = {}
+    deltas[(USERS_TOTAL, "")] = db.scalar(select(func.count()).select_from(User))
+    deltas[(USERS_ADMINS, "")] = db.scalar(select(func.count()).select_from(User).where(User.admin.is_(True)))
+    for parish, count in db.execute(select(User.parish, func.count()).group_by(User.parish)):
+        key = (USERS_BY_PARISH, parish or "")
+        deltas[key] = deltas.get(key, 0) + count
+    signup_day = func.date(User.created_at)
+    for day, count in db.execute(
+        select(signup_day, func.count()).where(User.created_at.is_not(None)).group_by(signup_day)
+    ):
+        deltas[(USERS_SIGNUPS, _day_key(day))] = count
+
+    deltas[(LISTINGS_TOTAL, "")] = db.scalar(select(func.count()).select_from(Listing))
+    for parish, count in db.execute(select(Listing.parish, func.count()).group_by(Listing.parish)):
+        key = (LISTINGS_BY_PARISH, parish or "")
+        deltas[key] = deltas.get(key, 0) + count
+    created_day = func.date(Listing.created_at)
+    for day, count in db.execute(select(created_day, func.count()).group_by(created_day)):
+        deltas[(LISTINGS_CREATED, _day_key(day))] = count
+
+    db.execute(delete(StatCounter))
+    adjust_counters(db.connection(), deltas)
+    db.commit()
+    return sum(1 for value in deltas.values() if value)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain admin dashboard statistics")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(db)} counters")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Image storage backends
+
+Routes talk to a StorageBackend instead of S3 directly. The backend is
+picked by settings.STORAGE_BACKEND:
+
+- "s3": objects live in S3 (app.core.s3_async)
+- "local": objects live on disk under settings.LOCAL_STORAGE_PATH and are
+  served by the API itself, so dev and CI need no cloud credentials
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
+from typing import BinaryIO, List, Optional
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core import s3_async
+from app.auth.security import create_access_token
+from app.core.s3 import (
+    generate_content_key,
+    hash_file,
+    acquire_object,
+    register_object,
+)
+from app.models.image import Image
+
+COPY_CHUNK_SIZE = 1024 * 1024
+LOCAL_UPLOAD_POLICY_TYPE = "local_upload"
+
+
+@dataclass
+class ObjectInfo:
+    size: int
+    content_type: Optional[str]
+
+
+class StorageBackend(ABC):
+    """Operations every image store must support."""
+
+    name: str
+
+    @abstractmethod
+    async def save(self, key: str, file_obj: BinaryIO, content_type: str) -> None:
+        """Store the file under key, overwriting any existing object."""
+
+    @abstractmethod
+    async def head(self, key: str) -> Optional[ObjectInfo]:
+        """Return object metadata, or None if it doesn't exist."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete the object. Deleting a missing object is not an error."""
+
+    async def delete_many(self, keys: List[str]) -> None:
+        """Delete several objects. Backends override this with a bulk call."""
+        for key in keys:
+            await self.delete(key)
+
+    @abstractmethod
+    async def download_url(self, key: str, expires_in: int = 3600) -> str:
+        """Time-limited URL the client can fetch the object from."""
+
+    @abstractmethod
+    async def create_upload(self, key: str, content_type: str, max_size: int, expires_in: int) -> dict:
+        """Form URL and fields for a direct browser upload of one object."""
+
+    @abstractmethod
+    def object_url(self, key: str) -> str:
+        """Canonical, non-expiring reference stored on the Image row."""
+
+    @abstractmethod
+    async def serve(self, key: str) -> Response:
+        """Response delivering the object to the client."""
+
+
+class S3Storage(StorageBackend):
+    name = "s3"
+
+    async def save(self, key: str, file_obj: BinaryIO, content_type: str) -> None:
+        await s3_async.upload_file(file_obj, key, content_type, s3_key=key)
+
+    async def head(self, key: str) -> Optional[ObjectInfo]:
+        head = await s3_async.head_object(key)
+        if head is None:
+            return None
+        return ObjectInfo(size=head.get("ContentLength", 0), content_type=head.get("ContentType"))
+
+    async def delete(self, key: str) -> None:
+        await s3_async.delete_object(key)
+
+    async def delete_many(self, keys: List[str]) -> None:
+        await s3_async.delete_objects(keys)
+
+    async def download_url(self, key: str, expires_in: int = 3600) -> str:
+        return await s3_async.create_presigned_download_url(key, expires_in=expires_in)
+
+    async def create_upload(self, key: str, content_type: str, max_size: int, expires_in: int) -> dict:
+        return await s3_async.create_presigned_post(
+            key, content_type=content_type, max_size=max_size, expires_in=expires_in
+        )
+
+    def object_url(self, key: str) -> str:
+        return f"https://{settings.S3_BUCKET_NAME}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+
+    async def serve(self, key: str) -> Response:
+        return RedirectResponse(await self.download_url(key))
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores objects as plain files. Content type is kept in a small sidecar
+    file next to each object. Files are served with FileResponse, which
+    handles Range requests and uses zero-copy sends when the server
+    supports them.
+    """
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError("Key escapes the storage root")
+        return path
+
+    def _meta_path(self, key: str) -> str:
+        return self.path_for(key) + ".meta"
+
+    def _save_sync(self, key: str, file_obj: BinaryIO, content_type: str) -> None:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_obj.seek(0)
+        # Write to a temp file and rename so readers never see partial objects
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(file_obj, out, COPY_CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with open(self._meta_path(key), "w") as meta:
+            json.dump({"content_type": content_type}, meta)
+
+    def _head_sync(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            size = os.stat(self.path_for(key)).st_size
+        except FileNotFoundError:
+            return None
+        try:
+            with open(self._meta_path(key)) as meta:
+                content_type = json.load(meta).get("content_type")
+        except FileNotFoundError:
+            content_type = None
+        return ObjectInfo(size=size, content_type=content_type)
+
+    def _delete_sync(self, key: str) -> None:
+        for path in (self.path_for(key), self._meta_path(key)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    async def save(self, key: str, file_obj: BinaryIO, content_type: str) -> None:
+        await asyncio.to_thread(self._save_sync, key, file_obj, content_type)
+
+    async def head(self, key: str) -> Optional[ObjectInfo]:
+        return await asyncio.to_thread(self._head_sync, key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete_sync, key)
+
+    async def download_url(self, key: str, expires_in: int = 3600) -> str:
+        expires = int(time.time()) + expires_in
+        return f"{self.object_url(key)}?expires={expires}&signature={sign_local_url(key, expires)}"
+
+    async def create_upload(self, key: str, content_type: str, max_size: int, expires_in: int) -> dict:
+        policy = create_access_token(
+            data={"typ": LOCAL_UPLOAD_POLICY_TYPE, "key": key, "ct": content_type, "max": max_size},
+            expires_delta=timedelta(seconds=expires_in),
+        )
+        return {
+            "url": self.object_url(key),
+            "fields": {"key": key, "Content-Type": content_type, "policy": policy},
+        }
+
+    def object_url(self, key: str) -> str:
+        return f"{settings.API_V1_STR}/images/files/{quote(key)}"
+
+    async def serve(self, key: str) -> Response:
+        info = await self.head(key)
+        if info is None:
+            return Response(status_code=404)
+        return FileResponse(self.path_for(key), media_type=info.content_type)
+
+
+def sign_local_url(key: str, expires: int) -> str:
+    """HMAC signature for a local download URL."""
+    message = f"{key}:{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_url(key: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_local_url(key, expires), signature)
+
+
+@lru_cache
+def _build_storage(backend: str, local_path: str) -> StorageBackend:
+    if backend == "local":
+        return LocalStorage(local_path)
+    if backend == "s3":
+        return S3Storage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_storage() -> StorageBackend:
+    """Storage backend selected by the current settings."""
+    return _build_storage(settings.STORAGE_BACKEND, settings.LOCAL_STORAGE_PATH)
+
+
+async def store_image(
+    db: Session,
+    file_obj: BinaryIO,
+    content_type: str,
+    owner_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+) -> Image:
+    """
+    Store an image, deduplicated by content.
+
+    The file is hashed in one streaming pass (in a worker thread); if an
+    object with the same SHA-256 already exists it is reused and nothing is
+    transferred, otherwise the bytes go to a content-addressed key.
+
+    Database work runs in worker threads, and no transaction is open while
+    the bytes are uploaded. The session must have nothing pending.
+    """
+    storage = get_storage()
+    content_hash, size = await asyncio.to_thread(hash_file, file_obj)
+
+    stored = await asyncio.to_thread(acquire_object, db, content_hash)
+    if stored is None:
+        key = generate_content_key(content_hash)
+        await storage.save(key, file_obj, content_type)
+        stored = await asyncio.to_thread(register_object, db, content_hash, key, size, content_type)
+        if stored.s3_key != key:
+            # A concurrent upload of the same bytes registered first; ours is a spare copy
+            await storage.delete(key)
+
+    image = Image(
+        s3_key=stored.s3_key,
+        url=storage.object_url(stored.s3_key),
+        product_id=product_id,
+        owner_id=owner_id,
+        content_type=stored.content_type,
+        size=stored.size,
+        content_hash=content_hash,
+    )
+    return await asyncio.to_thread(_add_image, db, image)
+
+
+def _add_image(db: Session, image: Image) -> Image:
+    db.add(image)
+    db.commit()
+    db.refresh(image)
+    return image
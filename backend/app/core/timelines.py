@@ -0,0 +1,133 @@
+"""
+Per-parish listing timelines
+
+Browsing "what's new in my parish" reads one precomputed timeline instead
+of sorting every listing. When a listing is created its id is appended
+(fan-out on write) to its parish's timeline and to the island-wide one,
+in the same transaction. Each timeline keeps the newest
+TIMELINE_MAX_ENTRIES listings.
+
+Feed pages use keyset paging on listing_id, so every page is an index
+range scan no matter how deep the client scrolls.
+
+If timelines drift from the listings table (e.g. after a manual fix or a
+TIMELINE_MAX_ENTRIES change), rebuild them:
+
+    python -m app.core.timelines rebuild [--parish "St. Andrew"]
+"""
+import argparse
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.listing import Listing, TimelineEntry
+
+ALL_PARISHES = "*"
+
+
+def timeline_keys(parish: Optional[str]) -> List[str]:
+    """Timelines a listing in this parish belongs to."""
+    return [parish, ALL_PARISHES] if parish else [ALL_PARISHES]
+
+
+def _trim(db: Session, key: str) -> None:
+    cutoff = db.scalar(
+        select(TimelineEntry.listing_id)
+        .where(TimelineEntry.parish == key)
+        .order_by(TimelineEntry.listing_id.desc())
+        .offset(settings.TIMELINE_MAX_ENTRIES)
+        .limit(1)
+    )
+    if cutoff is not None:
+        db.execute(delete(TimelineEntry).where(TimelineEntry.parish == key, TimelineEntry.listing_id <= cutoff))
+
+
+def append(db: Session, listing: Listing) -> None:
+    """Add a new listing to its timelines. The caller commits."""
+    keys = timeline_keys(listing.parish)
+    db.execute(insert(TimelineEntry), [{"parish": key, "listing_id": listing.id} for key in keys])
+    for key in keys:
+        _trim(db, key)
+
+
+def remove(db: Session, listing_ids: Iterable[int]) -> None:
+    """Drop listings from every timeline. The caller commits."""
+    listing_ids = list(listing_ids)
+    if listing_ids:
+        db.execute(delete(TimelineEntry).where(TimelineEntry.listing_id.in_(listing_ids)))
+
+
+def read(
+    db: Session, parish: Optional[str], limit: int, before: Optional[int] = None
+) -> Tuple[List[Listing], Optional[int]]:
+    """
+    One page of a timeline, newest first, and the cursor for the next page
+    (None on the last one). parish=None reads the island-wide timeline.
+    """
+    query = (
+        select(Listing)
+        .join(TimelineEntry, TimelineEntry.listing_id == Listing.id)
+        .where(TimelineEntry.parish == (parish or ALL_PARISHES))
+        .order_by(TimelineEntry.listing_id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(TimelineEntry.listing_id < before)
+    listings = list(db.scalars(query))
+    if len(listings) > limit:
+        listings = listings[:limit]
+        return listings, listings[-1].id
+    return listings, None
+
+
+def rebuild(db: Session, parish: Optional[str] = None) -> int:
+    """
+    Recompute timelines from the listings table in one transaction: every
+    timeline, or only one parish's (and the island-wide one).
+    Returns the number of entries written.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Hold off new listings so none land between the scan and the swap
+        db.execute(text("LOCK TABLE listings IN SHARE MODE"))
+
+    if parish is None:
+        keys = [p for p in db.scalars(select(Listing.parish).distinct()) if p]
+        db.execute(delete(TimelineEntry))
+    else:
+        keys = [parish]
+        db.execute(delete(TimelineEntry).where(TimelineEntry.parish.in_([parish, ALL_PARISHES])))
+    keys.append(ALL_PARISHES)
+
+    written = 0
+    for key in keys:
+        query = select(Listing.id).order_by(Listing.id.desc()).limit(settings.TIMELINE_MAX_ENTRIES)
+        if key != ALL_PARISHES:
+            query = query.where(Listing.parish == key)
+        rows = [{"parish": key, "listing_id": listing_id} for listing_id in db.scalars(query)]
+        if rows:
+            db.execute(insert(TimelineEntry), rows)
+        written += len(rows)
+    db.commit()
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain per-parish listing timelines")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--parish", help="Only rebuild this parish (and the island-wide timeline)")
+    args = parser.parse_args(argv)
+
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt timelines with {rebuild(db, args.parish)} entries")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
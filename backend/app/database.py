@@ -1,27 +1,466 @@
-from sqlalchemy import create_engine
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import Request
+from sqlalchemy import Delete, Insert, Update, create_engine, event, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from starlette.datastructures import Headers
+from app.core import metrics
 from app.core.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    echo=False
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_engines: List[Engine] = []
+
+
+def instrument_engine(engine: Engine, name: str) -> Engine:
+    """Count queries and errors per engine as db.<name>.* metrics."""
+    _engines.append(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        metrics.inc(f"db.{name}.queries")
+
+    @event.listens_for(engine, "handle_error")
+    def _count_error(context):
+        metrics.inc(f"db.{name}.errors")
+
+    @event.listens_for(engine, "checkout")
+    def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.inc(f"db.{name}.checkouts")
+
+    @event.listens_for(engine, "connect")
+    def _count_connect(dbapi_connection, connection_record):
+        metrics.inc(f"db.{name}.connects")
+
+    return engine
+
+
+def _set_pragmas(dbapi_connection, pragmas: Dict[str, object]) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_sqlite_engines(url: str) -> Tuple[Engine, Engine]:
+    """
+    Writer and reader engines for one SQLite file, tuned for concurrent use.
+
+    The database runs in WAL mode, so readers never block the writer or
+    each other. All writes go through the writer engine's single pooled
+    connection: sessions queue for it (up to SQLITE_WRITE_TIMEOUT_SECONDS)
+    instead of racing for the file lock, and each write transaction starts
+    with BEGIN IMMEDIATE so it can't fail half-way with "database is
+    locked". Reads fan out over SQLITE_READ_POOL_SIZE read-only connections.
+    """
+    common_pragmas = {
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
+    connect_args = {"check_same_thread": False}
+
+    writer = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITE_TIMEOUT_SECONDS,
+    )
+    reader = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITE_TIMEOUT_SECONDS,
+    )
+
+    @event.listens_for(writer, "connect")
+    def _configure_writer(dbapi_connection, connection_record):
+        # Let SQLAlchemy's begin event issue BEGIN instead of the driver
+        dbapi_connection.isolation_level = None
+        _set_pragmas(dbapi_connection, {"journal_mode": "WAL", "synchronous": "NORMAL", **common_pragmas})
+
+    @event.listens_for(writer, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @event.listens_for(reader, "connect")
+    def _configure_reader(dbapi_connection, connection_record):
+        _set_pragmas(dbapi_connection, {"query_only": "ON", **common_pragmas})
+
+    # Switch the file to WAL before any reader opens it
+    with writer.connect():
+        pass
+
+    return instrument_engine(writer, "primary"), instrument_engine(reader, "reader")
+
+
+def replica_lag(engine: Engine) -> Optional[float]:
+    """
+    Seconds the replica is behind its primary, or None if it can't tell.
+    Only PostgreSQL streaming replicas report lag; other databases are
+    assumed to be in sync.
+    """
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    with engine.connect() as conn:
+        lag = conn.execute(text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )).scalar()
+    return float(lag) if lag is not None else 0.0
+
+
+class ReplicaPool:
+    """
+    Read replicas, picked round-robin among those whose replication lag is
+    within max_lag seconds. Lag is re-measured at most every check_interval
+    seconds per replica; a replica whose probe fails is skipped until the
+    next check.
+    """
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        max_lag: float,
+        check_interval: float,
+        lag_probe: Callable[[Engine], Optional[float]] = replica_lag,
+    ):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe
+        self._lag: Dict[int, float] = {}
+        self._checked_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def lag(self, index: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._checked_at.get(index, float("-inf")) < self.check_interval:
+                return self._lag[index]
+            self._checked_at[index] = now
+        try:
+            lag = self.lag_probe(self.engines[index])
+        except Exception:
+            metrics.inc(f"db.replica{index}.probe_errors")
+            lag = None
+        lag = float("inf") if lag is None else lag
+        with self._lock:
+            self._lag[index] = lag
+        metrics.set_gauge(f"db.replica{index}.lag_seconds", lag if lag != float("inf") else -1)
+        return lag
+
+    def choose(self) -> Optional[Engine]:
+        """A replica fresh enough to read from, or None."""
+        if not self.engines:
+            return None
+        start = next(self._next)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self.lag(index) <= self.max_lag:
+                return self.engines[index]
+        return None
+
+
+# Oldest write first, so expired entries are always at the front
+_recent_writes: OrderedDict[int, float] = OrderedDict()
+_recent_writes_lock = threading.Lock()
+
+
+def note_write(user_id: int) -> None:
+    """Remember that user_id just committed a write, forgetting expired writes."""
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[user_id] = now
+        _recent_writes.move_to_end(user_id)
+        expired = now - settings.DATABASE_READ_AFTER_WRITE_SECONDS
+        while _recent_writes and next(iter(_recent_writes.values())) <= expired:
+            _recent_writes.popitem(last=False)
+
+
+def recently_wrote(user_id: Optional[int]) -> bool:
+    """
+    True if user_id wrote within the read-after-write window through this
+    process. The fallback for clients that don't send back the
+    read-after-write cookie (see ReadAfterWriteMiddleware).
+    """
+    if user_id is None:
+        return False
+    with _recent_writes_lock:
+        written = _recent_writes.get(user_id)
+        if written is None:
+            return False
+        if time.monotonic() - written < settings.DATABASE_READ_AFTER_WRITE_SECONDS:
+            return True
+        del _recent_writes[user_id]
+        return False
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica and everything else to the primary.
+
+    Reads go to a replica only when the session was opened read-only
+    (info["read_only"]) or with route_reads=True, a fresh replica is available, the session hasn't
+    written yet and the requesting user hasn't just written. Writes, flushes
+    and SELECT ... FOR UPDATE always use the primary, and once a session
+    writes it stays on the primary so it reads its own changes.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: Optional[ReplicaPool] = None,
+        route_reads: bool = False,
+        **kwargs,
+    ):
+        kwargs.pop("bind", None)  # sessionmaker always passes one
+        super().__init__(bind=primary, **kwargs)
+        self.primary = primary
+        self.replicas = replicas
+        self.route_reads = route_reads
+        self._replica: Optional[Engine] = None
+
+    def _wants_primary(self, clause) -> bool:
+        if self._flushing or self.info.get("wrote"):
+            return True
+        if not (self.route_reads or self.info.get("read_only")):
+            return True
+        if isinstance(clause, (Insert, Update, Delete)) or getattr(clause, "_for_update_arg", None) is not None:
+            self.info["wrote"] = True
+            return True
+        state = self.info.get("request_state")
+        return wrote_within_window(getattr(state, "last_write_at", None)) or recently_wrote(
+            getattr(state, "user_id", None)
+        )
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replicas is None or self._wants_primary(clause):
+            metrics.inc("db.routing.primary")
+            return self.primary
+        if self._replica is None:
+            self._replica = self.replicas.choose()
+        if self._replica is None:
+            metrics.inc("db.routing.fallback")
+            return self.primary
+        metrics.inc("db.routing.replica")
+        return self._replica
+
+
+def _mark_write(session: Session) -> None:
+    # "wrote" pins the session to the primary; "unnoted_write" is cleared
+    # once the commit has been recorded for read-after-write routing
+    session.info["wrote"] = True
+    session.info["unnoted_write"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush_writes(session, flush_context):
+    _mark_write(session)
+
+
+@event.listens_for(Session, "after_begin")
+def _track_connection_use(session, transaction, connection):
+    session.info["connected"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    if not session.info.pop("unnoted_write", False):
+        return
+    if session.info.get("user_id") is not None:
+        note_write(session.info["user_id"])
+    state = session.info.get("request_state")
+    if state is not None:
+        # Sent back to the client as the read-after-write cookie
+        state.wrote_at = time.time()
+
+
+def wrote_within_window(written_at: Optional[float]) -> bool:
+    """True if a wall-clock write time is inside the read-after-write window."""
+    if written_at is None:
+        return False
+    age = time.time() - written_at
+    return -1.0 <= age < settings.DATABASE_READ_AFTER_WRITE_SECONDS  # allow slight clock skew
+
+
+class ReadAfterWriteMiddleware:
+    """
+    Carries the read-after-write marker with the client, so a user's next
+    request reads from the primary even when another worker (or host)
+    serves it. A request whose session committed a write gets a short-lived
+    cookie with the commit time; requests presenting a recent one have
+    their reads routed to the primary. A forged cookie can only make its
+    sender read from the primary.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        state = scope.setdefault("state", {})
+        name = settings.DATABASE_READ_AFTER_WRITE_COOKIE
+        cookie = Headers(scope=scope).get("cookie", "")
+        for part in cookie.split(";"):
+            key, _, value = part.strip().partition("=")
+            if key == name:
+                try:
+                    state["last_write_at"] = float(value)
+                except ValueError:
+                    pass
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and state.get("wrote_at") is not None:
+                max_age = math.ceil(settings.DATABASE_READ_AFTER_WRITE_SECONDS)
+                value = f"{name}={state['wrote_at']:.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", value.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
+
+
+if settings.USE_SQLITE and settings.SQLITE_TUNED:
+    # Reads go to the reader pool until a session writes; WAL readers see
+    # every committed write, so the "replica" never lags
+    engine, sqlite_reader = create_sqlite_engines(settings.DATABASE_URL)
+    replicas = ReplicaPool([sqlite_reader], max_lag=0, check_interval=float("inf"), lag_probe=lambda e: 0.0)
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, primary=engine, replicas=replicas, route_reads=True,
+        autocommit=False, autoflush=False,
+    )
+else:
+    engine = instrument_engine(create_engine(
+        settings.DATABASE_URL,
+        pool_pre_ping=True,
+        echo=False
+    ), "primary")
+    replicas = ReplicaPool(
+        [
+            instrument_engine(create_engine(url, pool_pre_ping=True, echo=False), f"replica{i}")
+            for i, url in enumerate(settings.DATABASE_REPLICA_URLS)
+        ],
+        max_lag=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+        check_interval=settings.DATABASE_REPLICA_LAG_CHECK_SECONDS,
+    ) if settings.DATABASE_REPLICA_URLS else None
+    # Reads stay on the primary unless a session is opened read-only
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, primary=engine, replicas=replicas, autocommit=False, autoflush=False
+    )
+
+
+def dispose_engines_after_fork() -> None:
+    """
+    Drop pooled connections inherited from a parent process without closing
+    them (the parent still owns them). Call first thing in a forked child.
+    """
+    for pooled in _engines:
+        pooled.dispose(close=False)
+
 
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
+def _request_session(request: Request) -> Tuple[Session, bool]:
+    """The request's session and whether this call created it."""
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        return db, False
+    db = SessionLocal(info={"request_state": request.state})
+    request.state.db = db
+    return db, True
+
+
+def _close_request_session(db: Session) -> None:
+    metrics.inc("db.sessions.used" if db.info.get("connected") else "db.sessions.unused")
+    db.close()
+
+
+def get_db(request: Request = None):
     """
     Dependency to get database session
+
+    Every dependency of a request shares one session (get_read_db included).
+    A session checks out a pooled connection on its first query, so
+    requests that never query, e.g. admin routes authorized from token
+    claims, don't touch the pool at all; db.sessions.used/unused and
+    db.<engine>.checkouts show how often that happens.
+    """
+    if request is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    db, created = _request_session(request)
+    try:
+        yield db
+    finally:
+        if created:
+            _close_request_session(db)
+
+
+def get_read_db(request: Request):
+    """
+    Dependency for read-only endpoints: the request's session, with reads
+    going to a replica when one is configured and fresh enough, falling
+    back to the primary. Users who just wrote keep reading from the primary
+    for DATABASE_READ_AFTER_WRITE_SECONDS.
     """
-    db = SessionLocal()
+    db, created = _request_session(request)
+    db.info["read_only"] = True
     try:
         yield db
     finally:
-        db.close()
+        if created:
+            _close_request_session(db)
+
+
+def insert_or_ignore(db: Session, model, values: dict) -> Optional[object]:
+    """
+    Insert a row in one round trip and return it, or return None if it
+    would violate a unique constraint.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING RETURNING on PostgreSQL and
+    SQLite, so concurrent inserts of the same key can't both succeed and
+    no SELECT is needed beforehand. Other databases fall back to a plain
+    INSERT inside a savepoint. The caller commits.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(model).values(**values).on_conflict_do_nothing().returning(model)
+        return db.scalars(stmt).first()
+
+    try:
+        with db.begin_nested():
+            return db.scalars(insert(model).values(**values).returning(model)).one()
+    except IntegrityError:
+        return None
@@ -0,0 +1,4 @@
+from app.jobs.queue import task, enqueue, run_pending, set_progress, TASKS
+from app.jobs import tasks  # noqa: F401 (registers the handlers)
+
+__all__ = ["task", "enqueue", "run_pending", "set_progress", "TASKS"]
@@ -0,0 +1,253 @@
+"""
+Database-backed job queue
+
+Handlers are registered with @task("name") and take the session plus the
+job payload as keyword arguments (and job_id, if they declare it):
+
+    @task("images.delete_object")
+    def delete_object(db, key): ...
+
+Coroutine handlers (and coroutines passed to run_async()) run on one shared
+event loop per worker process, so async clients (e.g. the S3 connection
+pool) are reused across jobs. Every worker thread shares that loop, so
+handlers that also query the database do it in a plain function and hand
+only the awaited I/O to run_async().
+
+Request handlers call enqueue() and return immediately; worker processes
+(app.jobs.worker) claim and run queued jobs. Claiming is a conditional
+UPDATE, so any number of workers can share the table safely.
+"""
+import asyncio
+import inspect
+import random
+import socket
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, UTC
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.job import Job, JobStatus
+
+TASKS: Dict[str, Callable] = {}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp, as stored in the jobs table."""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def task(name: str):
+    """Register a function as the handler for jobs called name."""
+    def decorator(fn: Callable) -> Callable:
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+def run_async(coro) -> Any:
+    """Run a coroutine on the process-wide job event loop and wait for it."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="jobs-async", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def enqueue(
+    db: Session,
+    name: str,
+    payload: Optional[dict] = None,
+    idempotency_key: Optional[str] = None,
+    delay_seconds: float = 0,
+    max_attempts: Optional[int] = None,
+    commit: bool = True,
+) -> Job:
+    """
+    Queue a job and commit. If idempotency_key matches an existing job, that
+    job is returned and nothing new is queued.
+
+    With commit=False the job is only flushed, so it becomes visible to
+    workers atomically with the caller's other changes when they commit.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task: {name}")
+
+    if idempotency_key is not None:
+        existing = db.scalars(select(Job).where(Job.idempotency_key == idempotency_key)).first()
+        if existing:
+            return existing
+
+    now = utcnow()
+    job = Job(
+        name=name,
+        payload=payload or {},
+        status=JobStatus.QUEUED,
+        idempotency_key=idempotency_key,
+        attempts=0,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_at=now + timedelta(seconds=delay_seconds),
+        created_at=now,
+    )
+    db.add(job)
+    if commit:
+        try:
+            db.commit()
+        except IntegrityError:
+            # Lost a race with another request using the same key
+            db.rollback()
+            return db.scalars(select(Job).where(Job.idempotency_key == idempotency_key)).one()
+        db.refresh(job)
+    else:
+        db.flush()
+    metrics.inc("jobs.enqueued")
+    metrics.inc(f"jobs.enqueued.{name}")
+    return job
+
+
+def claim_next(db: Session, worker: Optional[str] = None) -> Optional[Job]:
+    """
+    Atomically take the next due job, marking it running.
+    Returns None when nothing is due.
+    """
+    worker = worker or worker_id()
+    while True:
+        now = utcnow()
+        job_id = db.scalars(
+            select(Job.id)
+            .where(Job.status == JobStatus.QUEUED, Job.run_at <= now)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+        ).first()
+        if job_id is None:
+            db.rollback()
+            return None
+
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+            .values(status=JobStatus.RUNNING, locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+        )
+        db.commit()
+        if claimed.rowcount == 1:
+            return db.get(Job, job_id, populate_existing=True)
+        # Another worker got there first; try the next one
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped."""
+    delay = settings.JOB_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+    delay = min(delay, settings.JOB_RETRY_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(db: Session, job: Job) -> None:
+    """Run a claimed job and record the outcome."""
+    handler = TASKS.get(job.name)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {job.name}")
+        kwargs = dict(job.payload)
+        if "job_id" in inspect.signature(handler).parameters:
+            kwargs["job_id"] = job.id
+        result = handler(db, **kwargs)
+        if inspect.isawaitable(result):
+            result = run_async(result)
+    except Exception:
+        db.rollback()
+        job = db.get(Job, job.id, populate_existing=True)
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_by = None
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = JobStatus.QUEUED
+            job.run_at = utcnow() + timedelta(seconds=retry_delay(job.attempts))
+            metrics.inc("jobs.retried")
+        else:
+            job.status = JobStatus.FAILED
+            job.finished_at = utcnow()
+            metrics.inc("jobs.failed")
+            metrics.inc(f"jobs.failed.{job.name}")
+        db.commit()
+        return
+
+    job.status = JobStatus.SUCCEEDED
+    job.result = result
+    job.finished_at = utcnow()
+    job.locked_by = None
+    job.locked_at = None
+    db.commit()
+    metrics.inc("jobs.succeeded")
+    metrics.inc(f"jobs.succeeded.{job.name}")
+    metrics.inc(f"jobs.duration_seconds.{job.name}", time.perf_counter() - started)
+
+
+def set_progress(db: Session, job_id: int, **progress: Any) -> None:
+    """Record progress for a running job so admins can follow it."""
+    db.execute(update(Job).where(Job.id == job_id).values(progress=progress))
+    db.commit()
+
+
+def requeue_stale(db: Session, older_than_seconds: Optional[int] = None) -> int:
+    """
+    Put back jobs whose worker died mid-run. A job that has already used
+    all its attempts (e.g. one that keeps killing its worker) is marked
+    failed instead. Returns how many were requeued.
+    """
+    if older_than_seconds is None:
+        older_than_seconds = settings.JOB_STALE_AFTER_SECONDS
+    now = utcnow()
+    stale = (
+        Job.status == JobStatus.RUNNING,
+        Job.locked_at < now - timedelta(seconds=older_than_seconds),
+    )
+    failed = db.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status=JobStatus.FAILED, locked_by=None, locked_at=None, finished_at=now,
+                last_error="Worker stopped responding on the last attempt")
+    ).rowcount
+    requeued = db.execute(
+        update(Job)
+        .where(*stale)
+        .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None, run_at=now)
+    ).rowcount
+    db.commit()
+    if failed:
+        metrics.inc("jobs.failed", failed)
+    return requeued
+
+
+def run_pending(session_factory: Callable[[], Session], limit: Optional[int] = None) -> int:
+    """
+    Run due jobs in the current thread until the queue is empty (or limit
+    jobs have run). Useful for tests and one-off maintenance.
+    """
+    ran = 0
+    while limit is None or ran < limit:
+        db = session_factory()
+        try:
+            job = claim_next(db)
+            if job is None:
+                break
+            run_job(db, job)
+            ran += 1
+        finally:
+            db.close()
+    return ran
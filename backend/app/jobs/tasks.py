@@ -0,0 +1,102 @@
+"""
+Job handlers. Importing app.jobs registers everything defined here.
+"""
+from collections import Counter
+from typing import List
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.core import messaging, notifications, timelines
+from app.core.s3 import release_owner_images
+from app.core.storage import get_storage
+from app.jobs.queue import task, enqueue, run_async, set_progress
+from app.models.image import Image, StoredObject
+from app.models.listing import Listing
+from app.models.notification import Notification
+from app.models.user import User
+from app.models.stats import adjust_counters, listing_counter_deltas, user_counter_deltas
+
+OBJECT_DELETE_BATCH_SIZE = 1000
+
+
+def unreferenced(db: Session, keys: List[str]) -> List[str]:
+    """
+    The keys no StoredObject or Image points at any more. Deletes are queued
+    when the last reference goes away; this re-checks at run time so an
+    object that was referenced again in the meantime is kept.
+    """
+    referenced = set(db.scalars(select(StoredObject.s3_key).where(StoredObject.s3_key.in_(keys))))
+    referenced.update(db.scalars(select(Image.s3_key).where(Image.s3_key.in_(keys))))
+    return [key for key in keys if key not in referenced]
+
+
+@task("images.delete_object")
+def delete_stored_object(db: Session, key: str) -> None:
+    """Remove an object whose last Image reference is gone."""
+    # The reference check runs in this worker thread; only the storage call
+    # goes to the shared job event loop
+    if unreferenced(db, [key]):
+        run_async(get_storage().delete(key))
+
+
+@task("images.delete_objects")
+def delete_stored_objects(db: Session, keys: List[str]) -> dict:
+    """Remove a batch of unreferenced objects in bulk."""
+    keys = unreferenced(db, keys)
+    if keys:
+        run_async(get_storage().delete_many(keys))
+    return {"objects_deleted": len(keys)}
+
+
+@task(notifications.DELIVER_TASK)
+def deliver_notifications(db: Session) -> dict:
+    """Send a batch of queued emails and SMS; queues a follow-up if more are due."""
+    return notifications.deliver(db)
+
+
+@task("users.delete")
+def delete_user_data(db: Session, user_id: int, job_id: int) -> dict:
+    """
+    Delete a user and everything they own.
+
+    Rows are removed with set-based DELETEs in one transaction, which also
+    queues the storage cleanup as batched images.delete_objects jobs, so a
+    crash can't leave rows gone but objects forgotten. Safe to re-run.
+    """
+    set_progress(db, job_id, stage="deleting rows")
+
+    images_deleted, keys = release_owner_images(db, user_id)
+    conversations_deleted = messaging.delete_user_conversations(db, user_id)
+    listings = db.execute(
+        delete(Listing).where(Listing.owner_id == user_id).returning(Listing.id, Listing.parish, Listing.created_at)
+    ).all()
+    listing_ids = [listing_id for listing_id, _, _ in listings]
+    deltas = Counter()
+    for _, parish, created_at in listings:
+        deltas.update(listing_counter_deltas(parish, created_at, sign=-1))
+    timelines.remove(db, listing_ids)
+    db.execute(delete(Notification).where(Notification.user_id == user_id))
+    deleted = db.execute(
+        delete(User).where(User.id == user_id).returning(User.parish, User.admin, User.created_at)
+    ).all()
+    for parish, admin, created_at in deleted:
+        deltas.update(user_counter_deltas(parish, admin, created_at, sign=-1))
+    # One upsert per counter touched, however many listings there were
+    adjust_counters(db.connection(), deltas)
+    users_deleted = len(deleted)
+
+    object_jobs = []
+    for start in range(0, len(keys), OBJECT_DELETE_BATCH_SIZE):
+        batch = keys[start:start + OBJECT_DELETE_BATCH_SIZE]
+        object_jobs.append(enqueue(db, "images.delete_objects", {"keys": batch}, commit=False).id)
+    db.commit()
+
+    result = {
+        "users_deleted": users_deleted,
+        "images_deleted": images_deleted,
+        "listings_deleted": len(listing_ids),
+        "conversations_deleted": conversations_deleted,
+        "objects_queued": len(keys),
+        "object_jobs": object_jobs,
+    }
+    set_progress(db, job_id, stage="rows deleted", **result)
+    return result
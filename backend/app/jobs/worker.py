@@ -0,0 +1,122 @@
+"""
+Background job worker
+Run with: python -m app.jobs.worker [--concurrency N] [--processes N]
+
+Each process runs `concurrency` threads that claim and execute jobs from
+the jobs table. SIGINT/SIGTERM stop claiming new jobs and wait for the
+running ones to finish.
+"""
+import argparse
+import multiprocessing
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.database import SessionLocal
+from app.jobs.queue import claim_next, run_job, requeue_stale
+
+
+class Worker:
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval if poll_interval is not None else settings.JOB_POLL_INTERVAL_SECONDS
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, args=(i,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming jobs and wait for in-flight ones."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self, index: int) -> None:
+        last_sweep = 0.0
+        while not self._stop.is_set():
+            db = self.session_factory()
+            try:
+                # One thread per process recovers jobs orphaned by dead workers
+                if index == 0 and time.monotonic() - last_sweep > settings.JOB_STALE_AFTER_SECONDS / 2:
+                    requeue_stale(db)
+                    last_sweep = time.monotonic()
+
+                job = claim_next(db)
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                metrics.inc("jobs.in_flight", 1)
+                try:
+                    run_job(db, job)
+                finally:
+                    metrics.inc("jobs.in_flight", -1)
+            except Exception:
+                # Database hiccup; back off and keep the thread alive
+                metrics.inc("jobs.worker_errors")
+                self._stop.wait(self.poll_interval)
+            finally:
+                db.close()
+
+
+def serve(concurrency: Optional[int] = None) -> None:
+    """Run a worker in this process until signalled."""
+    worker = Worker(concurrency=concurrency)
+    stopped = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopped.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    worker.start()
+    stopped.wait()
+    worker.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                        help="worker threads per process")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes")
+    args = parser.parse_args(argv)
+
+    if args.processes == 1:
+        serve(args.concurrency)
+        return
+
+    processes = [
+        multiprocessing.Process(target=serve, args=(args.concurrency,), name=f"job-worker-process-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward_signal(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGINT, forward_signal)
+    signal.signal(signal.SIGTERM, forward_signal)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
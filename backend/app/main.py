@@ -1,17 +1,43 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
-from app.database import engine, Base
-from app.routes import auth, users
+from app.auth.tokens import get_token_service
+from app.core.s3_async import close_s3_client
+from app.database import engine, Base, ReadAfterWriteMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.audit import audit_log
+from app.routes import auth, users, images, jobs, metrics, stats, profiles, listings, events, conversations, audit
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the shared S3 connection pool
+    await close_s3_client()
+    # Write out buffered audit entries
+    await run_in_threadpool(audit_log.stop)
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
+# Keep a client's reads on the primary just after it writes, across workers
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(ReadAfterWriteMiddleware)
+
+# Replay stored responses for retried POSTs (innermost, so replays still get CORS and compression)
+app.add_middleware(IdempotencyMiddleware)
+
 # Set up CORS
 app.add_middleware(
     CORSMiddleware,
@@ -21,9 +47,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-requested and sampled request profiles
+app.add_middleware(ProfilingMiddleware)
+
+# gzip/brotli for text responses (added last so it wraps everything)
+app.add_middleware(CompressionMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
+app.include_router(images.router, prefix=settings.API_V1_STR)
+app.include_router(jobs.router, prefix=settings.API_V1_STR)
+app.include_router(metrics.router, prefix=settings.API_V1_STR)
+app.include_router(stats.router, prefix=settings.API_V1_STR)
+app.include_router(profiles.router, prefix=settings.API_V1_STR)
+app.include_router(listings.router, prefix=settings.API_V1_STR)
+app.include_router(events.router, prefix=settings.API_V1_STR)
+app.include_router(conversations.router, prefix=settings.API_V1_STR)
+app.include_router(audit.router, prefix=settings.API_V1_STR)
 
 
 @app.get("/")
@@ -31,6 +72,12 @@ def root():
     return {"message": "Welcome to the API"}
 
 
+@app.get("/.well-known/jwks.json", include_in_schema=False)
+def jwks():
+    """Public keys for verifying access tokens (empty when tokens use HMAC)"""
+    return get_token_service().jwks()
+
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
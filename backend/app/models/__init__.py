@@ -1,3 +1,13 @@
 from app.models.user import User
+from app.models.image import Image, StoredObject
+from app.models.job import Job, JobStatus
+from app.models.stats import StatCounter
+from app.models.listing import Listing, TimelineEntry
+from app.models.message import Conversation, ConversationMember, Message
+from app.models.idempotency import IdempotencyKey
+from app.models.notification import Notification, NotificationStatus
+from app.models.audit import AuditEntry
 
-__all__ = ["User"]
+__all__ = ["User", "Image", "StoredObject", "Job", "JobStatus", "StatCounter", "Listing", "TimelineEntry",
+           "Conversation", "ConversationMember", "Message", "IdempotencyKey",
+           "Notification", "NotificationStatus", "AuditEntry"]
@@ -0,0 +1,33 @@
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, JSON, Index, event
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class AuditEntry(Base):
+    """
+    Who did what, written in batches by app.core.audit. Append-only: rows
+    are never updated or deleted (the ORM refuses to). Timestamps are naive
+    UTC.
+    """
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        Index("ix_audit_log_actor", "actor_id", "id"),
+        Index("ix_audit_log_target", "target_type", "target_id", "id"),
+    )
+
+    # Time-ordered: zero-padded nanoseconds since the epoch plus a random suffix
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=False)
+    actor_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    action: Mapped[str] = mapped_column(String, nullable=False)
+    target_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    target_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    details: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+
+
+@event.listens_for(AuditEntry, "before_update")
+@event.listens_for(AuditEntry, "before_delete")
+def _append_only(mapper, connection, target):
+    raise ValueError("The audit log is append-only")
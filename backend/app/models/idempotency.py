@@ -0,0 +1,25 @@
+from typing import List, Optional
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, LargeBinary, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    The first response to a request sent with an Idempotency-Key, per
+    principal. status_code is None while that first request is still
+    running; see app.core.idempotency.
+    """
+    __tablename__ = "idempotency_keys"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # "user:<id>" for authenticated requests, "anonymous" otherwise
+    principal: Mapped[str] = mapped_column(String, primary_key=True)
+    # Hash of method, path, query string and body; a reused key with a different request is rejected
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    headers: Mapped[Optional[List[List[str]]]] = mapped_column(JSON, nullable=True)
+    body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=False)
@@ -1,15 +1,43 @@
 from typing import Optional
 import uuid
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from datetime import datetime, UTC
+from sqlalchemy import Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
 from app.database import Base
 
+
+class StoredObject(Base):
+    """
+    One physical S3 object, shared by every Image with the same content.
+    ref_count tracks how many Image rows point at it.
+    """
+    __tablename__ = "stored_objects"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    s3_key: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    content_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
 class Image(Base):
     __tablename__ = "images"
     
     id: Mapped[uuid.UUID] = mapped_column(
         primary_key=True, default=uuid.uuid4
     )
-    s3_key: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    # Not unique: deduplicated images share one object
+    s3_key: Mapped[str] = mapped_column(String, index=True, nullable=False)
     url: Mapped[str] = mapped_column(String, nullable=False)
-    product_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
\ No newline at end of file
+    product_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    owner_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("users.id"), index=True, nullable=True
+    )
+    content_type: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    size: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(
+        String(64), ForeignKey("stored_objects.content_hash"), index=True, nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(UTC), nullable=False
+    )
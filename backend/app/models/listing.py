@@ -0,0 +1,38 @@
+from typing import Optional
+from datetime import datetime, UTC
+from sqlalchemy import Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class Listing(Base):
+    """An item offered for swap or sale."""
+    __tablename__ = "listings"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Smallest currency unit; None for swap-only listings
+    price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    parish: Mapped[Optional[str]] = mapped_column(String, index=True, nullable=True)
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # Grid cell of (latitude, longitude) for radius search; see app.core.geo
+    geocell: Mapped[Optional[int]] = mapped_column(Integer, index=True, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(UTC), nullable=False
+    )
+
+
+class TimelineEntry(Base):
+    """
+    One listing in one parish's timeline. The primary key doubles as the
+    feed index: a page is a range scan over (parish, listing_id DESC).
+    """
+    __tablename__ = "parish_timelines"
+
+    parish: Mapped[str] = mapped_column(String, primary_key=True)
+    listing_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("listings.id", ondelete="CASCADE"), primary_key=True
+    )
@@ -0,0 +1,58 @@
+from typing import Optional
+from datetime import datetime, UTC
+from sqlalchemy import Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class Conversation(Base):
+    """A thread between a buyer and a listing's seller."""
+    __tablename__ = "conversations"
+    __table_args__ = (UniqueConstraint("listing_id", "buyer_id", name="uq_conversations_listing_buyer"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    listing_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("listings.id", ondelete="SET NULL"), nullable=True
+    )
+    buyer_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    seller_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(UTC), nullable=False
+    )
+
+
+class ConversationMember(Base):
+    """
+    One participant's view of a conversation. unread_count is maintained as
+    messages arrive and are read, so it is never computed with COUNT(*);
+    last_message_id orders the inbox (index on user_id, last_message_id).
+    """
+    __tablename__ = "conversation_members"
+    __table_args__ = (Index("ix_conversation_members_inbox", "user_id", "last_message_id"),)
+
+    conversation_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    last_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    last_read_message_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+
+class Message(Base):
+    """
+    Message ids increase with time, so (conversation_id, id) is both the
+    per-conversation history index and its keyset cursor.
+    """
+    __tablename__ = "messages"
+    __table_args__ = (Index("ix_messages_conversation_history", "conversation_id", "id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    conversation_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False
+    )
+    sender_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    body: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=lambda: datetime.now(UTC), nullable=False
+    )
@@ -0,0 +1,43 @@
+from typing import Optional
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Text, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class NotificationStatus:
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    RATE_LIMITED = "rate_limited"
+
+
+class Notification(Base):
+    """
+    An outgoing email or SMS. Rows are written on the request path and
+    delivered in batches by the notifications.deliver job.
+    Timestamps are naive UTC.
+    """
+    __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_status_next_attempt", "status", "next_attempt_at"),
+        Index("ix_notifications_recipient_created", "recipient", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[Optional[int]] = mapped_column(Integer, index=True, nullable=True)
+    channel: Mapped[str] = mapped_column(String, nullable=False)  # "email" or "sms"
+    recipient: Mapped[str] = mapped_column(String, nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    subject: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    # At most one notification per key; None for rate-limited rows
+    dedupe_key: Mapped[Optional[str]] = mapped_column(String, unique=True, nullable=True)
+    status: Mapped[str] = mapped_column(String, default=NotificationStatus.QUEUED, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,148 @@
+"""
+Summary counters for the admin dashboard
+
+stat_counters holds one row per (metric, key), e.g. ("users.by_parish",
+"St. Andrew") or ("listings.created", "2026-10-19"). Counters are adjusted
+in the same transaction as the change they describe, so reading the
+dashboard never scans the users or listings tables:
+
+- ORM flushes (db.add / db.delete) are covered by the mapper events below
+- bulk statements (INSERT/UPDATE/DELETE ... RETURNING) call
+  adjust_counters() themselves with user_counter_deltas() or
+  listing_counter_deltas()
+
+app.core.stats.rebuild() recomputes everything from scratch for repair.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import Integer, String, event, inspect, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+from app.models.listing import Listing
+from app.models.user import User
+
+Deltas = Dict[Tuple[str, str], int]
+
+USERS_TOTAL = "users.total"
+USERS_ADMINS = "users.admins"
+USERS_BY_PARISH = "users.by_parish"
+USERS_SIGNUPS = "users.signups"
+LISTINGS_TOTAL = "listings.total"
+LISTINGS_BY_PARISH = "listings.by_parish"
+LISTINGS_CREATED = "listings.created"
+
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+
+    metric: Mapped[str] = mapped_column(String, primary_key=True)
+    key: Mapped[str] = mapped_column(String, primary_key=True, default="")
+    value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+def user_counter_deltas(
+    parish: Optional[str],
+    admin: bool,
+    created_at: Optional[datetime],
+    sign: int = 1,
+) -> Deltas:
+    """Counter changes for adding (sign=1) or removing (sign=-1) one user."""
+    deltas: Deltas = Counter()
+    deltas[(USERS_TOTAL, "")] += sign
+    deltas[(USERS_BY_PARISH, parish or "")] += sign
+    if admin:
+        deltas[(USERS_ADMINS, "")] += sign
+    if created_at is not None:
+        deltas[(USERS_SIGNUPS, created_at.date().isoformat())] += sign
+    return deltas
+
+
+def user_update_deltas(
+    old_parish: Optional[str],
+    new_parish: Optional[str],
+    old_admin: bool,
+    new_admin: bool,
+) -> Deltas:
+    """Counter changes for a user whose parish or admin flag changed."""
+    deltas: Deltas = Counter()
+    if (old_parish or "") != (new_parish or ""):
+        deltas[(USERS_BY_PARISH, old_parish or "")] -= 1
+        deltas[(USERS_BY_PARISH, new_parish or "")] += 1
+    if bool(old_admin) != bool(new_admin):
+        deltas[(USERS_ADMINS, "")] += 1 if new_admin else -1
+    return deltas
+
+
+def listing_counter_deltas(parish: Optional[str], created_at: Optional[datetime], sign: int = 1) -> Deltas:
+    """Counter changes for adding (sign=1) or removing (sign=-1) one listing."""
+    deltas: Deltas = Counter()
+    deltas[(LISTINGS_TOTAL, "")] += sign
+    deltas[(LISTINGS_BY_PARISH, parish or "")] += sign
+    if created_at is not None:
+        deltas[(LISTINGS_CREATED, created_at.date().isoformat())] += sign
+    return deltas
+
+
+def adjust_counters(connection: Connection, deltas: Deltas) -> None:
+    """Add each delta to its counter, creating missing counters."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    table = StatCounter.__table__
+    rows = [{"metric": metric, "key": key, "value": value} for (metric, key), value in deltas.items()]
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.metric, table.c.key],
+            set_={"value": table.c.value + stmt.excluded.value},
+        )
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        updated = connection.execute(
+            update(table)
+            .where(table.c.metric == row["metric"], table.c.key == row["key"])
+            .values(value=table.c.value + row["value"])
+        )
+        if updated.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+@event.listens_for(User, "after_insert")
+def _count_inserted_user(mapper, connection, user):
+    adjust_counters(connection, user_counter_deltas(user.parish, user.admin, user.created_at))
+
+
+@event.listens_for(User, "after_delete")
+def _count_deleted_user(mapper, connection, user):
+    adjust_counters(connection, user_counter_deltas(user.parish, user.admin, user.created_at, sign=-1))
+
+
+@event.listens_for(User, "after_update")
+def _count_updated_user(mapper, connection, user):
+    state = inspect(user)
+    parish = state.attrs.parish.history
+    admin = state.attrs.admin.history
+    if not parish.has_changes() and not admin.has_changes():
+        return
+    old_parish = parish.deleted[0] if parish.deleted else user.parish
+    old_admin = admin.deleted[0] if admin.deleted else user.admin
+    adjust_counters(connection, user_update_deltas(old_parish, user.parish, old_admin, user.admin))
+
+
+@event.listens_for(Listing, "after_insert")
+def _count_inserted_listing(mapper, connection, listing):
+    adjust_counters(connection, listing_counter_deltas(listing.parish, listing.created_at))
+
+
+@event.listens_for(Listing, "after_delete")
+def _count_deleted_listing(mapper, connection, listing):
+    adjust_counters(connection, listing_counter_deltas(listing.parish, listing.created_at, sign=-1))
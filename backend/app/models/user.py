@@ -1,5 +1,6 @@
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from datetime import datetime, UTC
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, event, inspect
 from sqlalchemy.orm import Mapped, mapped_column, relationship, Session
 from app.database import Base
 from app.models.parish import Parish
@@ -15,4 +16,22 @@ class User(Base):
     phone: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=True)
     parish: Mapped[Optional[Parish]] = mapped_column(String, default=None, nullable=True)
     admin: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # Grid cell of (latitude, longitude) for radius search; see app.core.geo
+    geocell: Mapped[Optional[int]] = mapped_column(Integer, index=True, nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime, default=lambda: datetime.now(UTC), nullable=True
+    )
+    # Bumped on every update; used for ETags and optimistic concurrency
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1", nullable=False)
+    # Bumped when authorization changes (admin status); access tokens carry
+    # it as the "ver" claim and older tokens stop being accepted
+    auth_version: Mapped[int] = mapped_column(Integer, default=1, server_default="1", nullable=False)
+
+
+@event.listens_for(User, "before_update")
+def _bump_auth_version(mapper, connection, target):
+    if inspect(target).attrs.admin.history.has_changes():
+        target.auth_version = (target.auth_version or 1) + 1
 
@@ -1,3 +1,4 @@
-from app.routes import auth, users
+from app.routes import auth, users, images, jobs, metrics, stats, profiles, listings, events, conversations, audit
 
-__all__ = ["auth", "users"]
+__all__ = ["auth", "users", "images", "jobs", "metrics", "stats", "profiles", "listings", "events", "conversations",
+           "audit"]
@@ -0,0 +1,56 @@
+from datetime import datetime, UTC
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.orm import Session
+from app.auth.dependencies import require_admin
+from app.core import audit
+from app.database import get_read_db
+from app.models.user import User
+from app.schemas.audit import AuditEntryOut, AuditPage
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(UTC).replace(tzinfo=None)
+
+
+@router.get(
+    "",
+    response_model=AuditPage,
+    summary="Search the audit log (admin only)",
+    description="""
+    Recorded actions, newest first.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    - Filter by `actor_id`, `target_type` and `target_id`, and by time with `since` (inclusive)
+      and `until` (exclusive). Times without a timezone are UTC.
+    - Page with `before`: pass the previous page's `next_before` until it is null.
+    - Entries are written in batches and appear within a few seconds.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Audit entries retrieved successfully"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_audit_log(
+    actor_id: Optional[int] = None,
+    target_type: Optional[str] = None,
+    target_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[str] = Query(None, pattern=audit.ID_PATTERN),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Query audit entries (admin only)
+    """
+    entries, next_before = audit.query(
+        db, actor_id=actor_id, target_type=target_type, target_id=target_id,
+        since=_naive_utc(since), until=_naive_utc(until), before=before, limit=limit,
+    )
+    return AuditPage(items=[AuditEntryOut(**entry) for entry in entries], next_before=next_before)
@@ -1,11 +1,14 @@
 from app.schemas.auth import UserLogin
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy import select
-from app.database import get_db
+from app.core import geo, hooks
+from app.database import get_db, insert_or_ignore
 from app.schemas.user import UserCreate, UserOut
 from app.models.user import User
+from app.models.stats import adjust_counters, user_counter_deltas
+from app.auth.claims import access_token_claims
 from app.auth.security import verify_password, create_access_token, create_refresh_token, get_password_hash
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -23,35 +26,42 @@ Register a new user
 """,
     responses={
         201: {"description": "User successfully registered"},
-        400: {"description": "User with this email already exists"},
+        400: {"description": "User with this email or phone already exists"},
     }
 )
 def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """
     Register a new user
-    TODO: Implement user registration logic
-    - Check if user exists
-    - Hash password
-    - Create user in database
-    """
 
-    existing_user = db.scalars(select(User).where(User.email == user_data.email)).first()
+    Runs in FastAPI's threadpool (a plain def route), so the bcrypt hash
+    never blocks the event loop. The user is created by a single
+    INSERT ... ON CONFLICT DO NOTHING RETURNING: a duplicate email or
+    phone, including one from a concurrent request, simply returns no row.
+    New accounts are never admins; admin status is granted separately.
+    """
+    hashed_password = get_password_hash(user_data.password)
 
-    if existing_user:
+    values = user_data.model_dump(mode="json", exclude={"username", "password", "admin"})
+    user = insert_or_ignore(db, User, {
+        **values,
+        "name": user_data.username,
+        "hashed_password": hashed_password,
+        "admin": False,
+        "geocell": geo.cell_for(user_data.latitude, user_data.longitude),
+    })
+    if user is None:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User with this email already exists"
+            detail="User with this email or phone already exists"
         )
-    
-    hashed_password = get_password_hash(user_data.password)
-    
-    user = User(**user_data.model_dump(), hashed_password=hashed_password)
 
-    db.add(user)
+    adjust_counters(db.connection(), user_counter_deltas(user.parish, user.admin, user.created_at))
+    user_out = UserOut.model_validate(user)
     db.commit()
-    db.refresh(user)
+    hooks.emit("user.created", user_id=user_out.id)
 
-    return UserOut(user)
+    return user_out
 
 @router.post(
     "/login", 
@@ -66,10 +76,12 @@ Login user and obtain JWT tokens
         401: {"description": "Invalid email or password"},
     }
 )
-def login(payload: UserLogin, db: Session = Depends(get_db)):
+def login(payload: UserLogin, response: Response, db: Session = Depends(get_db)):
     """
     Login user and return JWT tokens
     """
+    # Keep the token out of caches and stored Idempotency-Key responses
+    response.headers["Cache-Control"] = "no-store"
     user = db.scalars(select(User).where(User.email == payload.email)).first()
 
     if not user or not verify_password(payload.password, user.hashed_password):
@@ -79,7 +91,7 @@ def login(payload: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(data={"sub": str(user.id)})
+    access_token = create_access_token(data=access_token_claims(user))
 
     return access_token
 
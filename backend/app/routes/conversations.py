@@ -0,0 +1,229 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.auth.dependencies import require_principal
+from app.core import hooks, messaging, notifications
+from app.database import get_db, get_read_db
+from app.models.listing import Listing
+from app.models.message import Conversation, ConversationMember
+from app.models.user import User
+from app.schemas.message import (
+    ConversationCreate,
+    ConversationOut,
+    ConversationPage,
+    MarkRead,
+    MarkReadResult,
+    MessageCreate,
+    MessageOut,
+    MessagePage,
+    UnreadCount,
+)
+
+router = APIRouter(prefix="/conversations", tags=["messages"])
+
+
+def conversation_out(conversation: Conversation, member: ConversationMember) -> ConversationOut:
+    return ConversationOut(
+        id=conversation.id,
+        listing_id=conversation.listing_id,
+        buyer_id=conversation.buyer_id,
+        seller_id=conversation.seller_id,
+        unread_count=member.unread_count,
+        last_message_id=member.last_message_id,
+    )
+
+
+def _send(db: Session, conversation_id: int, sender_id: int, body: str) -> MessageOut:
+    message, recipients = messaging.send(db, conversation_id, sender_id, body)
+    message_out = MessageOut.model_validate(message)
+    db.commit()
+    hooks.emit(
+        "message.created",
+        conversation_id=conversation_id,
+        message_id=message_out.id,
+        sender_id=sender_id,
+        recipient_ids=recipients,
+    )
+    return message_out
+
+
+@router.post(
+    "",
+    response_model=ConversationOut,
+    status_code=status.HTTP_201_CREATED,
+    summary="Message a listing's seller",
+    description="""
+    Send a message about a listing, starting the conversation with its seller if there isn't one yet.
+    - **Authentication Required**: The current user is the buyer.
+    - Sending again about the same listing continues the existing conversation.
+    - The seller is emailed when a conversation starts (once per conversation).
+    """,
+    responses={
+        201: {"description": "Message sent"},
+        400: {"description": "Can't message yourself about your own listing"},
+        401: {"description": "Unauthorized - Authentication required"},
+        404: {"description": "Listing not found"}
+    }
+)
+def start_conversation(
+    payload: ConversationCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Start (or continue) a conversation about a listing
+    """
+    listing = db.get(Listing, payload.listing_id)
+    if not listing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    if listing.owner_id == current_user.id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="This is your own listing")
+
+    conversation = messaging.start_conversation(db, listing, current_user.id)
+    conversation_id = conversation.id
+    seller = db.get(User, listing.owner_id)
+    notifications.notify(
+        db, notifications.EMAIL, seller.email,
+        subject=f"Someone is interested in {listing.title}",
+        body=f"You have a new message about {listing.title}:\n\n{payload.body}",
+        kind="listing_interest",
+        user_id=seller.id,
+        dedupe_key=f"listing_interest:{conversation_id}",
+    )
+    _send(db, conversation_id, current_user.id, payload.body)
+
+    member = messaging.membership(db, conversation_id, current_user.id)
+    return conversation_out(db.get(Conversation, conversation_id), member)
+
+
+@router.get(
+    "",
+    response_model=ConversationPage,
+    summary="List conversations",
+    description="""
+    The current user's conversations, most recently active first, with unread counts.
+    - Page with `before`: pass the previous page's `next_before` until it is null.
+    """,
+    responses={
+        200: {"description": "Conversations retrieved successfully"},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+def list_conversations(
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Return one page of the inbox
+    """
+    rows, next_before = messaging.inbox(db, current_user.id, limit, before)
+    return ConversationPage(items=[conversation_out(*row) for row in rows], next_before=next_before)
+
+
+@router.get(
+    "/unread",
+    response_model=UnreadCount,
+    summary="Unread message count",
+    responses={
+        200: {"description": "Unread count retrieved successfully"},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+def get_unread_count(
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Total unread messages across the user's conversations
+    """
+    unread, conversations = messaging.unread_total(db, current_user.id)
+    return UnreadCount(unread=unread, conversations=conversations)
+
+
+@router.post(
+    "/read",
+    response_model=MarkReadResult,
+    summary="Mark conversations read",
+    description="""
+    Mark the given conversations read, or all of them when `conversation_ids` is omitted, in one update.
+    - Returns how many conversations had unread messages.
+    """,
+    responses={
+        200: {"description": "Conversations marked read"},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+def mark_conversations_read(
+    payload: MarkRead,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Bulk mark-as-read
+    """
+    updated = messaging.mark_read(db, current_user.id, payload.conversation_ids)
+    db.commit()
+    return MarkReadResult(updated=updated)
+
+
+def _require_member(db: Session, conversation_id: int, user_id: int) -> ConversationMember:
+    member = messaging.membership(db, conversation_id, user_id)
+    if member is None:
+        # Don't reveal whether other people's conversations exist
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found")
+    return member
+
+
+@router.get(
+    "/{conversation_id}/messages",
+    response_model=MessagePage,
+    summary="Conversation history",
+    description="""
+    Messages newest first.
+    - Page with `before`: pass the previous page's `next_before` until it is null.
+    """,
+    responses={
+        200: {"description": "Messages retrieved successfully"},
+        401: {"description": "Unauthorized - Authentication required"},
+        404: {"description": "Conversation not found"}
+    }
+)
+def get_messages(
+    conversation_id: int,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Return one page of a conversation
+    """
+    _require_member(db, conversation_id, current_user.id)
+    messages, next_before = messaging.history(db, conversation_id, limit, before)
+    return MessagePage(items=[MessageOut.model_validate(message) for message in messages], next_before=next_before)
+
+
+@router.post(
+    "/{conversation_id}/messages",
+    response_model=MessageOut,
+    status_code=status.HTTP_201_CREATED,
+    summary="Send a message",
+    responses={
+        201: {"description": "Message sent"},
+        401: {"description": "Unauthorized - Authentication required"},
+        404: {"description": "Conversation not found"}
+    }
+)
+def send_message(
+    conversation_id: int,
+    payload: MessageCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Reply in a conversation
+    """
+    _require_member(db, conversation_id, current_user.id)
+    return _send(db, conversation_id, current_user.id, payload.body)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.auth.dependencies import require_user
+from app.core.config import settings
+from app.core.events import DROPPED, Subscription, hub, parish_topic, user_topic
+from app.database import get_db
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+WS_POLICY_VIOLATION = 1008
+WS_TRY_AGAIN_LATER = 1013
+
+
+def _bearer_token(authorization: Optional[str], access_token: Optional[str]) -> Optional[str]:
+    """Token from the Authorization header, else ?access_token= (browsers can't set headers here)."""
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            return token
+    return access_token
+
+
+def _authenticate(app, token: Optional[str]) -> Tuple[int, Optional[str]]:
+    """
+    Run require_user with a short-lived session and return the user's id and
+    parish. The session is closed before streaming starts, so long-lived
+    connections don't hold a database connection.
+    """
+    overrides = getattr(app, "dependency_overrides", {})
+    sessions = overrides.get(get_db, get_db)()
+    db = next(sessions)
+    try:
+        user = require_user(db=db, token=token)
+        return user.id, user.parish
+    finally:
+        sessions.close()
+
+
+def _topics(user_id: int, parish: Optional[str], all_parishes: bool) -> List[str]:
+    return [user_topic(user_id), parish_topic(None if all_parishes else parish)]
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def sse_stream(topics: List[str], heartbeat: float) -> AsyncIterator[str]:
+    """Server-sent events for topics until the client leaves or is dropped."""
+    subscription = hub.subscribe(topics)
+    try:
+        yield f"retry: {settings.EVENTS_RETRY_MILLISECONDS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ": ping\n\n"
+                continue
+            yield _sse(event)
+            if event is DROPPED:
+                return
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@router.get(
+    "",
+    summary="Stream notifications (server-sent events)",
+    description="""
+    Push notifications as `text/event-stream`: new messages, new and removed listings in your parish
+    and changes to your account.
+    - **Authentication Required**: Bearer token in the `Authorization` header, or `?access_token=` for `EventSource`.
+    - `all=true` follows listings across the whole island instead of your parish.
+    - Clients that fall too far behind get a `dropped` event and the stream ends; reconnect and refetch.
+    """,
+    responses={
+        200: {"description": "Event stream", "content": {"text/event-stream": {}}},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+async def stream_events(
+    request: Request,
+    all: bool = False,
+    access_token: Optional[str] = Query(None)
+):
+    """
+    Open a server-sent event stream for the current user
+    """
+    token = _bearer_token(request.headers.get("authorization"), access_token)
+    user_id, parish = await run_in_threadpool(_authenticate, request.app, token)
+    return StreamingResponse(
+        sse_stream(_topics(user_id, parish, all), settings.EVENTS_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_events(websocket: WebSocket, subscription: Subscription) -> None:
+    while True:
+        event = await subscription.get()
+        if event is DROPPED:
+            await websocket.close(code=WS_TRY_AGAIN_LATER, reason="Too far behind")
+            return
+        await websocket.send_json(event)
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@router.websocket("/ws")
+async def events_websocket(
+    websocket: WebSocket,
+    all: bool = False,
+    access_token: Optional[str] = None
+):
+    """
+    The same notifications as GET /events, as JSON WebSocket messages
+    """
+    token = _bearer_token(websocket.headers.get("authorization"), access_token)
+    try:
+        user_id, parish = await run_in_threadpool(_authenticate, websocket.app, token)
+    except HTTPException:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = hub.subscribe(_topics(user_id, parish, all))
+    sender = asyncio.create_task(_send_events(websocket, subscription))
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (sender, receiver):
+            task.cancel()
+        hub.unsubscribe(subscription)
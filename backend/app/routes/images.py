@@ -0,0 +1,504 @@
+import os
+import hashlib
+import uuid
+from datetime import timedelta
+from typing import Optional
+from botocore.exceptions import ClientError
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Form
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.database import get_db, insert_or_ignore
+from app.core.config import settings
+from app.core import s3_async
+from app.core.image_cache import get_image_cache
+from app.core.s3 import generate_s3_key, release_image
+from app.jobs import enqueue
+from app.core.storage import (
+    LocalStorage,
+    LOCAL_UPLOAD_POLICY_TYPE,
+    get_storage,
+    store_image,
+    verify_local_url,
+)
+from app.schemas.image import ImageUploadRequest, PresignedUpload, ImageUploadComplete, ImageOut
+from app.models.image import Image
+from app.models.user import User
+from app.auth.dependencies import require_user, require_admin, require_principal
+from app.auth.security import create_access_token
+from app.auth.tokens import TokenError, get_token_service
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+UPLOAD_TOKEN_TYPE = "image_upload"
+UPLOAD_TOKEN_AUDIENCE = "images/uploads/complete"
+# Images from direct uploads get an id derived from their key, so completing
+# the same upload twice (even concurrently) can only ever insert one row
+UPLOAD_IMAGE_NAMESPACE = uuid.UUID("6f1b7c3e-2d4a-5e8f-9a0b-c1d2e3f4a5b6")
+
+
+@router.post(
+    "",
+    response_model=ImageOut,
+    summary="Upload an image through the API",
+    description="""
+    Upload an image as multipart form data.
+    - **Authentication Required**: The user must be authenticated to access this endpoint.
+    - Images are deduplicated by content: identical bytes are stored once and shared.
+    - Returns the created image.
+    """,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Image stored"},
+        400: {"description": "Unsupported content type"},
+        401: {"description": "Unauthorized - Authentication required"},
+        413: {"description": "Image too large"}
+    }
+)
+async def upload_image(
+    file: UploadFile = File(...),
+    product_id: Optional[int] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_user)
+):
+    """
+    Upload an image, reusing an existing object when the content matches
+    """
+    if file.content_type not in settings.IMAGE_ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported content type"
+        )
+    if file.size is not None and file.size > settings.IMAGE_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Image too large"
+        )
+
+    image = await store_image(
+        db,
+        file.file,
+        content_type=file.content_type,
+        owner_id=current_user.id,
+        product_id=product_id,
+    )
+    return ImageOut.model_validate(image)
+
+
+@router.post(
+    "/uploads",
+    response_model=PresignedUpload,
+    summary="Start a direct image upload",
+    description="""
+    Issue a presigned POST policy so the browser can upload an image straight to storage.
+    - **Authentication Required**: The user must be authenticated to access this endpoint.
+    - The policy is bound to one key, the requested content type and the maximum upload size.
+    - Returns the form URL and fields to POST, plus an upload token for the completion call.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Presigned upload issued"},
+        400: {"description": "Unsupported content type"},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+async def create_upload(
+    upload: ImageUploadRequest,
+    current_user: User = Depends(require_principal)
+):
+    """
+    Issue a presigned POST for a new image
+    """
+    if upload.content_type not in settings.IMAGE_ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported content type"
+        )
+
+    filename = os.path.basename(upload.filename) or "upload"
+    s3_key = generate_s3_key(filename)
+    expires_in = settings.S3_PRESIGN_EXPIRE_SECONDS
+
+    presigned = await get_storage().create_upload(
+        s3_key,
+        content_type=upload.content_type,
+        max_size=settings.IMAGE_MAX_UPLOAD_BYTES,
+        expires_in=expires_in,
+    )
+
+    # The token ties the key to this user so nobody else can claim the object.
+    # It carries uid rather than sub and a typ, so it is never accepted as a
+    # bearer token (see app.auth.dependencies._decode_token).
+    upload_token = create_access_token(
+        data={
+            "uid": current_user.id,
+            "typ": UPLOAD_TOKEN_TYPE,
+            "aud": UPLOAD_TOKEN_AUDIENCE,
+            "key": s3_key,
+            "ct": upload.content_type,
+        },
+        expires_delta=timedelta(seconds=expires_in),
+    )
+
+    return PresignedUpload(
+        url=presigned["url"],
+        fields=presigned["fields"],
+        s3_key=s3_key,
+        upload_token=upload_token,
+        expires_in=expires_in,
+    )
+
+
+@router.post(
+    "/uploads/complete",
+    response_model=ImageOut,
+    summary="Finish a direct image upload",
+    description="""
+    Confirm that a presigned upload landed in storage and record the image.
+    - **Authentication Required**: Must be the same user that started the upload.
+    - Verifies the object with a HEAD request (existence, size and content type).
+    - Returns the created image. Repeating the call returns the same image.
+    """,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Image recorded"},
+        400: {"description": "Upload missing or invalid"},
+        401: {"description": "Unauthorized - Authentication required"},
+        403: {"description": "Upload token belongs to another user"}
+    }
+)
+async def complete_upload(
+    payload: ImageUploadComplete,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Verify an uploaded object and insert its Image row
+    """
+    try:
+        claims = get_token_service().decode(payload.upload_token)
+    except TokenError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired upload token"
+        )
+
+    if claims.get("typ") != UPLOAD_TOKEN_TYPE or claims.get("aud") != UPLOAD_TOKEN_AUDIENCE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired upload token"
+        )
+    if claims.get("uid") != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Upload token belongs to another user"
+        )
+
+    s3_key = claims["key"]
+    image_id = uuid.uuid5(UPLOAD_IMAGE_NAMESPACE, s3_key)
+    existing = await run_in_threadpool(_image_out, db, image_id)
+    if existing:
+        return existing
+
+    storage = get_storage()
+    info = await storage.head(s3_key)
+    if info is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload not found"
+        )
+
+    size = info.size
+    content_type = info.content_type
+    if size > settings.IMAGE_MAX_UPLOAD_BYTES or content_type != claims.get("ct"):
+        await storage.delete(s3_key)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded object does not match the upload policy"
+        )
+
+    return await run_in_threadpool(_record_upload, db, {
+        "id": image_id,
+        "s3_key": s3_key,
+        "url": storage.object_url(s3_key),
+        "product_id": payload.product_id,
+        "owner_id": current_user.id,
+        "content_type": content_type,
+        "size": size,
+    })
+
+
+def _image_out(db: Session, image_id: uuid.UUID) -> Optional[ImageOut]:
+    image = db.get(Image, image_id)
+    return ImageOut.model_validate(image) if image else None
+
+
+def _record_upload(db: Session, values: dict) -> ImageOut:
+    """Insert a completed upload's Image row (runs in a worker thread)."""
+    image = insert_or_ignore(db, Image, values)
+    if image is None:
+        # A concurrent completion of the same upload got there first
+        image = db.get(Image, values["id"])
+    image_out = ImageOut.model_validate(image)
+    db.commit()
+    return image_out
+
+
+def get_local_storage() -> LocalStorage:
+    """
+    Dependency for the local file routes, which only exist when images are
+    stored on disk
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return storage
+
+
+@router.get(
+    "/files/{key:path}",
+    summary="Download a locally stored image",
+    description="""
+    Serve an image stored by the local storage backend.
+    - Requires the signature from a download URL issued by the API.
+    - Supports HTTP Range requests.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Image content"},
+        206: {"description": "Partial image content"},
+        403: {"description": "Missing, invalid or expired signature"},
+        404: {"description": "Image not found"}
+    }
+)
+async def get_local_file(
+    key: str,
+    expires: int = 0,
+    signature: str = "",
+    storage: LocalStorage = Depends(get_local_storage)
+):
+    """
+    Serve a file from local storage
+    """
+    if not verify_local_url(key, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid signature")
+
+    response = await storage.serve(key)
+    if response.status_code == status.HTTP_404_NOT_FOUND:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    return response
+
+
+@router.post(
+    "/files/{key:path}",
+    summary="Direct upload target for local storage",
+    description="""
+    Accept a browser form upload issued by POST /images/uploads when images are stored locally.
+    Mirrors an S3 presigned POST: the signed policy pins key, content type and maximum size.
+    """,
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "Upload stored"},
+        400: {"description": "Upload does not match the policy"},
+        403: {"description": "Missing, invalid or expired policy"}
+    }
+)
+async def post_local_file(
+    key: str,
+    policy: str = Form(...),
+    content_type: str = Form(..., alias="Content-Type"),
+    file: UploadFile = File(...),
+    storage: LocalStorage = Depends(get_local_storage)
+):
+    """
+    Store a direct upload on local disk
+    """
+    try:
+        claims = get_token_service().decode(policy)
+    except TokenError:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid upload policy")
+
+    if claims.get("typ") != LOCAL_UPLOAD_POLICY_TYPE or claims.get("key") != key:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid upload policy")
+    if content_type != claims.get("ct") or not file.size or file.size > claims.get("max", 0):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload does not match the policy"
+        )
+
+    await storage.save(key, file.file, content_type)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.delete(
+    "/{image_id}",
+    summary="Delete an image",
+    description="""
+    Delete an image owned by the current user (admins may delete any image).
+    - **Authentication Required**: The user must be authenticated to access this endpoint.
+    - The stored object is removed in the background once no other image shares it.
+    """,
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "Image deleted"},
+        401: {"description": "Unauthorized - Authentication required"},
+        403: {"description": "Image belongs to another user"},
+        404: {"description": "Image not found"}
+    }
+)
+def delete_image(
+    image_id: uuid.UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Delete an image and queue removal of its object
+    """
+    image = db.get(Image, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if image.owner_id != current_user.id and not current_user.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Image belongs to another user")
+
+    key = release_image(db, image)
+    if key is not None:
+        # Queued in the same transaction, so the rows can't go without the object following
+        enqueue(db, "images.delete_object", {"key": key}, idempotency_key=f"images.delete_object:{image_id}",
+                commit=False)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get(
+    "/cache/stats",
+    summary="Image proxy cache statistics (admin only)",
+    description="""
+    Report the on-disk image cache state for this worker process.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    - Includes hit ratio and bytes served from cache instead of S3.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Cache statistics"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_cache_stats(current_user: User = Depends(require_admin)):
+    """
+    Image cache statistics
+    """
+    return get_image_cache().stats()
+
+
+@router.get(
+    "/{image_id}/content",
+    summary="Download an image",
+    description="""
+    Stream an image's bytes through the API.
+    - **Public**: no authentication. Images are listing photos shown to anyone
+      who can see the listing, and ids are random UUIDs; that is also what lets
+      shared caches store them.
+    - Supports HTTP Range and If-None-Match requests.
+    - Responses are marked immutable: an image's content never changes.
+    - With the S3 backend, hot images are served from an on-disk cache.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Image content"},
+        206: {"description": "Partial image content"},
+        304: {"description": "Client copy is current"},
+        404: {"description": "Image not found"},
+        416: {"description": "Range not satisfiable"}
+    }
+)
+async def get_image_content(
+    image_id: uuid.UUID,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Serve an image from local storage, the proxy cache or S3
+
+    Deliberately unauthenticated (see the description); don't store private
+    content as an Image.
+    """
+    # Every column is loaded here, so the rest of the route does no database I/O on the loop
+    image = await run_in_threadpool(db.get, Image, image_id)
+    if not image:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    # Keys are never rewritten, so the key (or content hash) identifies the bytes forever
+    etag = '"' + (image.content_hash or hashlib.sha256(image.s3_key.encode()).hexdigest()) + '"'
+    headers = {
+        "Cache-Control": f"public, max-age={settings.IMAGE_CACHE_MAX_AGE_SECONDS}, immutable",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    storage = get_storage()
+    if isinstance(storage, LocalStorage):
+        path = storage.path_for(image.s3_key)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    elif image.size is not None and image.size <= settings.IMAGE_CACHE_MAX_OBJECT_BYTES:
+        cache = get_image_cache()
+        path = await cache.fetch(image.s3_key, s3_async.download_fileobj)
+        return CachedFileResponse(cache, path, media_type=image.content_type, headers=headers)
+    else:
+        return await stream_from_s3(image, request.headers.get("range"), headers)
+
+    return FileResponse(path, media_type=image.content_type, headers=headers)
+
+
+class CachedFileResponse(FileResponse):
+    """
+    Sends a file from the image cache, keeping it pinned (safe from
+    eviction) until the response is done
+    """
+
+    def __init__(self, cache, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.cache.release(self.path)
+
+
+async def stream_from_s3(image: Image, byte_range: Optional[str], headers: dict) -> StreamingResponse:
+    """
+    Pass an object (or a Range of it) through from S3 without buffering it
+    """
+    try:
+        obj = await s3_async.get_object(image.s3_key, byte_range=byte_range)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        if code == "InvalidRange":
+            raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail="Invalid range")
+        if code in ("NoSuchKey", "404"):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+        raise
+
+    headers = {**headers, "Accept-Ranges": "bytes", "Content-Length": str(obj["ContentLength"])}
+    status_code = status.HTTP_200_OK
+    if obj.get("ContentRange"):
+        headers["Content-Range"] = obj["ContentRange"]
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+
+    async def body():
+        stream = obj["Body"]
+        try:
+            async for chunk in stream.iter_chunks():
+                yield chunk
+        finally:
+            stream.close()
+
+    return StreamingResponse(
+        body(),
+        status_code=status_code,
+        media_type=image.content_type or obj.get("ContentType"),
+        headers=headers,
+    )
@@ -0,0 +1,74 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from app.database import get_db
+from app.schemas.job import JobOut
+from app.models.job import Job
+from app.models.user import User
+from app.auth.dependencies import require_admin
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get(
+    "",
+    response_model=List[JobOut],
+    summary="List background jobs (admin only)",
+    description="""
+    Retrieve background jobs, newest first.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    - Optionally filter by status (queued, running, succeeded, failed) and job name.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "List of jobs retrieved successfully"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_jobs(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    name: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    List jobs (admin only)
+    """
+    query = select(Job).order_by(Job.id.desc()).offset(skip).limit(limit)
+    if status_filter:
+        query = query.where(Job.status == status_filter)
+    if name:
+        query = query.where(Job.name == name)
+    return [JobOut.model_validate(job) for job in db.scalars(query)]
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobOut,
+    summary="Get a background job (admin only)",
+    description="""
+    Retrieve a job's status, progress and last error.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Job retrieved successfully"},
+        404: {"description": "Job not found"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Get job by ID (admin only)
+    """
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return JobOut.model_validate(job)
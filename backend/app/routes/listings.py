@@ -0,0 +1,194 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
+from app.auth.dependencies import require_principal, require_user
+from app.core import geo, hooks, timelines
+from app.database import get_db, get_read_db
+from app.models.listing import Listing
+from app.models.parish import Parish
+from app.models.user import User
+from app.schemas.listing import FeedPage, ListingCreate, ListingOut, NearbyListing, NearbyPage
+
+router = APIRouter(prefix="/listings", tags=["listings"])
+
+
+@router.post(
+    "",
+    response_model=ListingOut,
+    status_code=status.HTTP_201_CREATED,
+    summary="Create a listing",
+    description="""
+    Offer an item for swap or sale.
+    - **Authentication Required**: The listing belongs to the current user.
+    - `parish` defaults to the user's parish, and `latitude`/`longitude` to the user's location.
+    - The listing appears at the top of its parish feed immediately.
+    """,
+    responses={
+        201: {"description": "Listing created"},
+        401: {"description": "Unauthorized - Authentication required"},
+        422: {"description": "Invalid field values"}
+    }
+)
+def create_listing(
+    payload: ListingCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_user)
+):
+    """
+    Create a listing and fan it out to the parish timelines
+    """
+    values = payload.model_dump(mode="json")
+    if values["latitude"] is None:
+        values["latitude"], values["longitude"] = current_user.latitude, current_user.longitude
+    listing = Listing(
+        **{**values, "parish": values["parish"] or current_user.parish},
+        geocell=geo.cell_for(values["latitude"], values["longitude"]),
+        owner_id=current_user.id,
+    )
+    db.add(listing)
+    db.flush()
+    timelines.append(db, listing)
+    listing_out = ListingOut.model_validate(listing)
+    db.commit()
+
+    hooks.emit("listing.created", listing_id=listing_out.id, owner_id=listing_out.owner_id, parish=listing.parish)
+    return listing_out
+
+
+@router.get(
+    "/feed",
+    response_model=FeedPage,
+    summary="Newest listings in a parish",
+    description="""
+    Newest listings first, read from the parish's precomputed timeline.
+    - **Authentication Required**: The user must be authenticated to access this endpoint.
+    - `parish` defaults to the user's parish; `all=true` shows the whole island.
+    - Page with `before`: pass the previous page's `next_before` until it is null.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Feed page retrieved successfully"},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+def get_feed(
+    parish: Optional[Parish] = None,
+    all: bool = False,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_user)
+):
+    """
+    Return one page of a parish feed
+    """
+    if all:
+        key = None
+    else:
+        key = parish.value if parish is not None else current_user.parish
+    listings, next_before = timelines.read(db, key, limit, before)
+    return FeedPage(items=[ListingOut.model_validate(listing) for listing in listings], next_before=next_before)
+
+
+@router.get(
+    "/nearby",
+    response_model=NearbyPage,
+    summary="Listings near a point",
+    description="""
+    Listings within `radius_km` of a point, nearest first, with their distance.
+    - **Authentication Required**: The user must be authenticated to access this endpoint.
+    - `latitude`/`longitude` default to the user's location; one of the two must be set.
+    - Listings without a location are never included.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Nearby listings retrieved successfully"},
+        400: {"description": "No point to search around"},
+        401: {"description": "Unauthorized - Authentication required"}
+    }
+)
+def get_nearby(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(5, gt=0, le=50),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_user)
+):
+    """
+    Radius search over listings
+    """
+    if latitude is None or longitude is None:
+        latitude, longitude = current_user.latitude, current_user.longitude
+    if latitude is None or longitude is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass latitude and longitude or set your location"
+        )
+    matches = geo.nearby(db, Listing, latitude, longitude, radius_km, limit)
+    return NearbyPage(items=[
+        NearbyListing(**ListingOut.model_validate(listing).model_dump(), distance_km=round(distance, 3))
+        for listing, distance in matches
+    ])
+
+
+@router.get(
+    "/{listing_id}",
+    response_model=ListingOut,
+    summary="Get a listing",
+    responses={
+        200: {"description": "Listing retrieved successfully"},
+        401: {"description": "Unauthorized - Authentication required"},
+        404: {"description": "Listing not found"}
+    }
+)
+def get_listing(
+    listing_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Get listing by ID
+    """
+    listing = db.get(Listing, listing_id)
+    if not listing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    return ListingOut.model_validate(listing)
+
+
+@router.delete(
+    "/{listing_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Delete a listing",
+    description="""
+    Remove a listing and take it out of every feed.
+    - **Authentication Required**: Only the owner or an admin may delete it.
+    """,
+    responses={
+        204: {"description": "Listing deleted"},
+        401: {"description": "Unauthorized - Authentication required"},
+        403: {"description": "Listing belongs to another user"},
+        404: {"description": "Listing not found"}
+    }
+)
+def delete_listing(
+    listing_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_principal)
+):
+    """
+    Delete a listing
+    """
+    listing = db.get(Listing, listing_id)
+    if not listing:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    if listing.owner_id != current_user.id and not current_user.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Listing belongs to another user")
+
+    parish = listing.parish
+    timelines.remove(db, [listing_id])
+    db.delete(listing)
+    db.commit()
+
+    hooks.emit("listing.deleted", listing_id=listing_id, parish=parish)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, status
+from app.core import metrics
+from app.models.user import User
+from app.auth.dependencies import require_admin
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get(
+    "",
+    summary="Process metrics (admin only)",
+    description="""
+    Counters and gauges collected by this worker process.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Metrics snapshot"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_metrics(current_user: User = Depends(require_admin)):
+    """
+    Return all metrics for this process
+    """
+    return metrics.snapshot()
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from app.core.profiling import get_profile_store
+from app.models.user import User
+from app.auth.dependencies import require_admin
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+@router.get(
+    "",
+    summary="List stored request profiles (admin only)",
+    description="""
+    Profiles recorded on demand (`X-Profile: store`) or by sampling, newest first.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Profile metadata retrieved successfully"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def list_profiles(current_user: User = Depends(require_admin)):
+    """
+    List stored profiles
+    """
+    return get_profile_store().list()
+
+
+@router.get(
+    "/{profile_id}",
+    response_class=PlainTextResponse,
+    summary="Download a request profile (admin only)",
+    description="""
+    A stored profile in folded-stacks format, ready for flamegraph.pl, speedscope or inferno.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Profile retrieved successfully"},
+        404: {"description": "Profile not found"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_profile(profile_id: str, current_user: User = Depends(require_admin)):
+    """
+    Return one profile as folded stacks
+    """
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.orm import Session
+from app.core.stats import get_summary
+from app.database import get_read_db
+from app.models.user import User
+from app.schemas.stats import StatsOut
+from app.auth.dependencies import require_admin
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get(
+    "",
+    response_model=StatsOut,
+    summary="Dashboard statistics (admin only)",
+    description="""
+    User totals, admin count, users per parish and signups per day, and the same for listings.
+    - **Admin Access Only**: Only users with admin privileges can access this endpoint.
+    - Served from incrementally maintained counters, so the cost doesn't grow with the number of users or listings.
+    - `days` sets how many days of signups and new listings to return, ending today (UTC).
+    """,
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Statistics retrieved successfully"},
+        401: {"description": "Unauthorized - Admin access required"}
+    }
+)
+def get_stats(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Return dashboard statistics
+    """
+    return get_summary(db, days=days)
@@ -1,14 +1,40 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from app.database import get_db
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from app.database import get_db, get_read_db
 from app.schemas.user import UserCreate, UserUpdate, UserOut
+from app.schemas.job import JobOut
 from app.models.user import User
+from app.models.stats import adjust_counters, user_update_deltas
 from app.auth.dependencies import require_admin, require_user
+from app.jobs import enqueue
+from app.core import audit, geo, hooks
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+UPDATE_ATTEMPTS = 3  # for PUT /me without If-Match losing races to concurrent updates
+
+
+def user_etag(user: User) -> str:
+    """ETag for a user's profile; changes whenever the row is updated."""
+    return f'"{user.id}-{user.version}"'
+
+
+def parse_if_match(if_match: Optional[str], user_id: int) -> Optional[int]:
+    """
+    Version the client expects to overwrite, from an If-Match header.
+    Returns None when no precondition was sent.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip().removeprefix("W/").strip('"')
+    owner, _, version = tag.partition("-")
+    if owner != str(user_id) or not version.isdigit():
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="User was modified")
+    return int(version)
+
 
 @router.get(
     "", 
@@ -28,7 +54,7 @@ router = APIRouter(prefix="/users", tags=["users"])
 def get_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_admin)
 ):
     """
@@ -57,13 +83,23 @@ def get_users(
         status_code=status.HTTP_200_OK,
         responses={
             200: {"description": "Current user information retrieved successfully"},
+            304: {"description": "Not modified - the If-None-Match ETag is current"},
             401: {"description": "Unauthorized - Authentication required"}
         }
 )
-def get_current_user_info(current_user: User = Depends(require_user)):
+def get_current_user_info(
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    current_user: User = Depends(require_user)
+):
     """
     Get current user information
     """
+    etag = user_etag(current_user)
+    # Compressed responses carry the weak form of the ETag
+    if if_none_match is not None and if_none_match.removeprefix("W/") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return UserOut(
         id=current_user.id,
         email=current_user.email,
@@ -91,7 +127,7 @@ def get_current_user_info(current_user: User = Depends(require_user)):
 )
 def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(require_admin)
 ):
     """
@@ -118,48 +154,112 @@ def get_user(
     description="""
     Update information for the currently authenticated user.
     - **Authentication Required**: The user must be authenticated to access this endpoint.
-    - Accepts fields to update such as email, username, phone, parish, and admin status.
-    - Returns the updated user object.
+    - Accepts fields to update such as email, username, phone, parish and location
+      (`latitude` and `longitude` together). Only admins may change admin status.
+    - Send the ETag from `GET /me` as `If-Match` to reject the update if the profile changed since it was read.
+    - Returns the updated user object with its new ETag.
     """,
     status_code=status.HTTP_200_OK,
     responses={
         200: {"description": "Current user information updated successfully"},
-        401: {"description": "Unauthorized - Authentication required"}
+        401: {"description": "Unauthorized - Authentication required"},
+        403: {"description": "Forbidden - Only admins can change admin status"},
+        409: {"description": "Email or phone already in use, or the profile kept changing concurrently"},
+        412: {"description": "Profile was modified since it was read"},
+        422: {"description": "Invalid field values"}
     }
 )
 def update_current_user(
     user_update: UserUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_user)
 ):
     """
     Update current user information
+
+    The update is one UPDATE ... RETURNING statement: the version check,
+    the write and reading back the new row share a round trip, and unique
+    violations on email/phone come back from the database instead of a
+    pre-check SELECT.
     """
+    changes = user_update.model_dump(exclude_unset=True, mode="json")
+    if "username" in changes:
+        changes["name"] = changes.pop("username")
 
-    for key, value in user_update.model_dump(exclude_unset=True).items():
-        setattr(current_user, key, value)
+    for field in ("email", "admin"):
+        if field in changes and changes[field] is None:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"{field} cannot be null")
+    if "admin" in changes and changes["admin"] != current_user.admin and not current_user.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can change admin status")
 
-    return UserOut(
-        id=current_user.id,
-        email=current_user.email,
-        name=current_user.name,
-        phone=current_user.phone,
-        parish=current_user.parish,
-        admin=current_user.admin
-    )
+    expected_version = parse_if_match(if_match, current_user.id)
+    if expected_version is not None and expected_version != current_user.version:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="User was modified")
+
+    if not changes:
+        response.headers["ETag"] = user_etag(current_user)
+        return UserOut.model_validate(current_user)
+
+    # The UPDATE is always guarded by the version it starts from, so the
+    # parish/admin values the counters move away from are exactly the ones
+    # it replaced. Without If-Match a lost race re-reads the row and retries.
+    for _ in range(UPDATE_ATTEMPTS):
+        values = {**changes, "version": User.version + 1}
+        if "latitude" in changes:
+            values["geocell"] = geo.cell_for(changes["latitude"], changes["longitude"])
+        if "admin" in changes and changes["admin"] != current_user.admin:
+            # Outstanding access tokens still claim the old admin status
+            values["auth_version"] = User.auth_version + 1
+        stmt = (
+            update(User)
+            .where(User.id == current_user.id, User.version == current_user.version)
+            .values(**values)
+            .returning(User)
+        )
+
+        old_parish, old_admin = current_user.parish, current_user.admin
+        try:
+            user = db.execute(stmt).scalar_one_or_none()
+            if user is None:
+                if expected_version is not None:
+                    raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="User was modified")
+                db.rollback()
+                db.refresh(current_user)
+                continue
+            adjust_counters(db.connection(), user_update_deltas(old_parish, user.parish, old_admin, user.admin))
+            user_out = UserOut.model_validate(user)
+            etag = user_etag(user)
+            version = user.version
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email or phone already in use")
+    else:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User is being modified concurrently")
+
+    hooks.emit("user.updated", user_id=user_out.id, version=version, changes=changes)
+    audit.record("user.updated", actor_id=current_user.id, target_type="user", target_id=user_out.id,
+                 changes=changes, version=version)
+    response.headers["ETag"] = etag
+    return user_out
 
 
 @router.delete(
     "/{user_id}", 
+    response_model=JobOut,
     summary="Delete user (admin only)",
     description="""
     Delete a user by their ID. This endpoint is restricted to admin users only.
     - **Admin Access Only**: Only users with admin privileges can access this endpoint.
-    - Deletes the user corresponding to the provided ID.
+    - Deletes the user and everything they own (images and their stored files) in the background.
+    - Returns the queued job; follow its progress at GET /jobs/{job_id}.
     """,
-    status_code=status.HTTP_204_NO_CONTENT,
+    status_code=status.HTTP_202_ACCEPTED,
     responses={
-        204: {"description": "User deleted successfully"},
+        202: {"description": "User deletion queued"},
         404: {"description": "User not found"},
         401: {"description": "Unauthorized - Admin access required"}
     }
@@ -176,5 +276,8 @@ def delete_user(
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    db.delete(user)
-    db.commit()
+    # Repeated deletes of the same user return the job already queued
+    job = enqueue(db, "users.delete", {"user_id": user_id}, idempotency_key=f"users.delete:{user_id}")
+    audit.record("user.deleted", actor_id=current_user.id, target_type="user", target_id=user_id,
+                 email=user.email, job_id=job.id)
+    return JobOut.model_validate(job)
@@ -0,0 +1,19 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class AuditEntryOut(BaseModel):
+    id: str
+    created_at: datetime
+    actor_id: Optional[int] = None
+    action: str
+    target_type: Optional[str] = None
+    target_id: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+
+
+class AuditPage(BaseModel):
+    items: List[AuditEntryOut]
+    # Pass as ?before= to get the next page; None on the last page
+    next_before: Optional[str] = None
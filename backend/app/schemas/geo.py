@@ -0,0 +1,15 @@
+from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+
+
+class Location(BaseModel):
+    """Optional coordinates; latitude and longitude are given together or not at all."""
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def _both_or_neither(self):
+        given = {"latitude", "longitude"} & self.model_fields_set
+        if len(given) == 1 or (self.latitude is None) != (self.longitude is None):
+            raise ValueError("latitude and longitude must be set together")
+        return self
@@ -0,0 +1,35 @@
+from typing import Dict, Optional
+import uuid
+from pydantic import BaseModel
+
+
+class ImageUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+
+
+class PresignedUpload(BaseModel):
+    url: str
+    fields: Dict[str, str]
+    s3_key: str
+    upload_token: str
+    expires_in: int
+
+
+class ImageUploadComplete(BaseModel):
+    upload_token: str
+    product_id: Optional[int] = None
+
+
+class ImageOut(BaseModel):
+    id: uuid.UUID
+    s3_key: str
+    url: str
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    product_id: Optional[int] = None
+    owner_id: Optional[int] = None
+    content_hash: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,21 @@
+from typing import Any, Optional
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class JobOut(BaseModel):
+    id: int
+    name: str
+    status: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    progress: Optional[dict] = None
+    result: Optional[Any] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,43 @@
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+from app.models.parish import Parish
+from app.schemas.geo import Location
+
+
+class ListingCreate(Location):
+    title: str = Field(min_length=1, max_length=200)
+    description: Optional[str] = Field(default=None, max_length=5000)
+    price: Optional[int] = Field(default=None, ge=0)
+    # Defaults to the owner's parish
+    parish: Optional[Parish] = None
+    # latitude/longitude default to the owner's location
+
+
+class ListingOut(BaseModel):
+    id: int
+    owner_id: int
+    title: str
+    description: Optional[str] = None
+    price: Optional[int] = None
+    parish: Optional[Parish] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class FeedPage(BaseModel):
+    items: List[ListingOut]
+    # Pass as ?before= to get the next page; None on the last page
+    next_before: Optional[int] = None
+
+
+class NearbyListing(ListingOut):
+    distance_km: float
+
+
+class NearbyPage(BaseModel):
+    items: List[NearbyListing]
@@ -0,0 +1,56 @@
+from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+
+class MessageCreate(BaseModel):
+    body: str = Field(min_length=1, max_length=5000)
+
+
+class ConversationCreate(MessageCreate):
+    listing_id: int
+
+
+class MessageOut(BaseModel):
+    id: int
+    conversation_id: int
+    sender_id: int
+    body: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationOut(BaseModel):
+    id: int
+    listing_id: Optional[int] = None
+    buyer_id: int
+    seller_id: int
+    unread_count: int = 0
+    last_message_id: Optional[int] = None
+
+
+class ConversationPage(BaseModel):
+    items: List[ConversationOut]
+    # Pass as ?before= to get the next page; None on the last page
+    next_before: Optional[int] = None
+
+
+class MessagePage(BaseModel):
+    items: List[MessageOut]
+    next_before: Optional[int] = None
+
+
+class MarkRead(BaseModel):
+    # Omit to mark every conversation read
+    conversation_ids: Optional[List[int]] = Field(default=None, max_length=1000)
+
+
+class MarkReadResult(BaseModel):
+    updated: int
+
+
+class UnreadCount(BaseModel):
+    unread: int
+    conversations: int
@@ -0,0 +1,18 @@
+from typing import Dict, List
+from datetime import date
+from pydantic import BaseModel
+
+
+class DailyCount(BaseModel):
+    date: date
+    count: int
+
+
+class StatsOut(BaseModel):
+    users_total: int
+    admins: int
+    users_by_parish: Dict[str, int]
+    signups_per_day: List[DailyCount]
+    listings_total: int
+    listings_by_parish: Dict[str, int]
+    listings_per_day: List[DailyCount]
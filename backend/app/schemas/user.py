@@ -2,10 +2,11 @@ from typing import Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
 from app.models.parish import Parish
+from app.schemas.geo import Location
 
 
 # Properties to receive via API on creation
-class UserCreate(BaseModel):
+class UserCreate(Location):
     email: EmailStr
     username: str
     password: str
@@ -15,7 +16,7 @@ class UserCreate(BaseModel):
 
 
 # Properties to receive via API on update
-class UserUpdate(BaseModel):
+class UserUpdate(Location):
     email: Optional[EmailStr] = None
     username: Optional[str] = None
     phone: Optional[str] = None
@@ -30,6 +31,8 @@ class UserOut(BaseModel):
     phone: str
     parish: Parish
     admin: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,204 @@
+"""
+Production server
+
+    python -m app.server --workers 4 --port 8000
+
+Imports the app once in a supervisor process, binds the listening socket,
+then forks the workers so they share the loaded code copy-on-write. Each
+worker runs uvicorn with uvloop and httptools when they are installed.
+
+On SIGTERM or SIGINT the supervisor asks every worker to stop: workers stop
+accepting connections, finish in-flight requests (up to the graceful
+timeout) and run the app's shutdown hooks. Workers that die unexpectedly
+are replaced.
+
+Platforms without fork() (Windows) fall back to uvicorn's own multi-process
+mode, where each worker imports the app itself.
+"""
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+from app.core.config import settings
+
+APP = "app.main:app"
+RESPAWN_BACKOFF_SECONDS = 1.0
+STARTUP_FAILURE = 3  # same exit code uvicorn uses
+
+
+def default_workers() -> int:
+    """One worker per CPU core this process may run on."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(cpus, 1)
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def build_config(args: argparse.Namespace, app=APP) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        host=args.host,
+        port=args.port,
+        loop=event_loop(),
+        http=http_protocol(),
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        server_header=False,
+        lifespan="on",
+    )
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """Forks and watches the worker processes."""
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int, graceful_timeout: int):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, int] = {}  # pid -> worker number
+        self.stopping = False
+
+    def spawn(self, number: int) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = number
+            return
+
+        # Worker process
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        from app.database import dispose_engines_after_fork
+        dispose_engines_after_fork()
+        code = 1
+        try:
+            server = uvicorn.Server(self.config)
+            server.run(sockets=[self.sock])
+            code = 0 if server.started else STARTUP_FAILURE
+        finally:
+            os._exit(code)
+
+    def stop(self, signum, frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        signal.signal(signal.SIGALRM, self.kill)
+        signal.alarm(self.graceful_timeout + 5)
+
+    def kill(self, signum, frame) -> None:
+        """Graceful timeout expired: stop whatever is left."""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for number in range(self.workers):
+            self.spawn(number)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            number = self.children.pop(pid, None)
+            if number is None or self.stopping:
+                continue
+            if os.waitstatus_to_exitcode(status) == STARTUP_FAILURE:
+                # Restarting won't help (bad config, database unreachable...)
+                print(f"Worker {number} failed to start; shutting down", file=sys.stderr)
+                self.stop(signal.SIGTERM, None)
+                continue
+            print(f"Worker {number} (pid {pid}) exited with status {status}; restarting", file=sys.stderr)
+            time.sleep(RESPAWN_BACKOFF_SECONDS)
+            if not self.stopping:
+                self.spawn(number)
+        self.sock.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the API with multiple worker processes")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS or default_workers(),
+                        help="worker processes (default: one per CPU core)")
+    parser.add_argument("--backlog", type=int, default=settings.SERVER_BACKLOG,
+                        help="pending connections the kernel queues per listening socket")
+    parser.add_argument("--keep-alive", type=int, default=settings.SERVER_KEEPALIVE_SECONDS,
+                        help="seconds to hold idle keep-alive connections")
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+                        help="seconds to let in-flight requests finish on shutdown")
+    parser.add_argument("--forwarded-allow-ips", default=settings.SERVER_FORWARDED_ALLOW_IPS,
+                        help="proxies trusted to set X-Forwarded-* headers")
+    args = parser.parse_args(argv)
+    # Workers split per-process budgets (e.g. the image cache) by this; the
+    # environment carries it to workers that aren't forked from here
+    settings.SERVER_WORKERS = args.workers
+    os.environ["SERVER_WORKERS"] = str(args.workers)
+
+    print(f"Starting {args.workers} worker(s) on {args.host}:{args.port} "
+          f"(loop={event_loop()}, http={http_protocol()})")
+
+    if not hasattr(os, "fork"):
+        config = build_config(args)
+        uvicorn.run(
+            APP,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop=config.loop,
+            http=config.http,
+            backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive,
+            timeout_graceful_shutdown=args.graceful_timeout,
+            forwarded_allow_ips=args.forwarded_allow_ips,
+            server_header=False,
+        )
+        return
+
+    # Preload: import the app (and create tables) once, before forking
+    from app.main import app
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    Supervisor(build_config(args, app), sock, args.workers, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Push notification load test
+
+Holds --connections SSE streams open against one server worker, then
+creates --events listings and measures how long each event takes to reach
+every stream. Reports connections held and the worker's resident memory per
+connection.
+
+By default a single uvicorn worker is started against a throwaway SQLite
+database:
+
+    python -m benchmarks.events --connections 2000 --events 5
+
+or point it at a running server (memory is reported when --pid is given;
+the server's SECRET_KEY is needed to sign a token for the test user):
+
+    python -m benchmarks.events --url http://localhost:8000 --secret ... --pid 12345
+
+Each connection is a socket on both ends, so the open file limit is raised
+to its hard limit first.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def raise_file_limit() -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    return soft
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_server(port: int, secret: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "USE_SQLITE": "true",
+        "SECRET_KEY": secret,
+        "PYTHONPATH": BACKEND_DIR,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--backlog", "4096"],
+        cwd=tempfile.mkdtemp(),  # app.db is created in the working directory
+        env=env,
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("Server didn't start")
+        await asyncio.sleep(0.2)
+
+
+async def create_user(client: httpx.AsyncClient, prefix: str) -> int:
+    response = await client.post(f"{prefix}/auth/auth/register", json={
+        "email": f"events-{uuid.uuid4().hex[:8]}@example.com",
+        "username": "events",
+        "password": "Benchmark123!",
+        "phone": uuid.uuid4().hex[:12],
+        "parish": "St. Andrew",
+        "admin": False,
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+def access_token(secret: str, user_id: int) -> str:
+    """Token signed with the server's secret (HS256)."""
+    from app.auth.tokens import TokenService
+
+    return TokenService("HS256", secret=secret).encode({"sub": str(user_id), "exp": time.time() + 3600})
+
+
+class Listener:
+    """One SSE connection, recording when each listing.created arrives."""
+
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.arrivals: List[float] = []
+        self.failed: Optional[str] = None
+
+    async def run(self, client: httpx.AsyncClient, url: str, token: str) -> None:
+        try:
+            async with client.stream("GET", url, headers={"Authorization": f"Bearer {token}"}) as response:
+                if response.status_code != 200:
+                    self.failed = f"HTTP {response.status_code}"
+                    return
+                async for line in response.aiter_lines():
+                    if line.startswith("retry:"):
+                        self.ready.set()
+                    elif line == "event: listing.created":
+                        self.arrivals.append(time.perf_counter())
+                    elif line == "event: dropped":
+                        self.failed = "dropped"
+                        return
+        except (httpx.HTTPError, OSError) as exc:
+            self.failed = type(exc).__name__
+        finally:
+            self.ready.set()
+
+
+async def run(url: str, prefix: str, secret: str, connections: int, events: int, pid: Optional[int]) -> None:
+    limits = httpx.Limits(max_connections=connections + 10, max_keepalive_connections=10)
+    timeout = httpx.Timeout(60, read=None)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        await wait_until_up(client)
+        token = access_token(secret, await create_user(client, prefix))
+        rss_before = rss_bytes(pid) if pid else None
+
+        listeners = [Listener() for _ in range(connections)]
+        started = time.perf_counter()
+        tasks = []
+        for listener in listeners:
+            tasks.append(asyncio.create_task(listener.run(client, f"{prefix}/events", token)))
+            if len(tasks) % 200 == 0:
+                await asyncio.sleep(0)  # let the accepts keep up
+        await asyncio.gather(*(listener.ready.wait() for listener in listeners))
+        connect_seconds = time.perf_counter() - started
+        held = [listener for listener in listeners if listener.failed is None]
+        rss_after = rss_bytes(pid) if pid else None
+
+        latencies = []
+        for i in range(events):
+            sent = time.perf_counter()
+            response = await client.post(f"{prefix}/listings", json={"title": f"load test {i}"},
+                                         headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            deadline = time.monotonic() + 30
+            while any(len(listener.arrivals) <= i for listener in held if listener.failed is None):
+                if time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.005)
+            latencies.extend(
+                listener.arrivals[i] - sent for listener in held if len(listener.arrivals) > i
+            )
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    failures = {}
+    for listener in listeners:
+        if listener.failed:
+            failures[listener.failed] = failures.get(listener.failed, 0) + 1
+    latencies.sort()
+    print(f"connections held:   {len(held)} / {connections} in one worker (opened in {connect_seconds:.2f}s)")
+    if failures:
+        print(f"failed connections: {failures}")
+    if rss_before and rss_after:
+        per_connection = (rss_after - rss_before) / max(len(held), 1)
+        print(f"worker RSS:         {rss_before / 2**20:.1f} MB idle, {rss_after / 2**20:.1f} MB connected "
+              f"({per_connection / 1024:.1f} KB per connection)")
+    if latencies:
+        print(f"deliveries:         {len(latencies)} of {len(held) * events}")
+        print(f"fan-out latency:    p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, "
+              f"max {latencies[-1] * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: start one worker)")
+    parser.add_argument("--pid", type=int, help="Server worker pid, to report its memory")
+    parser.add_argument("--prefix", default="/api", help="API prefix (default: /api)")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765, help="Port for the server started by default")
+    parser.add_argument("--secret", default=os.environ.get("SECRET_KEY"),
+                        help="The server's SECRET_KEY, to sign a token (default: $SECRET_KEY)")
+    args = parser.parse_args()
+
+    limit = raise_file_limit()
+    if args.connections * 2 + 100 > limit:
+        print(f"warning: open file limit is {limit}; some connections may fail", file=sys.stderr)
+
+    server = None
+    url, pid, secret = args.url, args.pid, args.secret
+    if url is None:
+        secret = uuid.uuid4().hex
+        server = start_server(args.port, secret)
+        url, pid = f"http://127.0.0.1:{args.port}", server.pid
+    try:
+        if not secret:
+            parser.error("--secret is required with --url")
+        asyncio.run(run(url, args.prefix, secret, args.connections, args.events, pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
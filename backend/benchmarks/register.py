@@ -0,0 +1,113 @@
+"""
+Registration throughput benchmark
+
+Fires concurrent POST /auth/register requests and reports registrations per
+second and latency percentiles. Every email is submitted --duplicates times
+at once, so the run also checks that exactly one registration per email wins.
+
+By default the app runs in-process against a throwaway SQLite file:
+
+    python -m benchmarks.register --requests 200 --concurrency 16
+
+or point it at a running server:
+
+    python -m benchmarks.register --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+
+def in_process_client() -> httpx.AsyncClient:
+    """Client for the app wired to a fresh SQLite database."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.database import Base, get_db
+    from app.main import app
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+async def run(client: httpx.AsyncClient, prefix: str, requests: int, concurrency: int, duplicates: int) -> None:
+    run_id = uuid.uuid4().hex[:8]
+    emails = [f"bench-{run_id}-{i}@example.com" for i in range(requests // duplicates)]
+    jobs = [(i, email) for i, email in enumerate(emails) for _ in range(duplicates)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+    winners = Counter()
+
+    async def register(i: int, email: str) -> None:
+        payload = {
+            "email": email,
+            "username": f"bench{i}",
+            "password": "Benchmark123!",
+            "phone": f"{run_id}-{i}",
+            "parish": "St. Andrew",
+            "admin": False,
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(f"{prefix}/auth/auth/register", json=payload)
+            latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] += 1
+        if response.status_code == 201:
+            winners[email] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(register(i, email) for i, email in jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    created = statuses.get(201, 0)
+    print(f"requests:      {len(jobs)} ({duplicates} per email, concurrency {concurrency})")
+    print(f"elapsed:       {elapsed:.2f}s")
+    print(f"registrations: {created} ({created / elapsed:.1f}/s)")
+    print(f"requests/s:    {len(jobs) / elapsed:.1f}")
+    print(f"latency p50:   {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"latency p95:   {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"status codes:  {dict(statuses)}")
+    doubled = [email for email, count in winners.items() if count > 1]
+    print(f"double registrations: {len(doubled)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: run in-process)")
+    parser.add_argument("--prefix", default="/api", help="API prefix (default: /api)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duplicates", type=int, default=2, help="Concurrent submissions per email")
+    args = parser.parse_args()
+
+    async def go():
+        client = httpx.AsyncClient(base_url=args.url, timeout=60) if args.url else in_process_client()
+        async with client:
+            await run(client, args.prefix, args.requests, args.concurrency, max(args.duplicates, 1))
+
+    asyncio.run(go())
+
+
+if __name__ == "__main__":
+    main()
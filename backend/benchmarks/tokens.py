@@ -0,0 +1,83 @@
+"""
+Token verification benchmark
+
+Measures access tokens verified per second on one core, comparing
+python-jose (the previous path: key and claims handled generically on every
+call) with app.auth.tokens.TokenService (keys prepared once):
+
+    python -m benchmarks.tokens --seconds 2
+
+Asymmetric algorithms use a freshly generated key pair.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, UTC
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jose import jwt
+
+from app.auth.tokens import TokenService
+
+SECRET = "benchmark-secret"
+
+
+def pem_pair(algorithm: str):
+    if algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+    private = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private, public
+
+
+def rate(fn, seconds: float) -> float:
+    """Calls per second of fn over roughly the given wall time."""
+    calls = 0
+    batch = 100
+    started = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            fn()
+        calls += batch
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time spent on each measurement")
+    parser.add_argument("--algorithms", default="HS256,ES256,EdDSA")
+    args = parser.parse_args()
+
+    claims = {"sub": "42", "exp": datetime.now(UTC) + timedelta(hours=1)}
+    print(f"{'algorithm':<10}{'python-jose/s':>16}{'TokenService/s':>17}{'speedup':>10}")
+    for algorithm in args.algorithms.split(","):
+        if algorithm.startswith("HS"):
+            service = TokenService(algorithm, secret=SECRET)
+            jose_key = SECRET
+        else:
+            private, public = pem_pair(algorithm)
+            service = TokenService(algorithm, private_key_pem=private)
+            jose_key = public
+        token = service.encode(claims)
+
+        jose_rate = None
+        if algorithm != "EdDSA":  # python-jose doesn't implement EdDSA
+            jwt.decode(token, jose_key, algorithms=[algorithm])
+            jose_rate = rate(lambda: jwt.decode(token, jose_key, algorithms=[algorithm]), args.seconds)
+        service_rate = rate(lambda: service.decode(token), args.seconds)
+
+        jose_text = f"{jose_rate:,.0f}" if jose_rate else "n/a"
+        speedup = f"{service_rate / jose_rate:.1f}x" if jose_rate else "-"
+        print(f"{algorithm:<10}{jose_text:>16}{service_rate:>17,.0f}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
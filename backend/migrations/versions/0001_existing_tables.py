@@ -0,0 +1,114 @@
+"""Bring tables created by an earlier version up to the current models
+
+Base.metadata.create_all only creates missing tables, so databases created
+before these changes lack the columns added since:
+
+- users: latitude, longitude, geocell, created_at, version, auth_version
+- images: owner_id, content_type, size, content_hash, created_at, and
+  s3_key is no longer unique (deduplicated images share an object)
+- listings: latitude, longitude, geocell
+
+Each step is skipped when already applied, so this is safe on databases
+created at any point, including brand new ones.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.database import Base
+import app.models  # noqa: F401 (registers the tables on Base.metadata)
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(table: str) -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _indexes(table: str) -> dict:
+    return {index["name"]: index for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def _add_missing(table: str, *columns: sa.Column) -> None:
+    existing = _columns(table)
+    missing = [column for column in columns if column.name not in existing]
+    if missing:
+        with op.batch_alter_table(table) as batch:
+            for column in missing:
+                batch.add_column(column)
+
+
+def _ensure_index(table: str, name: str, columns: list, unique: bool = False) -> None:
+    index = _indexes(table).get(name)
+    if index is not None and bool(index["unique"]) == unique:
+        return
+    if index is not None:
+        op.drop_index(name, table_name=table)
+    op.create_index(name, table, columns, unique=unique)
+
+
+def upgrade() -> None:
+    # Tables added since (stored_objects, listings, ...) come straight from the
+    # models, as at app startup; the images foreign keys need stored_objects
+    Base.metadata.create_all(bind=op.get_bind())
+
+    _add_missing(
+        "users",
+        sa.Column("latitude", sa.Float(), nullable=True),
+        sa.Column("longitude", sa.Float(), nullable=True),
+        sa.Column("geocell", sa.Integer(), nullable=True),
+        # Unknown for existing users, so they don't appear in signups per day
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+        sa.Column("auth_version", sa.Integer(), server_default="1", nullable=False),
+    )
+    _ensure_index("users", "ix_users_geocell", ["geocell"])
+
+    had_created_at = "created_at" in _columns("images")
+    _add_missing(
+        "images",
+        # Named like PostgreSQL names the models' constraints; batch mode needs a name
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id", name="images_owner_id_fkey"), nullable=True),
+        sa.Column("content_type", sa.String(), nullable=True),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column(
+            "content_hash", sa.String(64),
+            sa.ForeignKey("stored_objects.content_hash", name="images_content_hash_fkey"), nullable=True,
+        ),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+    if not had_created_at:
+        op.execute(sa.text("UPDATE images SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+        with op.batch_alter_table("images") as batch:
+            batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+    _ensure_index("images", "ix_images_s3_key", ["s3_key"])
+    _ensure_index("images", "ix_images_owner_id", ["owner_id"])
+    _ensure_index("images", "ix_images_content_hash", ["content_hash"])
+
+    _add_missing(
+        "listings",
+        sa.Column("latitude", sa.Float(), nullable=True),
+        sa.Column("longitude", sa.Float(), nullable=True),
+        sa.Column("geocell", sa.Integer(), nullable=True),
+    )
+    _ensure_index("listings", "ix_listings_geocell", ["geocell"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_content_hash", table_name="images")
+    op.drop_index("ix_images_owner_id", table_name="images")
+    with op.batch_alter_table("images") as batch:
+        for name in ("owner_id", "content_type", "size", "content_hash", "created_at"):
+            batch.drop_column(name)
+    _ensure_index("images", "ix_images_s3_key", ["s3_key"], unique=True)
+
+    op.drop_index("ix_users_geocell", table_name="users")
+    with op.batch_alter_table("users") as batch:
+        for name in ("latitude", "longitude", "geocell", "created_at", "version", "auth_version"):
+            batch.drop_column(name)
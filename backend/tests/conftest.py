@@ -10,9 +10,13 @@ from sqlalchemy.pool import StaticPool
 # Add the parent directory to the path so we can import app modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db
 from app.main import app
 from app.models.user import User
+from app.core.config import settings
+from app.auth.security import create_access_token
+
+S3_TEST_BUCKET = "test-bucket"
 
 
 # Create in-memory SQLite database for testing
@@ -38,6 +42,12 @@ def db_session() -> Generator:
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def session_factory():
+    """Sessions on the test database, for code that opens its own (job worker, audit flusher)"""
+    return TestingSessionLocal
+
+
 @pytest.fixture(scope="function")
 def client(db_session) -> Generator:
     """Create a test client with database session override"""
@@ -48,6 +58,7 @@ def client(db_session) -> Generator:
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -75,3 +86,103 @@ def sample_superuser_data():
         "is_active": True,
         "is_superuser": True
     }
+
+
+@pytest.fixture
+def test_user(db_session):
+    """A persisted regular user"""
+    user = User(
+        email="user@example.com",
+        name="Test User",
+        hashed_password="not-a-real-hash",
+        phone="555-0100",
+        parish="St. Andrew",
+        admin=False,
+    )
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+@pytest.fixture
+def test_admin(db_session):
+    """A persisted admin user"""
+    user = User(
+        email="boss@example.com",
+        name="Admin User",
+        hashed_password="not-a-real-hash",
+        phone="555-0199",
+        parish="St. James",
+        admin=True,
+    )
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Bearer headers for test_user"""
+    token = create_access_token(data={"sub": str(test_user.id)})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin_headers(test_admin):
+    """Bearer headers for test_admin"""
+    token = create_access_token(data={"sub": str(test_admin.id)})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def s3_endpoint():
+    """Run a local moto S3 server for the test session"""
+    moto_server = pytest.importorskip("moto.server")
+    server = moto_server.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3_bucket():
+    """Name of the bucket s3_settings creates"""
+    return S3_TEST_BUCKET
+
+
+@pytest.fixture
+def s3_settings(s3_endpoint, monkeypatch):
+    """Point the S3 helpers at the moto server and create the bucket"""
+    import asyncio
+    from app.core import s3_async
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", s3_endpoint)
+    monkeypatch.setattr(settings, "S3_BUCKET_NAME", S3_TEST_BUCKET)
+    monkeypatch.setattr(settings, "AWS_REGION", "us-east-1")
+
+    async def create_bucket():
+        client = await s3_async.get_s3_client()
+        try:
+            await client.create_bucket(Bucket=S3_TEST_BUCKET)
+        except client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+        await s3_async.close_s3_client()
+
+    asyncio.run(create_bucket())
+    yield s3_endpoint
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    """Store images on disk under a temporary directory"""
+    from app.core.storage import get_storage
+
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "local")
+    monkeypatch.setattr(settings, "LOCAL_STORAGE_PATH", str(tmp_path / "storage"))
+    return get_storage()
@@ -0,0 +1,190 @@
+import gzip
+import json
+from datetime import timedelta
+
+import pytest
+
+from app.core import audit
+from app.core.audit import audit_log
+from app.models.audit import AuditEntry
+
+
+@pytest.fixture
+def audit_buffer(monkeypatch, session_factory):
+    """The audit log with an empty buffer, writing to the test database only when flushed"""
+    audit_log.stop()
+    audit_log._entries.clear()
+    monkeypatch.setattr(audit_log, "session_factory", session_factory)
+    monkeypatch.setattr(audit_log, "_ensure_running", lambda: None)
+    yield audit_log
+    audit_log._entries.clear()
+
+
+def search(client, headers, **params):
+    response = client.get("/api/audit", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+class TestRecording:
+    """Tests for recording admin and profile changes"""
+
+    def test_profile_update_is_buffered_then_flushed(self, client, auth_headers, admin_headers, test_user,
+                                                     db_session, audit_buffer):
+        """Test the request only buffers the entry; it is written by flush()"""
+        response = client.put("/api/users/users/me", json={"parish": "St. James"}, headers=auth_headers)
+        assert response.status_code == 200
+        assert db_session.query(AuditEntry).count() == 0
+
+        assert audit_buffer.flush() == 1
+        items = search(client, admin_headers, actor_id=test_user.id)["items"]
+        assert len(items) == 1
+        assert items[0]["action"] == "user.updated"
+        assert items[0]["target_id"] == str(test_user.id)
+        assert items[0]["details"]["changes"] == {"parish": "St. James"}
+
+    def test_user_deletion(self, client, admin_headers, test_user, test_admin, audit_buffer):
+        """Test deleting a user records the admin and the target"""
+        client.delete(f"/api/users/users/{test_user.id}", headers=admin_headers)
+        audit_buffer.flush()
+
+        items = search(client, admin_headers, target_type="user", target_id=test_user.id)["items"]
+        assert [(item["action"], item["actor_id"]) for item in items] == [("user.deleted", test_admin.id)]
+        assert items[0]["details"]["email"] == test_user.email
+
+    def test_batch_size_wakes_the_writer(self, audit_buffer, monkeypatch):
+        """Test a full batch triggers a flush without waiting for the interval"""
+        monkeypatch.setattr(audit.settings, "AUDIT_BATCH_SIZE", 3)
+        audit_buffer._wake.clear()
+        audit_buffer.record("a")
+        audit_buffer.record("b")
+        assert not audit_buffer._wake.is_set()
+        audit_buffer.record("c")
+        assert audit_buffer._wake.is_set()
+
+    def test_failed_flush_keeps_entries(self, audit_buffer, monkeypatch):
+        """Test entries survive a failed write and are written next time"""
+        audit_buffer.record("first")
+        monkeypatch.setattr(audit.settings, "AUDIT_BACKEND", "nowhere")
+        with pytest.raises(ValueError):
+            audit_buffer.flush()
+        audit_buffer.record("second")
+        assert [entry["action"] for entry in audit_buffer._entries] == ["first", "second"]
+
+    def test_buffer_is_bounded(self, audit_buffer, monkeypatch):
+        """Test the oldest entries are dropped once the buffer is full"""
+        monkeypatch.setattr(audit.settings, "AUDIT_MAX_BUFFERED", 2)
+        for action in ("a", "b", "c"):
+            audit_buffer.record(action)
+        assert [entry["action"] for entry in audit_buffer._entries] == ["b", "c"]
+
+    def test_entries_are_append_only(self, db_session, audit_buffer):
+        """Test stored entries can't be changed through the ORM"""
+        audit_buffer.record("user.updated", actor_id=1)
+        audit_buffer.flush()
+        entry = db_session.query(AuditEntry).one()
+        entry.action = "nothing happened"
+        with pytest.raises(ValueError):
+            db_session.commit()
+        db_session.rollback()
+
+
+class TestQuery:
+    """Tests for filtering and paging the audit log"""
+
+    def test_filters_and_paging(self, client, admin_headers, audit_buffer):
+        """Test actor/target filters and keyset paging, newest first"""
+        for i in range(5):
+            audit_buffer.record("listing.viewed", actor_id=1, target_type="listing", target_id=i)
+        audit_buffer.record("listing.viewed", actor_id=2, target_type="listing", target_id=0)
+        audit_buffer.flush()
+
+        assert len(search(client, admin_headers, target_type="listing", target_id="0")["items"]) == 2
+
+        seen = []
+        page = search(client, admin_headers, actor_id=1, limit=2)
+        while True:
+            seen.extend(item["target_id"] for item in page["items"])
+            if page["next_before"] is None:
+                break
+            page = search(client, admin_headers, actor_id=1, limit=2, before=page["next_before"])
+        assert seen == ["4", "3", "2", "1", "0"]
+
+    def test_time_range(self, client, admin_headers, audit_buffer):
+        """Test since is inclusive and until exclusive"""
+        entry = audit_buffer.record("user.updated", actor_id=1)
+        audit_buffer.flush()
+        at = audit._timestamp(entry)
+
+        assert len(search(client, admin_headers, since=at.isoformat())["items"]) == 1
+        assert search(client, admin_headers, until=at.isoformat())["items"] == []
+        later = (at + timedelta(seconds=1)).isoformat()
+        assert search(client, admin_headers, since=later)["items"] == []
+        assert len(search(client, admin_headers, since=at.isoformat() + "+00:00", until=later)["items"]) == 1
+
+    def test_admin_only(self, client, auth_headers, audit_buffer):
+        """Test regular users can't read the audit log"""
+        assert client.get("/api/audit", headers=auth_headers).status_code == 403
+
+    def test_file_backend(self, client, admin_headers, audit_buffer, monkeypatch, tmp_path):
+        """Test batches append gzip members to a daily JSONL file that queries read back"""
+        monkeypatch.setattr(audit.settings, "AUDIT_BACKEND", "file")
+        monkeypatch.setattr(audit.settings, "AUDIT_FILE_PATH", str(tmp_path))
+        first = audit_buffer.record("user.updated", actor_id=1, target_type="user", target_id=1)
+        audit_buffer.flush()
+        audit_buffer.record("user.deleted", actor_id=2, target_type="user", target_id=1)
+        audit_buffer.flush()
+
+        [path] = tmp_path.iterdir()
+        assert path.name == f"audit-{first['created_at'][:10]}.jsonl.gz"
+        with gzip.open(path, "rt") as f:
+            assert [json.loads(line)["action"] for line in f] == ["user.updated", "user.deleted"]
+
+        items = search(client, admin_headers, target_id="1")["items"]
+        assert [item["action"] for item in items] == ["user.deleted", "user.updated"]
+        assert [item["actor_id"] for item in search(client, admin_headers, actor_id=1)["items"]] == [1]
+
+    def test_invalid_cursor(self, client, admin_headers, audit_buffer, monkeypatch, tmp_path):
+        """Test a malformed before cursor is a 422 rather than an error reading the files"""
+        monkeypatch.setattr(audit.settings, "AUDIT_BACKEND", "file")
+        monkeypatch.setattr(audit.settings, "AUDIT_FILE_PATH", str(tmp_path))
+        for before in ("abc", "123-xyz", "0" * 21 + "-abcdef0123"):
+            response = client.get("/api/audit", params={"before": before}, headers=admin_headers)
+            assert response.status_code == 422
+
+    def test_file_backend_pages_stop_at_newest_days(self, monkeypatch, tmp_path):
+        """Test a page is read from the newest day files only, and before skips later days"""
+        monkeypatch.setattr(audit.settings, "AUDIT_BACKEND", "file")
+        monkeypatch.setattr(audit.settings, "AUDIT_FILE_PATH", str(tmp_path))
+        day_ns = 86_400 * 10**9
+        start_ns = 1_700_000_000 * 10**9
+        entries = []
+        for day in range(3):
+            for i in range(2):
+                now_ns = start_ns + day * day_ns + i
+                created_at = audit.datetime.fromtimestamp(now_ns / 1e9, audit.UTC).replace(tzinfo=None)
+                entries.append({
+                    "id": audit.new_id(now_ns),
+                    "created_at": created_at.isoformat(),
+                    "actor_id": 1, "action": "user.updated", "target_type": "user", "target_id": "1", "details": None,
+                })
+        audit._write_file(entries)
+
+        opened = []
+        real_open = gzip.open
+        monkeypatch.setattr(audit.gzip, "open", lambda path, *args: opened.append(path) or real_open(path, *args))
+
+        page, cursor = audit.query(None, limit=1)
+        assert [entry["id"] for entry in page] == [entries[5]["id"]]
+        assert len(opened) == 1
+
+        opened.clear()
+        page, cursor = audit.query(None, before=cursor, limit=2)
+        assert [entry["id"] for entry in page] == [entries[4]["id"], entries[3]["id"]]
+        assert len(opened) == 2
+
+        opened.clear()
+        page, cursor = audit.query(None, before=entries[2]["id"], limit=5)
+        assert [entry["id"] for entry in page] == [entries[1]["id"], entries[0]["id"]]
+        assert cursor is None
+        assert len(opened) == 2  # before's day and the day prior; the newest file is skipped
@@ -0,0 +1,131 @@
+import pytest
+from sqlalchemy import event
+
+from app.auth.claims import access_token_claims, principal_from_claims, version_cache
+from app.auth.security import create_access_token
+from app.core.config import settings
+
+
+@pytest.fixture
+def trust_claims(monkeypatch):
+    """Enable AUTH_TRUST_TOKEN_CLAIMS with an empty version cache"""
+    monkeypatch.setattr(settings, "AUTH_TRUST_TOKEN_CLAIMS", True)
+    version_cache.clear()
+    yield
+    version_cache.clear()
+
+
+def claims_headers(user):
+    return {"Authorization": f"Bearer {create_access_token(data=access_token_claims(user))}"}
+
+
+def count_user_selects(db_session):
+    """Count SELECTs against the users table issued through db_session"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "users" in statement:
+            statements.append(statement)
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", record)
+    return statements
+
+
+class TestAccessTokenClaims:
+    """Tests for the authorization claims carried by access tokens"""
+
+    def test_claims_from_user(self, test_admin):
+        """Test claims include the admin flag and auth version"""
+        assert access_token_claims(test_admin) == {"sub": str(test_admin.id), "admin": True, "ver": 1}
+
+    def test_tokens_without_claims_are_not_principals(self):
+        """Test older sub-only tokens fall back to the database path"""
+        assert principal_from_claims({"sub": "1"}) is None
+        assert principal_from_claims({"sub": "x", "admin": True, "ver": 1}) is None
+
+    def test_demotion_bumps_auth_version(self, db_session, test_admin):
+        """Test changing admin through the ORM bumps auth_version"""
+        test_admin.admin = False
+        db_session.commit()
+        assert test_admin.auth_version == 2
+
+    def test_profile_edit_keeps_auth_version(self, db_session, test_user):
+        """Test unrelated changes don't invalidate tokens"""
+        test_user.name = "Renamed"
+        db_session.commit()
+        assert test_user.auth_version == 1
+
+
+class TestTrustedClaims:
+    """Tests for require_admin with AUTH_TRUST_TOKEN_CLAIMS"""
+
+    def test_admin_route_skips_user_load(self, client, db_session, test_admin, trust_claims):
+        """Test only the first request looks up the auth version"""
+        headers = claims_headers(test_admin)
+        statements = count_user_selects(db_session)
+        assert client.get("/api/metrics", headers=headers).status_code == 200
+        assert len(statements) == 1
+        assert "auth_version" in statements[0]
+        assert client.get("/api/metrics", headers=headers).status_code == 200
+        assert len(statements) == 1
+
+    def test_non_admin_claims_forbidden(self, client, test_user, trust_claims):
+        """Test the admin claim is enforced"""
+        response = client.get("/api/metrics", headers=claims_headers(test_user))
+        assert response.status_code == 403
+
+    def test_demoted_admin_token_revoked(self, client, test_admin, trust_claims):
+        """Test demoting yourself invalidates the old token on the next request"""
+        headers = claims_headers(test_admin)
+        assert client.get("/api/metrics", headers=headers).status_code == 200
+
+        response = client.put("/api/users/users/me", json={"admin": False}, headers=headers)
+        assert response.status_code == 200
+
+        response = client.get("/api/metrics", headers=headers)
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Token has been revoked"
+
+    def test_demoted_elsewhere_revoked_after_cache_expires(
+        self, client, db_session, test_admin, trust_claims, monkeypatch
+    ):
+        """Test changes from other processes apply once the cached version expires"""
+        headers = claims_headers(test_admin)
+        assert client.get("/api/metrics", headers=headers).status_code == 200
+
+        test_admin.admin = False
+        db_session.commit()
+        assert client.get("/api/metrics", headers=headers).status_code == 200
+
+        monkeypatch.setattr(version_cache, "ttl", 0)
+        assert client.get("/api/metrics", headers=headers).status_code == 401
+
+    def test_new_token_after_promotion(self, client, db_session, test_user, trust_claims):
+        """Test a token newer than the cached version is accepted"""
+        assert client.get("/api/metrics", headers=claims_headers(test_user)).status_code == 403
+        test_user.admin = True
+        db_session.commit()
+        assert client.get("/api/metrics", headers=claims_headers(test_user)).status_code == 200
+
+    def test_deleted_user_rejected(self, client, db_session, test_admin, trust_claims):
+        """Test tokens for users that no longer exist are refused"""
+        headers = claims_headers(test_admin)
+        db_session.delete(test_admin)
+        db_session.commit()
+        assert client.get("/api/metrics", headers=headers).status_code == 401
+
+
+class TestDatabaseClaims:
+    """Tests for the default mode, which loads the user"""
+
+    def test_outdated_version_rejected(self, client, db_session, test_admin):
+        """Test require_user also refuses tokens minted before a demotion"""
+        headers = claims_headers(test_admin)
+        test_admin.admin = False
+        db_session.commit()
+        response = client.get("/api/users/users/me", headers=headers)
+        assert response.status_code == 401
+
+    def test_sub_only_tokens_still_work(self, client, admin_headers, trust_claims):
+        """Test tokens minted before the claims existed still authenticate"""
+        assert client.get("/api/metrics", headers=admin_headers).status_code == 200
@@ -0,0 +1,148 @@
+import gzip
+import json
+import zlib
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import compression, metrics
+from app.core.compression import CompressionMiddleware, StreamCompressor, choose_encoding
+
+BIG = [{"id": i, "name": f"user {i}", "parish": "St. Andrew"} for i in range(200)]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/big")
+    def big():
+        return BIG
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/cached")
+    def cached():
+        return JSONResponse(BIG, headers={"ETag": '"v1"', "Cache-Control": "public, max-age=60"})
+
+    @app.get("/ndjson")
+    def ndjson():
+        def rows():
+            for row in BIG:
+                yield json.dumps(row) + "\n"
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: x\n\n"] * 100), media_type="text/event-stream")
+
+    @app.get("/image")
+    def image():
+        return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+    metrics.reset()
+    with TestClient(app) as test_client:
+        yield test_client
+    metrics.reset()
+
+
+class TestChooseEncoding:
+    """Test Accept-Encoding negotiation"""
+
+    def test_prefers_brotli(self):
+        """Test brotli wins when installed and accepted"""
+        pytest.importorskip("brotli")
+        assert choose_encoding("gzip, deflate, br") == "br"
+
+    def test_gzip_and_quality(self):
+        """Test q=0 excludes an encoding"""
+        assert choose_encoding("gzip, br;q=0") == "gzip"
+        assert choose_encoding("identity") is None
+        assert choose_encoding("") is None
+
+    def test_without_brotli(self, monkeypatch):
+        """Test gzip is used when brotli isn't installed"""
+        monkeypatch.setattr(compression, "brotli", None)
+        assert choose_encoding("br, gzip") == "gzip"
+
+
+class TestCompressionMiddleware:
+    """Test which responses get compressed"""
+
+    def test_large_json_gzipped(self, client):
+        """Test a large JSON body is compressed and still decodes"""
+        response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.json() == BIG
+        assert int(response.headers["content-length"]) < len(json.dumps(BIG))
+
+    def test_large_json_brotli(self, client):
+        """Test brotli is used when the client prefers it"""
+        pytest.importorskip("brotli")
+        response = client.get("/big", headers={"Accept-Encoding": "br, gzip"})
+        assert response.headers["content-encoding"] == "br"
+        assert response.json() == BIG
+
+    def test_small_body_untouched(self, client):
+        """Test bodies under the minimum size are sent as-is"""
+        response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert metrics.get("compression.skipped_small") == 1
+
+    def test_no_accept_encoding(self, client):
+        """Test clients that don't ask for compression get identity"""
+        response = client.get("/big", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+    def test_binary_and_sse_untouched(self, client):
+        """Test images and event streams are never compressed"""
+        for path in ("/image", "/events"):
+            response = client.get(path, headers={"Accept-Encoding": "gzip"})
+            assert "content-encoding" not in response.headers
+
+    def test_ndjson_streamed(self, client):
+        """Test streaming NDJSON is compressed without a Content-Length"""
+        response = client.get("/ndjson", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert rows == BIG
+
+    def test_cacheable_compressed_once(self, client):
+        """Test identical cacheable payloads reuse the compressed body"""
+        first = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+        assert first.json() == second.json() == BIG
+        assert first.headers["etag"] == 'W/"v1"'
+        assert metrics.get("compression.cache_misses") == 1
+        assert metrics.get("compression.cache_hits") == 1
+
+    def test_uncacheable_not_cached(self, client):
+        """Test responses without cache validators bypass the cache"""
+        client.get("/big", headers={"Accept-Encoding": "gzip"})
+        client.get("/big", headers={"Accept-Encoding": "gzip"})
+        assert metrics.get("compression.cache_hits") == 0
+
+
+class TestStreamCompressor:
+    """Test incremental compression"""
+
+    def test_flushed_chunks_decode_immediately(self):
+        """Test each flushed NDJSON line can be decoded before the stream ends"""
+        stream = StreamCompressor("gzip")
+        decoder = zlib.decompressobj(31)
+        for line in (b'{"a": 1}\n', b'{"b": 2}\n'):
+            assert decoder.decompress(stream.compress(line, flush=True)) == line
+        decoder.decompress(stream.finish())
+        assert decoder.eof
+
+    def test_gzip_output_valid(self):
+        """Test a finished stream is a valid gzip file"""
+        stream = StreamCompressor("gzip")
+        data = stream.compress(b"hello ") + stream.compress(b"world") + stream.finish()
+        assert gzip.decompress(data) == b"hello world"
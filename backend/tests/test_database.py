@@ -51,3 +51,334 @@ class TestDatabaseConnection:
         
         session1.close()
         session2.close()
+
+
+class TestInsertOrIgnore:
+    """Test single-statement inserts with conflict handling"""
+
+    def values(self, **overrides):
+        return {
+            "email": "new@example.com",
+            "name": "New",
+            "hashed_password": "x",
+            "phone": "555-0123",
+            **overrides,
+        }
+
+    def test_insert_returns_row(self, db_session):
+        """Test the inserted row comes back with defaults applied"""
+        from app.database import insert_or_ignore
+        from app.models.user import User
+
+        user = insert_or_ignore(db_session, User, self.values())
+        db_session.commit()
+        assert user.id is not None
+        assert user.version == 1
+        assert user.admin is False
+
+    def test_conflict_returns_none(self, db_session):
+        """Test a duplicate unique value inserts nothing"""
+        from sqlalchemy import func, select
+        from app.database import insert_or_ignore
+        from app.models.user import User
+
+        insert_or_ignore(db_session, User, self.values())
+        db_session.commit()
+        assert insert_or_ignore(db_session, User, self.values(phone="555-0999")) is None
+        assert insert_or_ignore(db_session, User, self.values(email="other@example.com")) is None
+        assert db_session.scalar(select(func.count()).select_from(User)) == 1
+
+
+class TestReadReplicaRouting:
+    """Test reads go to replicas and writes to the primary"""
+
+    @pytest.fixture
+    def databases(self, tmp_path):
+        """Two SQLite files standing in for a primary and its replica"""
+        from sqlalchemy import create_engine
+        from app.models.user import User
+
+        engines = {}
+        for name in ("primary", "replica"):
+            engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+            Base.metadata.create_all(bind=engine)
+            with Session(engine) as db:
+                db.add(User(email=f"{name}@example.com", hashed_password="x"))
+                db.commit()
+            engines[name] = engine
+        yield engines
+        for engine in engines.values():
+            engine.dispose()
+
+    def make_session(self, databases, lag=0.0, read_only=True, **info):
+        from app.database import ReplicaPool, RoutingSession
+
+        pool = ReplicaPool([databases["replica"]], max_lag=5, check_interval=0, lag_probe=lambda engine: lag)
+        return RoutingSession(databases["primary"], pool, info={"read_only": read_only, **info})
+
+    def emails(self, db):
+        from sqlalchemy import select
+        from app.models.user import User
+
+        return set(db.scalars(select(User.email)))
+
+    def test_reads_use_replica(self, databases):
+        """Test a read-only session queries the replica"""
+        with self.make_session(databases) as db:
+            assert self.emails(db) == {"replica@example.com"}
+
+    def test_default_session_uses_primary(self, databases):
+        """Test sessions not marked read-only never touch replicas"""
+        with self.make_session(databases, read_only=False) as db:
+            assert self.emails(db) == {"primary@example.com"}
+
+    def test_lagging_replica_falls_back(self, databases):
+        """Test a replica behind by more than the limit is skipped"""
+        with self.make_session(databases, lag=60) as db:
+            assert self.emails(db) == {"primary@example.com"}
+
+    def test_failing_probe_falls_back(self, databases):
+        """Test a replica whose lag can't be measured is skipped"""
+        from app.database import ReplicaPool, RoutingSession
+
+        def broken(engine):
+            raise RuntimeError("down")
+
+        pool = ReplicaPool([databases["replica"]], max_lag=5, check_interval=0, lag_probe=broken)
+        with RoutingSession(databases["primary"], pool, info={"read_only": True}) as db:
+            assert self.emails(db) == {"primary@example.com"}
+
+    def test_writes_go_to_primary_and_stick(self, databases):
+        """Test a write lands on the primary and later reads follow it"""
+        from app.models.user import User
+
+        with self.make_session(databases) as db:
+            db.add(User(email="new@example.com", hashed_password="x"))
+            db.flush()
+            assert self.emails(db) == {"primary@example.com", "new@example.com"}
+            db.commit()
+
+    def test_read_after_write_uses_primary(self, databases):
+        """Test a user's reads stay on the primary just after they commit"""
+        from types import SimpleNamespace
+        from app.database import note_write
+
+        note_write(4242)
+        state = SimpleNamespace(user_id=4242)
+        with self.make_session(databases, request_state=state) as db:
+            assert self.emails(db) == {"primary@example.com"}
+
+    def test_expired_writes_are_forgotten(self, monkeypatch):
+        """Test recording a write drops writes past the window, even for users never looked up again"""
+        from app import database
+
+        monkeypatch.setattr(database, "_recent_writes", database.OrderedDict())
+        monkeypatch.setattr(database.settings, "DATABASE_READ_AFTER_WRITE_SECONDS", 5.0)
+        now = [100.0]
+        monkeypatch.setattr(database.time, "monotonic", lambda: now[0])
+
+        database.note_write(1)
+        database.note_write(2)
+        now[0] += 3
+        database.note_write(1)
+        now[0] += 3
+        database.note_write(3)
+
+        assert list(database._recent_writes) == [1, 3]
+        assert database.recently_wrote(1)
+        assert not database.recently_wrote(2)
+
+    def test_write_marker_from_another_worker_uses_primary(self, databases):
+        """Test a recent write marker carried by the client keeps reads on the primary"""
+        import time
+        from types import SimpleNamespace
+
+        state = SimpleNamespace(user_id=None, last_write_at=time.time() - 1)
+        with self.make_session(databases, request_state=state) as db:
+            assert self.emails(db) == {"primary@example.com"}
+
+        state = SimpleNamespace(user_id=None, last_write_at=time.time() - 3600)
+        with self.make_session(databases, request_state=state) as db:
+            assert self.emails(db) == {"replica@example.com"}
+
+    def test_write_marker_cookie_round_trip(self):
+        """Test the middleware sets the cookie after a write and reads it back"""
+        import time
+        from starlette.applications import Starlette
+        from starlette.responses import PlainTextResponse
+        from starlette.routing import Route
+        from starlette.testclient import TestClient
+        from app.database import ReadAfterWriteMiddleware
+
+        def write(request):
+            request.state.wrote_at = time.time()
+            return PlainTextResponse("ok")
+
+        def read(request):
+            return PlainTextResponse(str(getattr(request.state, "last_write_at", None)))
+
+        app = Starlette(routes=[Route("/write", write, methods=["POST"]), Route("/read", read)])
+        app.add_middleware(ReadAfterWriteMiddleware)
+        with TestClient(app) as client:
+            assert client.get("/read").text == "None"
+            response = client.post("/write")
+            assert "HttpOnly" in response.headers["set-cookie"]
+            assert abs(float(client.get("/read").text) - time.time()) < 5
+
+    def test_routing_metrics(self, databases):
+        """Test routing decisions are counted"""
+        from app.core import metrics
+
+        metrics.reset()
+        with self.make_session(databases) as db:
+            self.emails(db)
+        with self.make_session(databases, lag=60) as db:
+            self.emails(db)
+        assert metrics.get("db.routing.replica") == 1
+        assert metrics.get("db.routing.fallback") == 1
+        assert metrics.get("db.replica0.lag_seconds") == 60
+
+
+class TestSQLiteTuning:
+    """Test the tuned SQLite writer/reader setup"""
+
+    @pytest.fixture
+    def engines(self, tmp_path):
+        from app.database import create_sqlite_engines
+
+        writer, reader = create_sqlite_engines(f"sqlite:///{tmp_path / 'tuned.db'}")
+        Base.metadata.create_all(bind=writer)
+        yield writer, reader
+        writer.dispose()
+        reader.dispose()
+
+    def session_factory(self, engines):
+        from sqlalchemy.orm import sessionmaker
+        from app.database import ReplicaPool, RoutingSession
+
+        writer, reader = engines
+        pool = ReplicaPool([reader], max_lag=0, check_interval=float("inf"), lag_probe=lambda e: 0.0)
+        return sessionmaker(class_=RoutingSession, primary=writer, replicas=pool, route_reads=True)
+
+    def pragma(self, engine, name):
+        from sqlalchemy import text
+
+        with engine.connect() as conn:
+            return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+    def test_pragmas(self, engines):
+        """Test WAL, synchronous, busy timeout and read-only readers"""
+        from app.core.config import settings
+
+        writer, reader = engines
+        assert self.pragma(writer, "journal_mode") == "wal"
+        assert self.pragma(writer, "synchronous") == 1  # NORMAL
+        assert self.pragma(writer, "busy_timeout") == settings.SQLITE_BUSY_TIMEOUT_MS
+        assert self.pragma(reader, "query_only") == 1
+
+    def test_single_writer_connection(self, engines):
+        """Test the writer pool holds exactly one connection"""
+        writer, _ = engines
+        assert writer.pool.size() == 1
+
+    def test_reads_while_writing(self, engines):
+        """Test readers see committed data while a write transaction is open"""
+        from sqlalchemy import func, select
+        from app.models.user import User
+
+        Session = self.session_factory(engines)
+        with Session() as db:
+            db.add(User(email="a@example.com", hashed_password="x"))
+            db.commit()
+
+        with Session() as writing, Session() as reading:
+            writing.add(User(email="b@example.com", hashed_password="x"))
+            writing.flush()
+            assert reading.scalar(select(func.count()).select_from(User)) == 1
+            writing.commit()
+            assert reading.scalar(select(func.count()).select_from(User)) == 2
+
+    def test_concurrent_writers(self, engines):
+        """Test writes from many threads queue instead of failing with 'database is locked'"""
+        from concurrent.futures import ThreadPoolExecutor
+        from sqlalchemy import func, select
+        from app.models.user import User
+
+        Session = self.session_factory(engines)
+
+        def register(i):
+            with Session() as db:
+                db.scalar(select(func.count()).select_from(User))
+                db.add(User(email=f"user{i}@example.com", hashed_password="x"))
+                db.commit()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(register, range(40)))
+
+        with Session() as db:
+            assert db.scalar(select(func.count()).select_from(User)) == 40
+
+
+class TestRequestSession:
+    """Test one lazily connected session per request"""
+
+    @pytest.fixture
+    def app(self):
+        from fastapi import Depends, FastAPI
+        from sqlalchemy import text
+        from app.database import get_read_db
+
+        app = FastAPI()
+
+        @app.get("/shared")
+        def shared(db: Session = Depends(get_db), read_db: Session = Depends(get_read_db)):
+            return {"same": db is read_db, "read_only": db.info.get("read_only", False)}
+
+        @app.get("/query")
+        def query(db: Session = Depends(get_db)):
+            return {"value": db.scalar(text("SELECT 1"))}
+
+        return app
+
+    def test_dependencies_share_session(self, app):
+        """Test get_db and get_read_db return the same session in one request"""
+        from fastapi.testclient import TestClient
+
+        response = TestClient(app).get("/shared")
+        assert response.json() == {"same": True, "read_only": True}
+
+    def test_no_checkout_without_query(self, app):
+        """Test a request that never queries checks out no connection"""
+        from fastapi.testclient import TestClient
+        from app.core import metrics
+
+        checkouts = metrics.get("db.primary.checkouts")
+        unused = metrics.get("db.sessions.unused")
+        TestClient(app).get("/shared")
+        assert metrics.get("db.primary.checkouts") == checkouts
+        assert metrics.get("db.sessions.unused") == unused + 1
+
+    def test_checkout_on_first_query(self, app):
+        """Test querying checks out one connection and counts the session as used"""
+        from fastapi.testclient import TestClient
+        from app.core import metrics
+
+        checkouts = metrics.get("db.primary.checkouts")
+        used = metrics.get("db.sessions.used")
+        assert TestClient(app).get("/query").json() == {"value": 1}
+        assert metrics.get("db.primary.checkouts") == checkouts + 1
+        assert metrics.get("db.sessions.used") == used + 1
+
+    def test_engine_pool_counters(self, tmp_path):
+        """Test instrumented engines count connects and checkouts"""
+        from sqlalchemy import create_engine, text
+        from app.core import metrics
+        from app.database import instrument_engine
+
+        engine = instrument_engine(create_engine(f"sqlite:///{tmp_path / 'pool.db'}"), "pooltest")
+        for _ in range(3):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        assert metrics.get("db.pooltest.checkouts") == 3
+        assert metrics.get("db.pooltest.connects") == 1
+        engine.dispose()
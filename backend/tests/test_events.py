@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core import metrics
+from app.core.events import DROPPED, Hub, hub, user_topic
+from app.routes.events import sse_stream
+
+
+class TestHub:
+    """Tests for the in-process pub/sub hub"""
+
+    def test_publish_reaches_topic_subscribers(self):
+        """Test events go only to subscribers of the topic"""
+        async def scenario():
+            events = Hub()
+            mine = events.subscribe(["user:1"])
+            other = events.subscribe(["user:2"])
+            assert events.publish("user:1", {"type": "ping"}) == 1
+            assert await mine.get() == {"type": "ping"}
+            assert other.queue.empty()
+
+        asyncio.run(scenario())
+
+    def test_publish_from_another_thread(self):
+        """Test publishing from a worker thread delivers on the subscriber's loop"""
+        async def scenario():
+            events = Hub()
+            subscription = events.subscribe(["parish:St. Andrew"])
+            thread = threading.Thread(target=events.publish, args=("parish:St. Andrew", {"type": "ping"}))
+            thread.start()
+            thread.join()
+            return await asyncio.wait_for(subscription.get(), 1)
+
+        assert asyncio.run(scenario()) == {"type": "ping"}
+
+    def test_slow_consumer_dropped(self):
+        """Test a full queue cuts the subscriber off instead of blocking"""
+        async def scenario():
+            events = Hub()
+            subscription = events.subscribe(["user:1"], maxsize=2)
+            dropped = metrics.get("events.dropped_consumers")
+            for i in range(3):
+                events.publish("user:1", {"type": "ping", "n": i})
+            assert await subscription.get() is DROPPED
+            assert events.connections == 0
+            assert metrics.get("events.dropped_consumers") == dropped + 1
+            assert events.publish("user:1", {"type": "ping"}) == 0
+
+        asyncio.run(scenario())
+
+    def test_unsubscribe_updates_gauge(self):
+        """Test the connections gauge follows subscriptions"""
+        async def scenario():
+            events = Hub()
+            subscription = events.subscribe(["user:1", "parish:*"])
+            assert metrics.get("events.connections") == 1
+            events.unsubscribe(subscription)
+            assert metrics.get("events.connections") == 0
+
+        asyncio.run(scenario())
+
+
+class TestServerSentEvents:
+    """Tests for the SSE stream"""
+
+    def test_stream_formats_events(self):
+        """Test events are framed as SSE and heartbeats are sent when idle"""
+        async def scenario():
+            stream = sse_stream([user_topic(99)], heartbeat=0.01)
+            assert (await stream.__anext__()).startswith("retry: ")
+            assert await stream.__anext__() == ": ping\n\n"
+            hub.publish(user_topic(99), {"type": "user.updated", "version": 2})
+            frame = await stream.__anext__()
+            await stream.aclose()
+            return frame
+
+        frame = asyncio.run(scenario())
+        assert frame == 'event: user.updated\ndata: {"type": "user.updated", "version": 2}\n\n'
+        assert hub.connections == 0
+
+    def test_stream_ends_when_dropped(self, monkeypatch):
+        """Test a dropped consumer gets a final dropped event"""
+        monkeypatch.setattr("app.core.events.settings.EVENTS_QUEUE_SIZE", 1)
+
+        async def scenario():
+            stream = sse_stream([user_topic(98)], heartbeat=5)
+            await stream.__anext__()
+            hub.publish(user_topic(98), {"type": "ping"})
+            hub.publish(user_topic(98), {"type": "ping"})
+            frames = [frame async for frame in stream]
+            return frames
+
+        assert asyncio.run(scenario()) == ['event: dropped\ndata: {"type": "dropped"}\n\n']
+
+    def test_requires_authentication(self, client):
+        """Test the stream refuses anonymous clients"""
+        assert client.get("/api/events").status_code == 401
+        assert client.get("/api/events?access_token=nonsense").status_code == 401
+
+
+class TestWebSocket:
+    """Tests for the WebSocket endpoint"""
+
+    def test_receives_parish_listings(self, client, auth_headers, admin_headers):
+        """Test listings created in the user's parish are pushed"""
+        token = auth_headers["Authorization"].split()[1]
+        with client.websocket_connect(f"/api/events/ws?access_token={token}") as websocket:
+            client.post("/api/listings", json={"title": "Other parish"}, headers=admin_headers)
+            response = client.post("/api/listings", json={"title": "Chair"}, headers=auth_headers)
+            event = websocket.receive_json()
+        assert event["type"] == "listing.created"
+        assert event["listing_id"] == response.json()["id"]
+        assert event["parish"] == "St. Andrew"
+
+    def test_header_authentication(self, client, auth_headers):
+        """Test the Authorization header works too and account changes are pushed"""
+        with client.websocket_connect("/api/events/ws", headers=auth_headers) as websocket:
+            client.put("/api/users/users/me", json={"username": "Renamed"}, headers=auth_headers)
+            assert websocket.receive_json() == {"type": "user.updated", "version": 2}
+
+    def test_rejects_invalid_token(self, client):
+        """Test connections without a valid token are closed before accept"""
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            with client.websocket_connect("/api/events/ws?access_token=nonsense"):
+                pass
+        assert excinfo.value.code == 1008
@@ -0,0 +1,130 @@
+import random
+
+import pytest
+
+from app.core import geo
+from app.models.listing import Listing
+
+KINGSTON = (18.0179, -76.8099)
+HALF_WAY_TREE = (18.0123, -76.7971)  # about 1.5 km from KINGSTON
+SPANISH_TOWN = (17.9911, -76.9574)  # about 16 km from KINGSTON
+
+
+def create(client, headers, title, location=None):
+    fields = {"title": title}
+    if location is not None:
+        fields["latitude"], fields["longitude"] = location
+    response = client.post("/api/listings", json=fields, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestGrid:
+    """Tests for geocells, bounding boxes and distances"""
+
+    def test_distance(self):
+        """Test haversine distances against known values"""
+        assert geo.distance_km(*KINGSTON, *KINGSTON) == 0
+        assert geo.distance_km(*KINGSTON, *SPANISH_TOWN) == pytest.approx(16.0, abs=0.5)
+        assert geo.distance_km(0, 0, 0, 1) == pytest.approx(111.2, abs=0.1)
+
+    def test_cell_ranges_cover_circle(self):
+        """Test every point within the radius falls inside one of the box's cell ranges"""
+        rng = random.Random(7)
+        for _ in range(20):
+            lat, lon = rng.uniform(-70, 70), rng.uniform(-170, 170)
+            radius = rng.uniform(0.5, 30)
+            ranges = geo.cell_ranges(*geo.bounding_box(lat, lon, radius))
+            for _ in range(50):
+                plat, plon = lat + rng.uniform(-0.3, 0.3), lon + rng.uniform(-0.3, 0.3)
+                if geo.distance_km(lat, lon, plat, plon) <= radius:
+                    cell = geo.cell_for(plat, plon)
+                    assert any(low <= cell <= high for low, high in ranges)
+
+    def test_edges_of_the_grid(self):
+        """Test the poles and antimeridian map to valid cells"""
+        assert geo.cell_for(90, 180) == geo.ROWS * geo.COLUMNS - 1
+        assert geo.cell_for(-90, -180) == 0
+        assert geo.cell_for(None, 10) is None
+        south, west, north, east = geo.bounding_box(89.99, 0, 10)
+        assert (west, east, north) == (-180.0, 180.0, 90.0)
+
+    def test_nearby_matches_brute_force(self, db_session, test_user):
+        """Test the indexed search returns exactly the points a full scan would"""
+        rng = random.Random(3)
+        rows = []
+        for i in range(300):
+            lat, lon = KINGSTON[0] + rng.uniform(-0.2, 0.2), KINGSTON[1] + rng.uniform(-0.2, 0.2)
+            rows.append(Listing(owner_id=test_user.id, title=str(i), latitude=lat, longitude=lon,
+                                geocell=geo.cell_for(lat, lon)))
+        db_session.add_all(rows)
+        db_session.commit()
+
+        matches = geo.nearby(db_session, Listing, *KINGSTON, 8, limit=1000)
+        expected = sorted(
+            row.id for row in rows if geo.distance_km(*KINGSTON, row.latitude, row.longitude) <= 8
+        )
+        assert sorted(listing.id for listing, _ in matches) == expected
+        distances = [distance for _, distance in matches]
+        assert distances == sorted(distances)
+
+    def test_rebuild(self, db_session, test_user):
+        """Test rebuild recomputes stale cells"""
+        db_session.add(Listing(owner_id=test_user.id, title="Lamp", latitude=KINGSTON[0], longitude=KINGSTON[1],
+                               geocell=0))
+        db_session.commit()
+        assert geo.rebuild(db_session, Listing) == 1
+        db_session.commit()
+        assert db_session.query(Listing).one().geocell == geo.cell_for(*KINGSTON)
+
+
+class TestNearbyRoute:
+    """Tests for GET /listings/nearby and locations on users and listings"""
+
+    def test_radius_search(self, client, auth_headers):
+        """Test only listings inside the radius come back, nearest first"""
+        create(client, auth_headers, "Far", SPANISH_TOWN)
+        create(client, auth_headers, "Near", HALF_WAY_TREE)
+        create(client, auth_headers, "Here", KINGSTON)
+        create(client, auth_headers, "Nowhere")
+
+        response = client.get(
+            f"/api/listings/nearby?latitude={KINGSTON[0]}&longitude={KINGSTON[1]}&radius_km=5",
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert [item["title"] for item in items] == ["Here", "Near"]
+        assert items[1]["distance_km"] == pytest.approx(1.5, abs=0.2)
+
+    def test_defaults_to_user_location(self, client, auth_headers):
+        """Test the user's saved location is used for new listings and searches"""
+        assert client.get("/api/listings/nearby", headers=auth_headers).status_code == 400
+
+        response = client.put("/api/users/users/me", json={"latitude": KINGSTON[0], "longitude": KINGSTON[1]},
+                              headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["latitude"] == KINGSTON[0]
+
+        listing = create(client, auth_headers, "Chair")
+        assert (listing["latitude"], listing["longitude"]) == KINGSTON
+        items = client.get("/api/listings/nearby?radius_km=1", headers=auth_headers).json()["items"]
+        assert [item["id"] for item in items] == [listing["id"]]
+
+    def test_moving_updates_geocell(self, client, auth_headers, db_session, test_user):
+        """Test the stored cell follows the user's location and is cleared with it"""
+        client.put("/api/users/users/me", json={"latitude": SPANISH_TOWN[0], "longitude": SPANISH_TOWN[1]},
+                   headers=auth_headers)
+        db_session.refresh(test_user)
+        assert test_user.geocell == geo.cell_for(*SPANISH_TOWN)
+
+        client.put("/api/users/users/me", json={"latitude": None, "longitude": None}, headers=auth_headers)
+        db_session.refresh(test_user)
+        assert test_user.geocell is None
+
+    def test_partial_location_rejected(self, client, auth_headers):
+        """Test latitude without longitude is a validation error"""
+        response = client.put("/api/users/users/me", json={"latitude": 18.0}, headers=auth_headers)
+        assert response.status_code == 422
+        response = client.post("/api/listings", json={"title": "Lamp", "longitude": -76.8}, headers=auth_headers)
+        assert response.status_code == 422
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import idempotency, metrics
+from app.database import Base, get_db
+from app.main import app
+from app.models.idempotency import IdempotencyKey
+from app.models.listing import Listing
+
+REGISTRATION = {
+    "email": "retry@example.com",
+    "username": "retry",
+    "password": "Password123!",
+    "phone": "555-0199",
+    "parish": "St. Andrew",
+    "admin": False,
+}
+
+
+@pytest.fixture
+def hash_calls(monkeypatch):
+    """Count (and slow down) password hashing during register"""
+    calls = []
+
+    def fake_hash(password):
+        calls.append(password)
+        time.sleep(0.2)
+        return "hashed"
+
+    monkeypatch.setattr("app.routes.auth.get_password_hash", fake_hash)
+    return calls
+
+
+class TestReplay:
+    """Tests for replaying stored responses"""
+
+    def test_retry_replays_register(self, client, hash_calls):
+        """Test a retried registration returns the first response without running again"""
+        headers = {"Idempotency-Key": "register-1"}
+        first = client.post("/api/auth/auth/register", json=REGISTRATION, headers=headers)
+        second = client.post("/api/auth/auth/register", json=REGISTRATION, headers=headers)
+
+        assert first.status_code == second.status_code == 201
+        assert second.json() == first.json()
+        assert second.headers["idempotent-replayed"] == "true"
+        assert "idempotent-replayed" not in first.headers
+        assert len(hash_calls) == 1
+
+    def test_without_key_runs_twice(self, client, hash_calls):
+        """Test requests without the header are unaffected"""
+        client.post("/api/auth/auth/register", json=REGISTRATION)
+        assert client.post("/api/auth/auth/register", json=REGISTRATION).status_code == 400
+        assert len(hash_calls) == 2
+
+    def test_keys_are_per_principal(self, client, auth_headers, admin_headers, db_session):
+        """Test two users can use the same key independently"""
+        for headers in (auth_headers, admin_headers):
+            response = client.post("/api/listings", json={"title": "Lamp"},
+                                   headers={**headers, "Idempotency-Key": "same"})
+            assert response.status_code == 201
+            assert "idempotent-replayed" not in response.headers
+        assert db_session.query(Listing).count() == 2
+
+    def test_retried_listing_created_once(self, client, auth_headers, db_session):
+        """Test retrying a listing doesn't create a duplicate"""
+        headers = {**auth_headers, "Idempotency-Key": "listing-1"}
+        ids = {client.post("/api/listings", json={"title": "Lamp"}, headers=headers).json()["id"] for _ in range(3)}
+        assert len(ids) == 1
+        assert db_session.query(Listing).count() == 1
+
+    def test_key_reused_for_different_request(self, client, auth_headers):
+        """Test a key can't be reused with a different body"""
+        headers = {**auth_headers, "Idempotency-Key": "listing-2"}
+        client.post("/api/listings", json={"title": "Lamp"}, headers=headers)
+        response = client.post("/api/listings", json={"title": "Chair"}, headers=headers)
+        assert response.status_code == 422
+
+    def test_invalid_key(self, client, auth_headers):
+        """Test overlong keys are rejected"""
+        headers = {**auth_headers, "Idempotency-Key": "x" * 300}
+        assert client.post("/api/listings", json={"title": "Lamp"}, headers=headers).status_code == 400
+
+    def test_oversized_body_rejected(self, client, auth_headers, db_session, monkeypatch):
+        """Test bodies past the upload limit get 413 without claiming the key"""
+        monkeypatch.setattr(idempotency.settings, "IMAGE_MAX_UPLOAD_BYTES", 100)
+        headers = {**auth_headers, "Idempotency-Key": "listing-big"}
+        response = client.post("/api/listings", json={"title": "x" * 200}, headers=headers)
+        assert response.status_code == 413
+        assert db_session.query(IdempotencyKey).count() == 0
+
+    def test_no_store_responses_not_kept(self):
+        """Test responses marked no-store, like the login token, are never stored for replay"""
+        def start(status_code, *headers):
+            return {"type": "http.response.start", "status": status_code, "headers": list(headers)}
+
+        assert idempotency._storable(start(200, (b"content-type", b"application/json")))
+        assert idempotency._storable(start(422))
+        assert not idempotency._storable(start(200, (b"cache-control", b"no-store")))
+        assert not idempotency._storable(start(503))
+        assert not idempotency._storable(None)
+
+
+class TestKeyLifecycle:
+    """Tests for expiry, failures and concurrent duplicates"""
+
+    def test_expired_key_runs_again(self, client, auth_headers, db_session):
+        """Test a key past its TTL is treated as new"""
+        headers = {**auth_headers, "Idempotency-Key": "listing-3"}
+        first = client.post("/api/listings", json={"title": "Lamp"}, headers=headers).json()
+        row = db_session.query(IdempotencyKey).one()
+        row.expires_at = idempotency.utcnow() - timedelta(seconds=1)
+        db_session.commit()
+
+        second = client.post("/api/listings", json={"title": "Lamp"}, headers=headers)
+        assert "idempotent-replayed" not in second.headers
+        assert second.json()["id"] != first["id"]
+
+    def test_server_errors_release_the_key(self, client, auth_headers, db_session, monkeypatch):
+        """Test a failed first attempt doesn't get replayed"""
+        def broken(db, listing):
+            raise RuntimeError("timeline unavailable")
+
+        monkeypatch.setattr("app.routes.listings.timelines.append", broken)
+        headers = {**auth_headers, "Idempotency-Key": "listing-4"}
+        with pytest.raises(RuntimeError):
+            client.post("/api/listings", json={"title": "Lamp"}, headers=headers)
+        db_session.rollback()
+        assert db_session.query(IdempotencyKey).count() == 0
+
+        monkeypatch.undo()
+        assert client.post("/api/listings", json={"title": "Lamp"}, headers=headers).status_code == 201
+
+    def test_abandoned_claim_is_taken_over(self, client, db_session, monkeypatch):
+        """Test an unfinished claim older than the lock timeout can be reclaimed"""
+        assert idempotency.claim(app, "k", "anonymous", "f")[0] == idempotency.CLAIMED
+        assert idempotency.claim(app, "k", "anonymous", "f")[0] == idempotency.BUSY
+
+        monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_LOCK_SECONDS", -1)
+        assert idempotency.claim(app, "k", "anonymous", "f")[0] == idempotency.CLAIMED
+
+    def test_purge_expired(self, client, db_session):
+        """Test purge removes only expired keys"""
+        idempotency.claim(app, "old", "anonymous", "f")
+        idempotency.claim(app, "new", "anonymous", "f")
+        db_session.get(IdempotencyKey, ("old", "anonymous")).expires_at = idempotency.utcnow()
+        db_session.commit()
+        assert idempotency.purge_expired(db_session) == 1
+        db_session.commit()
+        assert [row.key for row in db_session.query(IdempotencyKey)] == ["new"]
+
+    def test_concurrent_duplicates_run_once(self, hash_calls, tmp_path):
+        """Test simultaneous retries wait for the first and share its response"""
+        # A session per request: the shared in-memory session can't be used from several threads at once
+        engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}",
+                               connect_args={"check_same_thread": False, "timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def override_get_db():
+            db = Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        metrics.reset()
+
+        async def send_both():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+                return await asyncio.gather(*(
+                    async_client.post("/api/auth/auth/register", json=REGISTRATION,
+                                      headers={"Idempotency-Key": "register-2"})
+                    for _ in range(3)
+                ))
+
+        try:
+            responses = asyncio.run(send_both())
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+        assert [response.status_code for response in responses] == [201, 201, 201]
+        assert len({response.json()["id"] for response in responses}) == 1
+        assert len(hash_calls) == 1
+        assert metrics.get("idempotency.replayed") == 2
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import pytest
+
+from app.core import metrics
+from app.core.image_cache import ImageCache, get_image_cache
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def fetch(cache, key, download):
+    """Fetch and release straight away, as a finished response would"""
+    path = asyncio.run(cache.fetch(key, download))
+    cache.release(path)
+    return path
+
+
+def make_downloader(payloads, calls):
+    async def download(key, file_obj):
+        calls.append(key)
+        await asyncio.sleep(0)
+        file_obj.write(payloads[key])
+    return download
+
+
+class TestImageCache:
+    """Test the on-disk LRU cache"""
+
+    def test_miss_then_hit(self, tmp_path):
+        """Test the second fetch is served from disk"""
+        cache = ImageCache(str(tmp_path), max_bytes=100)
+        calls = []
+        download = make_downloader({"a": b"aaaa"}, calls)
+
+        first = fetch(cache, "a", download)
+        second = fetch(cache, "a", download)
+
+        assert first == second
+        assert open(first, "rb").read() == b"aaaa"
+        assert calls == ["a"]
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+        assert stats["bytes_saved"] == 4
+        assert stats["bytes_fetched"] == 4
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test the oldest untouched object goes first when over budget"""
+        cache = ImageCache(str(tmp_path), max_bytes=10)
+        calls = []
+        download = make_downloader({"a": b"a" * 4, "b": b"b" * 4, "c": b"c" * 4}, calls)
+
+        path_a = fetch(cache, "a", download)
+        path_b = fetch(cache, "b", download)
+        fetch(cache, "a", download)  # touch a
+        fetch(cache, "c", download)
+
+        assert os.path.exists(path_a)
+        assert not os.path.exists(path_b)
+        assert cache.lookup("b") is None
+        assert cache.stats()["size_bytes"] == 8
+        assert cache.stats()["evictions"] == 1
+
+    def test_concurrent_misses_share_download(self, tmp_path):
+        """Test simultaneous requests for one key download it once"""
+        cache = ImageCache(str(tmp_path), max_bytes=100)
+        calls = []
+        download = make_downloader({"a": b"data"}, calls)
+
+        async def scenario():
+            return await asyncio.gather(*[cache.fetch("a", download) for _ in range(5)])
+
+        paths = asyncio.run(scenario())
+        assert len(set(paths)) == 1
+        assert calls == ["a"]
+
+    def test_failed_download_not_cached(self, tmp_path):
+        """Test a failing download leaves nothing behind"""
+        cache = ImageCache(str(tmp_path), max_bytes=100)
+
+        async def broken(key, file_obj):
+            file_obj.write(b"partial")
+            raise IOError("connection reset")
+
+        with pytest.raises(IOError):
+            asyncio.run(cache.fetch("a", broken))
+        assert cache.lookup("a") is None
+        assert cache.stats()["size_bytes"] == 0
+
+    def test_reloads_existing_files(self, tmp_path):
+        """Test a new cache instance picks up files from a previous run"""
+        cache = ImageCache(str(tmp_path), max_bytes=100)
+        fetch(cache, "a", make_downloader({"a": b"abc"}, []))
+        cache.close()
+
+        reloaded = ImageCache(str(tmp_path), max_bytes=100)
+        assert reloaded.root == cache.root
+        assert reloaded.lookup("a") is not None
+        assert reloaded.stats()["size_bytes"] == 3
+
+    def test_pinned_file_survives_eviction(self, tmp_path):
+        """Test a file being served isn't removed until it is released"""
+        cache = ImageCache(str(tmp_path), max_bytes=4)
+        download = make_downloader({"a": b"a" * 4, "b": b"b" * 4}, [])
+
+        path_a = asyncio.run(cache.fetch("a", download))
+        path_b = fetch(cache, "b", download)
+        assert os.path.exists(path_a)
+        assert not os.path.exists(path_b)  # the unpinned newcomer went instead
+
+        cache.release(path_a)
+        assert os.path.exists(path_a)
+        fetch(cache, "b", download)
+        assert not os.path.exists(path_a)
+
+    def test_processes_use_separate_slots(self, tmp_path):
+        """Test concurrent caches on one directory never touch each other's files"""
+        first = ImageCache(str(tmp_path), max_bytes=4)
+        path = fetch(first, "a", make_downloader({"a": b"aaaa"}, []))
+        in_progress = os.path.join(os.path.dirname(path), "tmp-download")
+        open(in_progress, "wb").close()
+
+        second = ImageCache(str(tmp_path), max_bytes=4)
+        assert second.root != first.root
+        fetch(second, "b", make_downloader({"b": b"bbbb"}, []))
+        fetch(second, "c", make_downloader({"c": b"cccc"}, []))
+
+        assert os.path.exists(path)
+        assert os.path.exists(in_progress)
+
+    def test_budget_split_per_worker(self, tmp_path, monkeypatch):
+        """Test each process gets its share, with SERVER_WORKERS=0 meaning one worker per core"""
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "IMAGE_CACHE_PATH", str(tmp_path))
+        monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_BYTES", 1200)
+        monkeypatch.setattr("app.server.default_workers", lambda: 3)
+
+        monkeypatch.setattr(settings, "SERVER_WORKERS", 4)
+        assert get_image_cache().max_bytes == 300
+        monkeypatch.setattr(settings, "SERVER_WORKERS", 0)
+        assert get_image_cache().max_bytes == 400
@@ -0,0 +1,276 @@
+import time
+from datetime import timedelta
+import pytest
+from fastapi import status
+
+from app.core.config import settings
+from app.jobs import task, enqueue, run_pending, set_progress
+from app.jobs.queue import claim_next, requeue_stale, retry_delay, utcnow
+from app.jobs.worker import Worker
+from app.models.job import Job, JobStatus
+
+calls = []
+
+
+@task("test.record")
+def record(db, value):
+    calls.append(value)
+    return {"recorded": value}
+
+
+@task("test.fail")
+def fail(db):
+    raise RuntimeError("boom")
+
+
+@task("test.progress")
+def progress(db, job_id):
+    set_progress(db, job_id, done=3, total=3)
+
+
+@task("test.async")
+async def async_task(db, value):
+    return value * 2
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+def refreshed(db_session, job):
+    db_session.expire_all()
+    return db_session.get(Job, job.id)
+
+
+class TestEnqueue:
+    """Test queueing jobs"""
+
+    def test_enqueue_unknown_task(self, db_session):
+        """Test unknown task names are rejected up front"""
+        with pytest.raises(ValueError):
+            enqueue(db_session, "test.nope")
+
+    def test_enqueue_defaults(self, db_session):
+        """Test a job is queued and due immediately"""
+        job = enqueue(db_session, "test.record", {"value": 1})
+        assert job.status == JobStatus.QUEUED
+        assert job.attempts == 0
+        assert job.max_attempts == settings.JOB_MAX_ATTEMPTS
+        assert job.run_at <= utcnow()
+
+    def test_enqueue_idempotency_key(self, db_session):
+        """Test the same key returns the existing job"""
+        first = enqueue(db_session, "test.record", {"value": 1}, idempotency_key="k")
+        second = enqueue(db_session, "test.record", {"value": 2}, idempotency_key="k")
+        assert first.id == second.id
+        assert db_session.query(Job).count() == 1
+
+
+class TestRunJobs:
+    """Test claiming and running jobs"""
+
+    def test_run_pending_success(self, db_session, session_factory):
+        """Test a successful job stores its result"""
+        job = enqueue(db_session, "test.record", {"value": "a"})
+        assert run_pending(session_factory) == 1
+
+        job = refreshed(db_session, job)
+        assert calls == ["a"]
+        assert job.status == JobStatus.SUCCEEDED
+        assert job.result == {"recorded": "a"}
+        assert job.attempts == 1
+        assert job.finished_at is not None
+
+    def test_delayed_job_not_claimed(self, db_session):
+        """Test jobs are not run before run_at"""
+        enqueue(db_session, "test.record", {"value": 1}, delay_seconds=60)
+        assert claim_next(db_session) is None
+
+    def test_failure_retries_with_backoff(self, db_session, session_factory):
+        """Test a failing job is requeued for later"""
+        job = enqueue(db_session, "test.fail", max_attempts=3)
+        run_pending(session_factory)
+
+        job = refreshed(db_session, job)
+        assert job.status == JobStatus.QUEUED
+        assert job.attempts == 1
+        assert job.run_at > utcnow()
+        assert "boom" in job.last_error
+
+    def test_failure_exhausts_attempts(self, db_session, session_factory):
+        """Test a job fails permanently after max_attempts"""
+        job = enqueue(db_session, "test.fail", max_attempts=1)
+        run_pending(session_factory)
+        assert refreshed(db_session, job).status == JobStatus.FAILED
+
+    def test_retry_delay_grows_and_caps(self, monkeypatch):
+        """Test backoff doubles and is capped"""
+        monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_SECONDS", 1.0)
+        monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_MAX_SECONDS", 4.0)
+        assert 0.5 <= retry_delay(1) <= 1.0
+        assert 1.0 <= retry_delay(2) <= 2.0
+        assert 2.0 <= retry_delay(10) <= 4.0
+
+    def test_progress_and_job_id(self, db_session, session_factory):
+        """Test handlers declaring job_id can report progress"""
+        job = enqueue(db_session, "test.progress")
+        run_pending(session_factory)
+        assert refreshed(db_session, job).progress == {"done": 3, "total": 3}
+
+    def test_async_handler(self, db_session, session_factory):
+        """Test coroutine handlers are awaited"""
+        job = enqueue(db_session, "test.async", {"value": 21})
+        run_pending(session_factory)
+        assert refreshed(db_session, job).result == 42
+
+    def test_requeue_stale(self, db_session):
+        """Test jobs abandoned by a dead worker are put back"""
+        job = enqueue(db_session, "test.record", {"value": 1})
+        claim_next(db_session)
+        job = refreshed(db_session, job)
+        job.locked_at = utcnow() - timedelta(hours=1)
+        db_session.commit()
+
+        assert requeue_stale(db_session, older_than_seconds=60) == 1
+        assert refreshed(db_session, job).status == JobStatus.QUEUED
+
+    def test_requeue_stale_gives_up_after_max_attempts(self, db_session):
+        """Test a job that keeps killing its worker fails instead of looping forever"""
+        job = enqueue(db_session, "test.record", {"value": 1}, max_attempts=1)
+        claim_next(db_session)
+        job = refreshed(db_session, job)
+        job.locked_at = utcnow() - timedelta(hours=1)
+        db_session.commit()
+
+        assert requeue_stale(db_session, older_than_seconds=60) == 0
+        job = refreshed(db_session, job)
+        assert job.status == JobStatus.FAILED
+        assert job.finished_at is not None
+
+    def test_requeue_stale_zero_threshold(self, db_session):
+        """Test an explicit 0 isn't replaced by the configured default"""
+        job = enqueue(db_session, "test.record", {"value": 1})
+        claim_next(db_session)
+        refreshed(db_session, job).locked_at = utcnow() - timedelta(seconds=1)
+        db_session.commit()
+
+        assert requeue_stale(db_session, older_than_seconds=0) == 1
+
+    def test_worker_threads(self, db_session, session_factory):
+        """Test a Worker picks up queued jobs in the background"""
+        job = enqueue(db_session, "test.record", {"value": "bg"})
+        worker = Worker(concurrency=1, poll_interval=0.01, session_factory=session_factory)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 5
+            while refreshed(db_session, job).status != JobStatus.SUCCEEDED and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            worker.stop(timeout=5)
+        assert calls == ["bg"]
+
+
+class TestJobRoutes:
+    """Test the admin job endpoints"""
+
+    def test_list_jobs_requires_admin(self, client, auth_headers):
+        """Test regular users can't list jobs"""
+        response = client.get(f"{settings.API_V1_STR}/jobs", headers=auth_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_list_and_get_jobs(self, client, admin_headers, db_session):
+        """Test admins can list, filter and fetch jobs"""
+        job = enqueue(db_session, "test.record", {"value": 1})
+        enqueue(db_session, "test.fail")
+
+        listed = client.get(f"{settings.API_V1_STR}/jobs?name=test.record", headers=admin_headers).json()
+        assert [j["id"] for j in listed] == [job.id]
+
+        queued = client.get(f"{settings.API_V1_STR}/jobs?status=queued", headers=admin_headers).json()
+        assert len(queued) == 2
+
+        fetched = client.get(f"{settings.API_V1_STR}/jobs/{job.id}", headers=admin_headers)
+        assert fetched.json()["payload"] == {"value": 1}
+
+    def test_get_missing_job(self, client, admin_headers):
+        """Test unknown job IDs return 404"""
+        response = client.get(f"{settings.API_V1_STR}/jobs/999", headers=admin_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestImageDeleteJob:
+    """Test image deletion moves object removal to the queue"""
+
+    def test_delete_image_queues_object_removal(self, client, auth_headers, db_session, local_storage,
+                                                session_factory):
+        """Test the object is removed by the job, not the request"""
+        image = client.post(
+            f"{settings.API_V1_STR}/images",
+            files={"file": ("p.png", b"bytes", "image/png")},
+            headers=auth_headers,
+        ).json()
+
+        response = client.delete(f"{settings.API_V1_STR}/images/{image['id']}", headers=auth_headers)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert local_storage._head_sync(image["s3_key"]) is not None
+
+        assert run_pending(session_factory) == 1
+        assert local_storage._head_sync(image["s3_key"]) is None
+
+    def test_reupload_before_job_runs_keeps_object(self, client, auth_headers, db_session, local_storage,
+                                                   session_factory):
+        """Test the same bytes uploaded again while the delete is queued survive the job"""
+        url = f"{settings.API_V1_STR}/images"
+        image = client.post(url, files={"file": ("p.png", b"bytes", "image/png")}, headers=auth_headers).json()
+        client.delete(f"{url}/{image['id']}", headers=auth_headers)
+        again = client.post(url, files={"file": ("p.png", b"bytes", "image/png")}, headers=auth_headers).json()
+
+        assert run_pending(session_factory) == 1
+        assert local_storage._head_sync(image["s3_key"]) is None
+        assert local_storage._head_sync(again["s3_key"]) is not None
+
+    def test_delete_job_skips_referenced_keys(self, client, auth_headers, db_session, local_storage,
+                                              session_factory):
+        """Test a queued delete leaves an object alone once something references it again"""
+        image = client.post(
+            f"{settings.API_V1_STR}/images",
+            files={"file": ("p.png", b"bytes", "image/png")},
+            headers=auth_headers,
+        ).json()
+        enqueue(db_session, "images.delete_objects", {"keys": [image["s3_key"]]})
+
+        assert run_pending(session_factory) == 1
+        assert local_storage._head_sync(image["s3_key"]) is not None
+
+    def test_delete_job_queries_off_the_shared_loop(self, db_session, local_storage, session_factory,
+                                                    monkeypatch):
+        """Test the reference check runs in the worker thread, not on the shared job event loop"""
+        import threading
+        from app.jobs import tasks
+
+        threads = []
+        check = tasks.unreferenced
+
+        def tracking_unreferenced(db, keys):
+            threads.append(threading.current_thread().name)
+            return check(db, keys)
+
+        monkeypatch.setattr(tasks, "unreferenced", tracking_unreferenced)
+        enqueue(db_session, "images.delete_objects", {"keys": ["objects/missing"]})
+
+        assert run_pending(session_factory) == 1
+        assert threads and "jobs-async" not in threads
+
+    def test_delete_image_other_user(self, client, auth_headers, admin_headers, test_admin, local_storage):
+        """Test users can't delete someone else's image, admins can"""
+        image = client.post(
+            f"{settings.API_V1_STR}/images",
+            files={"file": ("p.png", b"bytes", "image/png")},
+            headers=admin_headers,
+        ).json()
+        url = f"{settings.API_V1_STR}/images/{image['id']}"
+
+        assert client.delete(url, headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+        assert client.delete(url, headers=admin_headers).status_code == status.HTTP_204_NO_CONTENT
+        assert client.delete(url, headers=admin_headers).status_code == status.HTTP_404_NOT_FOUND
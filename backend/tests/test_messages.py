@@ -0,0 +1,171 @@
+import pytest
+from sqlalchemy import event
+
+from app.core import hooks
+from app.jobs.queue import run_pending
+from app.models.message import Message
+
+
+@pytest.fixture
+def listing(client, admin_headers):
+    """A listing owned by test_admin"""
+    response = client.post("/api/listings", json={"title": "Bicycle"}, headers=admin_headers)
+    return response.json()
+
+
+def start(client, headers, listing, body="Is this available?"):
+    response = client.post("/api/conversations", json={"listing_id": listing["id"], "body": body}, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestConversations:
+    """Tests for starting conversations and sending messages"""
+
+    def test_start_conversation(self, client, auth_headers, listing, test_user, test_admin):
+        """Test messaging a listing creates one conversation with the seller"""
+        conversation = start(client, auth_headers, listing)
+        assert conversation["buyer_id"] == test_user.id
+        assert conversation["seller_id"] == test_admin.id
+        assert conversation["unread_count"] == 0
+
+        again = start(client, auth_headers, listing, "Still there?")
+        assert again["id"] == conversation["id"]
+
+    def test_cannot_message_own_listing(self, client, admin_headers, listing):
+        """Test sellers can't start a conversation with themselves"""
+        response = client.post("/api/conversations", json={"listing_id": listing["id"], "body": "hi"},
+                               headers=admin_headers)
+        assert response.status_code == 400
+
+    def test_unknown_listing(self, client, auth_headers):
+        """Test messaging a missing listing returns 404"""
+        response = client.post("/api/conversations", json={"listing_id": 999, "body": "hi"}, headers=auth_headers)
+        assert response.status_code == 404
+
+    def test_outsiders_cannot_read(self, client, auth_headers, admin_headers, listing, db_session):
+        """Test only participants see a conversation"""
+        from app.models.user import User
+        from app.auth.security import create_access_token
+
+        outsider = User(email="other@example.com", hashed_password="x", phone="555-0111", name="Other")
+        db_session.add(outsider)
+        db_session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': str(outsider.id)})}"}
+
+        conversation = start(client, auth_headers, listing)
+        url = f"/api/conversations/{conversation['id']}/messages"
+        assert client.get(url, headers=headers).status_code == 404
+        assert client.post(url, json={"body": "hi"}, headers=headers).status_code == 404
+
+    def test_message_event_emitted(self, client, auth_headers, listing, test_admin):
+        """Test recipients are announced through the message.created hook"""
+        seen = []
+
+        def record(**kwargs):
+            seen.append(kwargs)
+
+        hooks.on("message.created")(record)
+        try:
+            start(client, auth_headers, listing)
+        finally:
+            hooks.remove("message.created", record)
+        assert seen[0]["recipient_ids"] == [test_admin.id]
+
+
+class TestPagination:
+    """Tests for keyset-paginated inbox and history"""
+
+    def test_history_pages(self, client, auth_headers, listing):
+        """Test paging through history visits every message once, newest first"""
+        conversation = start(client, auth_headers, listing, "0")
+        url = f"/api/conversations/{conversation['id']}/messages"
+        for i in range(1, 5):
+            assert client.post(url, json={"body": str(i)}, headers=auth_headers).status_code == 201
+
+        bodies = []
+        page = client.get(f"{url}?limit=2", headers=auth_headers).json()
+        while True:
+            bodies.extend(message["body"] for message in page["items"])
+            if page["next_before"] is None:
+                break
+            page = client.get(f"{url}?limit=2&before={page['next_before']}", headers=auth_headers).json()
+        assert bodies == ["4", "3", "2", "1", "0"]
+
+    def test_inbox_orders_by_activity(self, client, auth_headers, admin_headers):
+        """Test the conversation with the latest message comes first"""
+        first = client.post("/api/listings", json={"title": "Chair"}, headers=admin_headers).json()
+        second = client.post("/api/listings", json={"title": "Lamp"}, headers=admin_headers).json()
+        older = start(client, auth_headers, first)
+        newer = start(client, auth_headers, second)
+
+        page = client.get("/api/conversations?limit=1", headers=admin_headers).json()
+        assert [c["id"] for c in page["items"]] == [newer["id"]]
+
+        client.post(f"/api/conversations/{older['id']}/messages", json={"body": "bump"}, headers=auth_headers)
+        page = client.get("/api/conversations", headers=admin_headers).json()
+        assert [c["id"] for c in page["items"]] == [older["id"], newer["id"]]
+        assert page["next_before"] is None
+
+
+class TestUnreadCounters:
+    """Tests for unread counters and bulk mark-as-read"""
+
+    def test_counters_follow_messages(self, client, auth_headers, admin_headers, listing):
+        """Test recipients' counters go up and senders' don't"""
+        conversation = start(client, auth_headers, listing)
+        client.post(f"/api/conversations/{conversation['id']}/messages", json={"body": "?"}, headers=auth_headers)
+
+        unread = client.get("/api/conversations/unread", headers=admin_headers).json()
+        assert unread == {"unread": 2, "conversations": 1}
+        unread = client.get("/api/conversations/unread", headers=auth_headers).json()
+        assert unread == {"unread": 0, "conversations": 0}
+
+        client.post(f"/api/conversations/{conversation['id']}/messages", json={"body": "Yes"}, headers=admin_headers)
+        assert client.get("/api/conversations/unread", headers=auth_headers).json()["unread"] == 1
+
+    def test_unread_total_doesnt_scan_messages(self, client, auth_headers, admin_headers, listing, db_session):
+        """Test the unread count never reads the messages table"""
+        start(client, auth_headers, listing)
+        statements = []
+
+        def listener(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            client.get("/api/conversations/unread", headers=admin_headers)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+        assert not any("messages" in statement for statement in statements)
+
+    def test_bulk_mark_read(self, client, auth_headers, admin_headers):
+        """Test marking several conversations read in one request"""
+        ids = []
+        for title in ("Chair", "Lamp", "Desk"):
+            listing = client.post("/api/listings", json={"title": title}, headers=admin_headers).json()
+            ids.append(start(client, auth_headers, listing)["id"])
+
+        response = client.post("/api/conversations/read", json={"conversation_ids": ids[:2]}, headers=admin_headers)
+        assert response.json() == {"updated": 2}
+        unread = client.get("/api/conversations/unread", headers=admin_headers).json()
+        assert unread == {"unread": 1, "conversations": 1}
+
+        response = client.post("/api/conversations/read", json={}, headers=admin_headers)
+        assert response.json() == {"updated": 1}
+        assert client.get("/api/conversations/unread", headers=admin_headers).json()["unread"] == 0
+
+
+class TestConversationCleanup:
+    """Tests for removing conversations with deleted users"""
+
+    def test_user_deletion_removes_conversations(self, client, auth_headers, admin_headers, listing, test_user,
+                                                 db_session, session_factory):
+        """Test the users.delete job removes the user's conversations and messages"""
+        start(client, auth_headers, listing)
+        client.delete(f"/api/users/users/{test_user.id}", headers=admin_headers)
+        run_pending(session_factory)
+
+        assert client.get("/api/conversations", headers=admin_headers).json()["items"] == []
+        db_session.expire_all()
+        assert db_session.query(Message).count() == 0
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models.image import Image
+from app.models.user import User
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# users and images as created before the version, location, owner and hash columns
+OLD_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL, email VARCHAR NOT NULL, name VARCHAR, hashed_password VARCHAR NOT NULL,
+        phone VARCHAR, parish VARCHAR, admin BOOLEAN NOT NULL, PRIMARY KEY (id)
+    )""",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    """CREATE TABLE images (
+        id CHAR(32) NOT NULL, s3_key VARCHAR NOT NULL, url VARCHAR NOT NULL, product_id INTEGER,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE UNIQUE INDEX ix_images_s3_key ON images (s3_key)",
+    "INSERT INTO users (id, email, hashed_password, parish, admin) VALUES (1, 'old@example.com', 'x', 'St. Ann', 0)",
+    "INSERT INTO images (id, s3_key, url) VALUES ('0123456789abcdef0123456789abcdef', 'k.png', 'http://x/k.png')",
+]
+
+
+def upgrade(url: str) -> None:
+    config = Config(str(BACKEND / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND / "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+
+class TestMigrations:
+    """Test upgrading databases created by earlier versions"""
+
+    def test_upgrade_old_database(self, tmp_path):
+        """Test old tables gain the new columns and keep their rows"""
+        url = f"sqlite:///{tmp_path / 'old.db'}"
+        engine = create_engine(url)
+        with engine.begin() as connection:
+            for statement in OLD_SCHEMA:
+                connection.execute(text(statement))
+
+        upgrade(url)
+        upgrade(url)  # already applied: a no-op
+
+        indexes = {index["name"]: index for index in inspect(engine).get_indexes("images")}
+        assert not indexes["ix_images_s3_key"]["unique"]
+        with Session(engine) as db:
+            user = db.get(User, 1)
+            assert (user.version, user.auth_version) == (1, 1)
+            assert db.query(Image).one().created_at is not None
+        engine.dispose()
+
+    def test_upgrade_new_database(self, tmp_path):
+        """Test a database with no tables is created from the models"""
+        url = f"sqlite:///{tmp_path / 'new.db'}"
+        upgrade(url)
+
+        engine = create_engine(url)
+        tables = set(inspect(engine).get_table_names())
+        engine.dispose()
+        assert {"users", "images", "listings", "alembic_version"} <= tables
@@ -0,0 +1,199 @@
+from datetime import timedelta
+
+import pytest
+
+from app.core import notifications
+from app.core.smtp_sink import SMTPSink
+from app.jobs.queue import run_pending
+from app.models.job import Job
+from app.models.notification import Notification, NotificationStatus
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    """Route email through a local SMTP sink"""
+    with SMTPSink() as smtp_sink:
+        monkeypatch.setattr(notifications.settings, "NOTIFY_EMAIL_BACKEND", "smtp")
+        monkeypatch.setattr(notifications.settings, "SMTP_HOST", smtp_sink.host)
+        monkeypatch.setattr(notifications.settings, "SMTP_PORT", smtp_sink.port)
+        notifications._build_sender.cache_clear()
+        yield smtp_sink
+        notifications.get_sender(notifications.EMAIL).close()
+        notifications._build_sender.cache_clear()
+
+
+@pytest.fixture
+def deliver_now(db_session, session_factory):
+    """Make queued deliveries due and run them"""
+    def deliver():
+        db_session.query(Job).update({Job.run_at: Job.created_at})
+        db_session.query(Notification).update({Notification.next_attempt_at: Notification.created_at})
+        db_session.commit()
+        run_pending(session_factory)
+    return deliver
+
+
+class TestNotify:
+    """Tests for queueing notifications"""
+
+    def test_notify_queues_one_delivery_job(self, db_session):
+        """Test notifications are stored and share one pending delivery job"""
+        for i in range(3):
+            notifications.notify(db_session, "email", f"user{i}@example.com", "Hello", subject="Hi")
+        db_session.commit()
+
+        assert db_session.query(Notification).filter_by(status=NotificationStatus.QUEUED).count() == 3
+        assert db_session.query(Job).filter_by(name=notifications.DELIVER_TASK).count() == 1
+
+    def test_duplicates_are_dropped(self, db_session):
+        """Test the same message or dedupe key is only queued once"""
+        assert notifications.notify(db_session, "email", "a@example.com", "Hello") is not None
+        assert notifications.notify(db_session, "email", "a@example.com", "Hello") is None
+        assert notifications.notify(db_session, "email", "a@example.com", "Bye", dedupe_key="k") is not None
+        assert notifications.notify(db_session, "email", "a@example.com", "Hello again", dedupe_key="k") is None
+        db_session.commit()
+        assert db_session.query(Notification).count() == 2
+
+    def test_rate_limit_per_recipient(self, db_session, monkeypatch):
+        """Test a recipient over the limit gets no more messages in the window"""
+        monkeypatch.setattr(notifications.settings, "NOTIFY_RATE_LIMIT", 2)
+        for i in range(4):
+            notifications.notify(db_session, "sms", "555-0100", f"Code {i}")
+        notifications.notify(db_session, "sms", "555-0111", "Code")
+        db_session.commit()
+
+        statuses = [row.status for row in db_session.query(Notification).order_by(Notification.id)]
+        assert statuses == ["queued", "queued", "rate_limited", "rate_limited", "queued"]
+
+    def test_rate_limit_window(self, db_session, monkeypatch):
+        """Test older messages stop counting once the window passes"""
+        monkeypatch.setattr(notifications.settings, "NOTIFY_RATE_LIMIT", 1)
+        notifications.notify(db_session, "sms", "555-0100", "Code 1")
+        db_session.query(Notification).update(
+            {Notification.created_at: notifications.utcnow() - timedelta(hours=2)}
+        )
+        assert notifications.notify(db_session, "sms", "555-0100", "Code 2").status == NotificationStatus.QUEUED
+
+    def test_duplicates_dont_use_the_rate_limit(self, db_session, monkeypatch):
+        """Test a duplicate is dropped, not recorded as rate limited or counted"""
+        monkeypatch.setattr(notifications.settings, "NOTIFY_RATE_LIMIT", 1)
+        assert notifications.notify(db_session, "sms", "555-0100", "Code").status == NotificationStatus.QUEUED
+        assert notifications.notify(db_session, "sms", "555-0100", "Code") is None
+        assert notifications.notify(db_session, "sms", "555-0100", "Other").status == NotificationStatus.RATE_LIMITED
+        assert notifications.notify(db_session, "sms", "555-0100", "Other") is None
+        db_session.commit()
+        assert db_session.query(Notification).count() == 2
+
+
+class TestConsoleBackend:
+    """Tests for the console backend"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_senders(self):
+        notifications._build_sender.cache_clear()
+        yield
+        notifications._build_sender.cache_clear()
+
+    def test_not_sent_outside_development(self, db_session, deliver_now, caplog):
+        """Test console messages aren't marked sent and their content isn't logged"""
+        notifications.notify(db_session, "email", "a@example.com", "Secret code 1234")
+        db_session.commit()
+        deliver_now()
+
+        row = db_session.query(Notification).one()
+        db_session.refresh(row)
+        assert row.status == NotificationStatus.QUEUED
+        assert "console" in row.error
+        assert "Secret code 1234" not in caplog.text
+        assert "a@example.com" not in caplog.text
+
+    def test_delivers_in_development(self, db_session, deliver_now, caplog, monkeypatch):
+        """Test NOTIFY_CONSOLE_DELIVERS logs the message and marks it sent"""
+        monkeypatch.setattr(notifications.settings, "NOTIFY_CONSOLE_DELIVERS", True)
+        notifications.notify(db_session, "email", "a@example.com", "Secret code 1234")
+        db_session.commit()
+        with caplog.at_level("INFO", logger=notifications.__name__):
+            deliver_now()
+
+        row = db_session.query(Notification).one()
+        db_session.refresh(row)
+        assert row.status == NotificationStatus.SENT
+        assert "Secret code 1234" in caplog.text
+
+
+class TestDelivery:
+    """Tests for batched delivery through SMTP"""
+
+    def test_batch_reuses_one_connection(self, db_session, sink, deliver_now):
+        """Test a batch is sent over one pooled connection that later batches reuse"""
+        for i in range(5):
+            notifications.notify(db_session, "email", f"user{i}@example.com", f"Message {i}", subject="Hi")
+        db_session.commit()
+        deliver_now()
+
+        assert len(sink.messages) == 5
+        assert sink.connections == 1
+        assert sink.messages[0].message["Subject"] == "Hi"
+        assert sink.messages[0].message.get_content().strip() == "Message 0"
+
+        notifications.notify(db_session, "email", "later@example.com", "Later")
+        db_session.commit()
+        deliver_now()
+        assert len(sink.messages) == 6
+        assert sink.connections == 1
+
+        db_session.expire_all()
+        assert {row.status for row in db_session.query(Notification)} == {NotificationStatus.SENT}
+
+    def test_refused_recipient_is_retried_then_failed(self, db_session, sink, monkeypatch, deliver_now):
+        """Test one refused address doesn't stop the batch and gives up after max attempts"""
+        monkeypatch.setattr(notifications.settings, "NOTIFY_MAX_ATTEMPTS", 2)
+        sink.reject.add("bad@example.com")
+        notifications.notify(db_session, "email", "bad@example.com", "Hello")
+        notifications.notify(db_session, "email", "good@example.com", "Hello")
+        db_session.commit()
+
+        deliver_now()
+        db_session.expire_all()
+        bad = db_session.query(Notification).filter_by(recipient="bad@example.com").one()
+        assert bad.status == NotificationStatus.QUEUED
+        assert "SMTPRecipientsRefused" in bad.error
+        assert [m.recipients for m in sink.messages] == [["good@example.com"]]
+
+        deliver_now()
+        db_session.expire_all()
+        assert db_session.query(Notification).filter_by(recipient="bad@example.com").one().status == "failed"
+
+    def test_reconnects_after_server_restart(self, db_session, sink, deliver_now):
+        """Test a pooled connection the server dropped is replaced transparently"""
+        notifications.notify(db_session, "email", "one@example.com", "1")
+        db_session.commit()
+        deliver_now()
+
+        smtp, _ = notifications.get_sender("email").pool._idle.queue[0]
+        smtp.close()  # as if the server had timed it out
+        notifications.notify(db_session, "email", "two@example.com", "2")
+        db_session.commit()
+        deliver_now()
+
+        assert [m.recipients for m in sink.messages] == [["one@example.com"], ["two@example.com"]]
+        assert sink.connections == 2
+
+
+class TestListingInterest:
+    """Tests for the listing-interest email"""
+
+    def test_seller_emailed_once_per_conversation(self, client, auth_headers, admin_headers, test_admin,
+                                                  db_session, sink, deliver_now):
+        """Test starting a conversation emails the seller, and follow-ups don't"""
+        listing = client.post("/api/listings", json={"title": "Bicycle"}, headers=admin_headers).json()
+        for body in ("Is this available?", "Hello?"):
+            client.post("/api/conversations", json={"listing_id": listing["id"], "body": body}, headers=auth_headers)
+        assert sink.messages == []  # nothing is sent on the request path
+
+        deliver_now()
+        assert len(sink.messages) == 1
+        message = sink.messages[0].message
+        assert message["To"] == test_admin.email
+        assert "Bicycle" in message["Subject"]
+        assert "Is this available?" in message.get_content()
@@ -0,0 +1,141 @@
+import time
+import pytest
+from fastapi import status
+
+from app.core import profiling
+from app.core.config import settings
+
+PROFILES_URL = f"{settings.API_V1_STR}/profiles"
+TARGET_URL = f"{settings.API_V1_STR}/metrics"
+
+
+@pytest.fixture(autouse=True)
+def profile_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_STORE_PATH", str(tmp_path / "profiles"))
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_INTERVAL_SECONDS", 0.001)
+    return tmp_path / "profiles"
+
+
+class TestSampler:
+    """Test the stack sampler"""
+
+    def test_samples_busy_code(self):
+        """Test a function running on another thread shows up in the samples"""
+        import threading
+
+        def spin_for_profiler():
+            deadline = time.monotonic() + 0.2
+            while time.monotonic() < deadline:
+                pass
+
+        sampler = profiling.Sampler(0.001).start()
+        worker = threading.Thread(target=spin_for_profiler, name="spinner")
+        worker.start()
+        worker.join()
+        samples = sampler.stop()
+
+        stacks = [stack for stack in samples if "spin_for_profiler" in stack]
+        assert stacks
+        assert all(stack.startswith("spinner;") for stack in stacks)
+
+    def test_request_threads_only(self):
+        """Test background threads and idle pool threads are left out of a request profile"""
+        import queue
+        import threading
+
+        def spin_for_profiler():
+            deadline = time.monotonic() + 0.2
+            while time.monotonic() < deadline:
+                pass
+
+        work = queue.Queue()
+        idle = threading.Thread(target=work.get, name=f"{profiling.WORKER_THREAD_NAME} idle", daemon=True)
+        idle.start()
+        busy = threading.Thread(target=spin_for_profiler, name=f"{profiling.WORKER_THREAD_NAME} busy")
+        background = threading.Thread(target=spin_for_profiler, name="job-worker-0")
+
+        sampler = profiling.Sampler(0.001, profiling.request_threads(threading.get_ident())).start()
+        busy.start()
+        background.start()
+        busy.join()
+        background.join()
+        samples = sampler.stop()
+        work.put(None)
+
+        names = {stack.split(";")[0] for stack in samples}
+        assert f"{profiling.WORKER_THREAD_NAME} busy" in names
+        assert "job-worker-0" not in names
+        assert f"{profiling.WORKER_THREAD_NAME} idle" not in names
+
+    def test_folded_format(self):
+        """Test folded output has one 'stack count' line per stack"""
+        from collections import Counter
+
+        assert profiling.folded(Counter({"a;b": 3, "a": 1})) == "a;b 3\na 1\n"
+
+
+class TestOnDemandProfiling:
+    """Test admins can profile a single request"""
+
+    def test_store_mode(self, client, admin_headers):
+        """Test a stored profile can be fetched by the returned id"""
+        response = client.get(TARGET_URL, headers={**admin_headers, "X-Profile": "store"})
+        assert response.status_code == status.HTTP_200_OK
+        assert "counters" in response.json()
+        profile_id = response.headers["X-Profile-Id"]
+
+        listing = client.get(PROFILES_URL, headers=admin_headers).json()
+        assert listing[0]["id"] == profile_id
+        assert listing[0]["path"] == TARGET_URL
+        assert listing[0]["status"] == 200
+
+        profile = client.get(f"{PROFILES_URL}/{profile_id}", headers=admin_headers)
+        assert profile.status_code == status.HTTP_200_OK
+        assert profile.headers["content-type"].startswith("text/plain")
+
+    def test_return_mode(self, client, admin_headers):
+        """Test the profile can replace the response body"""
+        response = client.get(f"{TARGET_URL}?profile=return", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["X-Profile-Status"] == "200"
+        assert response.headers["content-type"].startswith("text/plain")
+
+    def test_non_admin_not_profiled(self, client, auth_headers, profile_store):
+        """Test the profile flag is ignored for regular users"""
+        response = client.get(TARGET_URL, headers={**auth_headers, "X-Profile": "store"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert "X-Profile-Id" not in response.headers
+        assert not profile_store.exists()
+
+    def test_unknown_profile(self, client, admin_headers):
+        """Test fetching a missing profile returns 404"""
+        response = client.get(f"{PROFILES_URL}/not-a-profile", headers=admin_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_profiles_require_admin(self, client, auth_headers):
+        """Test regular users can't list profiles"""
+        assert client.get(PROFILES_URL, headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestSampledProfiling:
+    """Test the 1-in-N sampled mode"""
+
+    def test_one_in_n(self, client, monkeypatch, profile_store):
+        """Test only every Nth request is profiled"""
+        monkeypatch.setattr(settings, "PROFILE_SAMPLE_EVERY", 3)
+        responses = [client.get("/health") for _ in range(6)]
+        profiled = [r for r in responses if "X-Profile-Id" in r.headers]
+        assert len(profiled) == 2
+        assert len(profiling.get_profile_store().list()) == 2
+
+    def test_store_keeps_newest(self, profile_store):
+        """Test old profiles are removed past the limit"""
+        from collections import Counter
+        import uuid
+
+        store = profiling.ProfileStore(str(profile_store), max_profiles=2)
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        for i, profile_id in enumerate(ids):
+            store.save(profile_id, Counter({"a": 1}), {"started_at": i})
+        assert [meta["id"] for meta in store.list()] == ids[:0:-1]
+        assert store.get(ids[0]) is None
@@ -1,6 +1,8 @@
 import pytest
 from fastapi import status
 
+from app.core.config import settings
+
 
 class TestAuthRegisterEndpoint:
     """Test auth registration endpoint"""
@@ -136,3 +138,56 @@ class TestAuthRefreshEndpoint:
         """Test refresh with PATCH method fails"""
         response = client.patch("/api/v1/auth/refresh")
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+class TestAuthRegisterInsert:
+    """Test registration creates users in one statement"""
+
+    REGISTER_URL = f"{settings.API_V1_STR}/auth/auth/register"
+
+    def payload(self, **overrides):
+        return {
+            "email": "new@example.com",
+            "username": "newbie",
+            "password": "Secret123!",
+            "phone": "555-0142",
+            "parish": "St. Andrew",
+            "admin": False,
+            **overrides,
+        }
+
+    def test_register_creates_user(self, client):
+        """Test a new user is created and returned"""
+        response = client.post(self.REGISTER_URL, json=self.payload())
+        assert response.status_code == status.HTTP_201_CREATED
+        body = response.json()
+        assert body["email"] == "new@example.com"
+        assert body["name"] == "newbie"
+        assert "password" not in body
+
+    def test_register_hashes_password(self, client, db_session):
+        """Test the stored password is a verifiable hash"""
+        from app.auth.security import verify_password
+        from app.models.user import User
+
+        user_id = client.post(self.REGISTER_URL, json=self.payload()).json()["id"]
+        user = db_session.get(User, user_id)
+        assert user.hashed_password != "Secret123!"
+        assert verify_password("Secret123!", user.hashed_password)
+
+    def test_register_duplicate_email(self, client):
+        """Test registering an existing email fails"""
+        client.post(self.REGISTER_URL, json=self.payload())
+        response = client.post(self.REGISTER_URL, json=self.payload(phone="555-0999"))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_register_duplicate_phone(self, client):
+        """Test registering an existing phone number fails"""
+        client.post(self.REGISTER_URL, json=self.payload())
+        response = client.post(self.REGISTER_URL, json=self.payload(email="other@example.com"))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_register_cannot_create_admin(self, client):
+        """Test self-registration never grants admin"""
+        response = client.post(self.REGISTER_URL, json=self.payload(admin=True))
+        assert response.json()["admin"] is False
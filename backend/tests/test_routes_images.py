@@ -0,0 +1,258 @@
+import pytest
+import httpx
+from fastapi import status
+
+from app.core.config import settings
+from app.core.s3 import generate_s3_key
+from app.auth.security import create_access_token
+
+pytest.importorskip("moto.server")
+
+UPLOADS_URL = f"{settings.API_V1_STR}/images/uploads"
+COMPLETE_URL = f"{settings.API_V1_STR}/images/uploads/complete"
+
+
+def start_upload(client, headers, content_type="image/png"):
+    response = client.post(
+        UPLOADS_URL,
+        json={"filename": "photo.png", "content_type": content_type},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+def post_to_s3(presigned, body, content_type="image/png"):
+    return httpx.post(
+        presigned["url"],
+        data=presigned["fields"],
+        files={"file": ("photo.png", body, content_type)},
+    )
+
+
+class TestCreateUpload:
+    """Test issuing presigned POST policies"""
+
+    def test_create_upload_unauthorized(self, client):
+        """Test starting an upload requires authentication"""
+        response = client.post(UPLOADS_URL, json={"filename": "a.png", "content_type": "image/png"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_create_upload_rejects_content_type(self, client, auth_headers, s3_settings):
+        """Test non-image content types are rejected"""
+        response = client.post(
+            UPLOADS_URL,
+            json={"filename": "a.exe", "content_type": "application/x-msdownload"},
+            headers=auth_headers,
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_create_upload_returns_policy(self, client, auth_headers, s3_settings):
+        """Test the policy pins key and content type"""
+        presigned = start_upload(client, auth_headers)
+
+        assert presigned["s3_key"].startswith("uploads/")
+        assert presigned["s3_key"].endswith("/photo.png")
+        assert presigned["fields"]["key"] == presigned["s3_key"]
+        assert presigned["fields"]["Content-Type"] == "image/png"
+        assert presigned["upload_token"]
+
+    def test_create_upload_strips_path(self, client, auth_headers, s3_settings):
+        """Test directory components in the filename are dropped"""
+        response = client.post(
+            UPLOADS_URL,
+            json={"filename": "../../etc/passwd.png", "content_type": "image/png"},
+            headers=auth_headers,
+        )
+        assert response.json()["s3_key"].endswith("/passwd.png")
+        assert ".." not in response.json()["s3_key"]
+
+
+class TestCompleteUpload:
+    """Test completing a direct upload"""
+
+    def test_complete_upload_creates_image(self, client, auth_headers, test_user, s3_settings):
+        """Test a finished upload is recorded as an Image"""
+        presigned = start_upload(client, auth_headers)
+        assert post_to_s3(presigned, b"\x89PNG fake").status_code in (200, 204)
+
+        response = client.post(
+            COMPLETE_URL,
+            json={"upload_token": presigned["upload_token"], "product_id": 7},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        body = response.json()
+        assert body["s3_key"] == presigned["s3_key"]
+        assert body["owner_id"] == test_user.id
+        assert body["product_id"] == 7
+        assert body["content_type"] == "image/png"
+        assert body["size"] == len(b"\x89PNG fake")
+
+    def test_complete_upload_is_idempotent(self, client, auth_headers, s3_settings):
+        """Test completing twice returns the same image"""
+        presigned = start_upload(client, auth_headers)
+        post_to_s3(presigned, b"data")
+        payload = {"upload_token": presigned["upload_token"]}
+
+        first = client.post(COMPLETE_URL, json=payload, headers=auth_headers).json()
+        second = client.post(COMPLETE_URL, json=payload, headers=auth_headers).json()
+        assert first["id"] == second["id"]
+
+    def test_complete_upload_missing_object(self, client, auth_headers, s3_settings):
+        """Test completing before uploading fails"""
+        presigned = start_upload(client, auth_headers)
+        response = client.post(
+            COMPLETE_URL, json={"upload_token": presigned["upload_token"]}, headers=auth_headers
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_complete_upload_invalid_token(self, client, auth_headers, s3_settings):
+        """Test a garbage token is rejected"""
+        response = client.post(COMPLETE_URL, json={"upload_token": "nope"}, headers=auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_complete_upload_access_token_rejected(self, client, auth_headers, test_user, s3_settings):
+        """Test a normal access token can't be used as an upload token"""
+        token = create_access_token(data={"sub": str(test_user.id), "key": generate_s3_key("x.png")})
+        response = client.post(COMPLETE_URL, json={"upload_token": token}, headers=auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_upload_token_is_not_a_bearer_token(self, client, auth_headers, s3_settings):
+        """Test an upload token can't authenticate other requests"""
+        presigned = start_upload(client, auth_headers)
+        headers = {"Authorization": f"Bearer {presigned['upload_token']}"}
+        response = client.get("/api/users/users/me", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_complete_upload_other_user(self, client, auth_headers, admin_headers, s3_settings):
+        """Test another user can't claim the upload"""
+        presigned = start_upload(client, auth_headers)
+        post_to_s3(presigned, b"data")
+        response = client.post(
+            COMPLETE_URL, json={"upload_token": presigned["upload_token"]}, headers=admin_headers
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestUploadImage:
+    """Test uploading images through the API"""
+
+    def upload(self, client, headers, data, content_type="image/png"):
+        return client.post(
+            f"{settings.API_V1_STR}/images",
+            files={"file": ("photo.png", data, content_type)},
+            headers=headers,
+        )
+
+    def test_upload_image_unauthorized(self, client):
+        """Test uploading requires authentication"""
+        response = client.post(f"{settings.API_V1_STR}/images", files={"file": ("a.png", b"x", "image/png")})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_upload_image_rejects_content_type(self, client, auth_headers, s3_settings):
+        """Test non-image uploads are rejected"""
+        response = self.upload(client, auth_headers, b"x", content_type="text/plain")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_upload_image_too_large(self, client, auth_headers, s3_settings, monkeypatch):
+        """Test uploads over the size limit are rejected"""
+        monkeypatch.setattr(settings, "IMAGE_MAX_UPLOAD_BYTES", 4)
+        response = self.upload(client, auth_headers, b"too large")
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+    def test_upload_image_deduplicates(self, client, auth_headers, s3_settings):
+        """Test uploading the same photo twice reuses the stored object"""
+        first = self.upload(client, auth_headers, b"photo-bytes")
+        second = self.upload(client, auth_headers, b"photo-bytes")
+
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.status_code == status.HTTP_201_CREATED
+        assert first.json()["id"] != second.json()["id"]
+        assert first.json()["s3_key"] == second.json()["s3_key"]
+        assert first.json()["content_hash"] == second.json()["content_hash"]
+
+
+class TestImageContent:
+    """Test streaming images through the API"""
+
+    @pytest.fixture
+    def image_cache(self, tmp_path, monkeypatch):
+        from app.core import metrics
+        metrics.reset()
+        monkeypatch.setattr(settings, "IMAGE_CACHE_PATH", str(tmp_path / "cache"))
+        yield
+        metrics.reset()
+
+    def upload(self, client, headers, data):
+        response = client.post(
+            f"{settings.API_V1_STR}/images",
+            files={"file": ("photo.png", data, "image/png")},
+            headers=headers,
+        )
+        return response.json()
+
+    def test_missing_image(self, client):
+        """Test unknown images return 404"""
+        response = client.get(f"{settings.API_V1_STR}/images/00000000-0000-0000-0000-000000000000/content")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_served_through_cache(self, client, auth_headers, admin_headers, s3_settings, image_cache):
+        """Test the first request misses, the second hits the cache"""
+        image = self.upload(client, auth_headers, b"0123456789")
+        url = f"{settings.API_V1_STR}/images/{image['id']}/content"
+
+        first = client.get(url)
+        second = client.get(url)
+
+        assert first.status_code == status.HTTP_200_OK
+        assert first.content == b"0123456789"
+        assert second.content == b"0123456789"
+        assert "immutable" in first.headers["cache-control"]
+        assert first.headers["etag"] == f'"{image["content_hash"]}"'
+
+        stats = client.get(f"{settings.API_V1_STR}/images/cache/stats", headers=admin_headers).json()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["bytes_saved"] == 10
+        from app.core.image_cache import get_image_cache
+        assert get_image_cache()._pins == {}  # released once each response was sent
+
+    def test_range_request(self, client, auth_headers, s3_settings, image_cache):
+        """Test Range requests return partial content"""
+        image = self.upload(client, auth_headers, b"0123456789")
+        response = client.get(
+            f"{settings.API_V1_STR}/images/{image['id']}/content", headers={"Range": "bytes=3-6"}
+        )
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response.content == b"3456"
+
+    def test_if_none_match(self, client, auth_headers, s3_settings, image_cache):
+        """Test a matching ETag returns 304"""
+        image = self.upload(client, auth_headers, b"etag-bytes")
+        response = client.get(
+            f"{settings.API_V1_STR}/images/{image['id']}/content",
+            headers={"If-None-Match": f'"{image["content_hash"]}"'},
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_large_objects_stream_from_s3(self, client, auth_headers, s3_settings, image_cache, monkeypatch):
+        """Test objects above the cache limit bypass the cache, with Range passthrough"""
+        monkeypatch.setattr(settings, "IMAGE_CACHE_MAX_OBJECT_BYTES", 4)
+        image = self.upload(client, auth_headers, b"0123456789")
+        url = f"{settings.API_V1_STR}/images/{image['id']}/content"
+
+        full = client.get(url)
+        partial = client.get(url, headers={"Range": "bytes=0-1"})
+
+        assert full.content == b"0123456789"
+        assert partial.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert partial.content == b"01"
+        assert partial.headers["content-range"] == "bytes 0-1/10"
+
+    def test_local_backend(self, client, auth_headers, local_storage):
+        """Test the local backend serves straight from disk"""
+        image = self.upload(client, auth_headers, b"local")
+        response = client.get(f"{settings.API_V1_STR}/images/{image['id']}/content")
+        assert response.content == b"local"
@@ -0,0 +1,49 @@
+import pytest
+from fastapi import status
+
+from app.core import metrics
+from app.core.config import settings
+
+METRICS_URL = f"{settings.API_V1_STR}/metrics"
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestMetricsRegistry:
+    """Test the in-process counter registry"""
+
+    def test_counters_and_gauges(self):
+        """Test counters accumulate and gauges overwrite"""
+        metrics.inc("a")
+        metrics.inc("a", 2)
+        metrics.set_gauge("g", 5)
+        metrics.set_gauge("g", 3)
+
+        assert metrics.get("a") == 3
+        assert metrics.get("g") == 3
+        assert metrics.get("unknown") == 0
+        assert metrics.snapshot() == {"counters": {"a": 3}, "gauges": {"g": 3}}
+
+
+class TestMetricsEndpoint:
+    """Test the admin metrics endpoint"""
+
+    def test_metrics_unauthorized(self, client):
+        """Test metrics require authentication"""
+        assert client.get(METRICS_URL).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_metrics_requires_admin(self, client, auth_headers):
+        """Test regular users are refused"""
+        assert client.get(METRICS_URL, headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_metrics_snapshot(self, client, admin_headers):
+        """Test admins get the current counters"""
+        metrics.inc("requests")
+        response = client.get(METRICS_URL, headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["counters"]["requests"] == 1
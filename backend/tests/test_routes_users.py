@@ -1,6 +1,12 @@
 import pytest
 from fastapi import status
 
+from app.core.config import settings
+from app.jobs import enqueue, run_pending
+from app.models.image import Image, StoredObject
+from app.models.job import Job
+from app.models.user import User
+
 
 class TestGetUsersEndpoint:
     """Test get all users endpoint"""
@@ -187,3 +193,141 @@ class TestDeleteUserEndpoint:
         """Test delete user with PUT method fails"""
         response = client.put("/api/v1/users/1")
         assert response.status_code in [status.HTTP_401_UNAUTHORIZED, status.HTTP_405_METHOD_NOT_ALLOWED]
+
+
+class TestDeleteUserCascade:
+    """Test background deletion of a user and what they own"""
+
+    USERS_URL = f"{settings.API_V1_STR}/users/users"
+
+    def upload(self, client, headers, data):
+        return client.post(
+            f"{settings.API_V1_STR}/images",
+            files={"file": ("p.png", data, "image/png")},
+            headers=headers,
+        ).json()
+
+    def test_delete_user_returns_job(self, client, admin_headers, test_user):
+        """Test deletion is accepted and queued"""
+        response = client.delete(f"{self.USERS_URL}/{test_user.id}", headers=admin_headers)
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["name"] == "users.delete"
+        assert response.json()["status"] == "queued"
+
+    def test_repeated_delete_queues_one_job(self, client, admin_headers, test_user):
+        """Test deleting the same user twice returns the job already queued"""
+        first = client.delete(f"{self.USERS_URL}/{test_user.id}", headers=admin_headers).json()
+        second = client.delete(f"{self.USERS_URL}/{test_user.id}", headers=admin_headers).json()
+        assert first["id"] == second["id"]
+
+    def test_delete_missing_user(self, client, admin_headers):
+        """Test deleting an unknown user returns 404"""
+        response = client.delete(f"{self.USERS_URL}/9999", headers=admin_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_delete_user_cleans_up(self, client, admin_headers, auth_headers, test_user, db_session, local_storage,
+                                   session_factory):
+        """Test the job removes the user, their images and unshared objects"""
+        user_id = test_user.id
+        own = self.upload(client, auth_headers, b"only-mine")
+        shared = self.upload(client, auth_headers, b"shared")
+        admins_copy = self.upload(client, admin_headers, b"shared")
+
+        job = client.delete(f"{self.USERS_URL}/{user_id}", headers=admin_headers).json()
+        run_pending(session_factory)
+
+        db_session.expire_all()
+        assert db_session.get(User, user_id) is None
+        assert db_session.query(Image).filter(Image.owner_id == user_id).count() == 0
+        assert local_storage._head_sync(own["s3_key"]) is None
+        assert local_storage._head_sync(shared["s3_key"]) is not None
+        assert db_session.get(StoredObject, admins_copy["content_hash"]).ref_count == 1
+
+        progress = client.get(f"{settings.API_V1_STR}/jobs/{job['id']}", headers=admin_headers).json()
+        assert progress["status"] == "succeeded"
+        assert progress["progress"]["images_deleted"] == 2
+        assert progress["progress"]["objects_queued"] == 1
+
+    def test_delete_user_job_rerunnable(self, db_session, test_user, session_factory):
+        """Test running the cleanup for an already deleted user is harmless"""
+        enqueue(db_session, "users.delete", {"user_id": test_user.id})
+        enqueue(db_session, "users.delete", {"user_id": test_user.id})
+        run_pending(session_factory)
+
+        statuses = [job.status for job in db_session.query(Job).all()]
+        assert statuses == ["succeeded", "succeeded"]
+
+
+class TestUpdateCurrentUserWrite:
+    """Test PUT /me persists changes with version checks"""
+
+    ME_URL = f"{settings.API_V1_STR}/users/users/me"
+
+    def test_update_persists(self, client, auth_headers, test_user, db_session):
+        """Test changes are committed and the version is bumped"""
+        user_id = test_user.id
+        response = client.put(self.ME_URL, json={"username": "New Name", "parish": "St. Mary"}, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["name"] == "New Name"
+        assert response.headers["ETag"] == f'"{user_id}-2"'
+
+        db_session.expire_all()
+        user = db_session.get(User, user_id)
+        assert user.name == "New Name"
+        assert user.parish == "St. Mary"
+        assert user.version == 2
+
+    def test_get_me_etag(self, client, auth_headers, test_user):
+        """Test GET /me returns an ETag and honours If-None-Match"""
+        response = client.get(self.ME_URL, headers=auth_headers)
+        etag = response.headers["ETag"]
+        response = client.get(self.ME_URL, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        client.put(self.ME_URL, json={"phone": "555-0111"}, headers=auth_headers)
+        response = client.get(self.ME_URL, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+
+    def test_if_match_stale_version(self, client, auth_headers, test_user):
+        """Test an update based on an old version is rejected"""
+        etag = client.get(self.ME_URL, headers=auth_headers).headers["ETag"]
+        first = client.put(self.ME_URL, json={"username": "A"}, headers={**auth_headers, "If-Match": etag})
+        assert first.status_code == status.HTTP_200_OK
+
+        second = client.put(self.ME_URL, json={"username": "B"}, headers={**auth_headers, "If-Match": etag})
+        assert second.status_code == status.HTTP_412_PRECONDITION_FAILED
+        assert client.get(self.ME_URL, headers=auth_headers).json()["name"] == "A"
+
+    def test_duplicate_email_conflict(self, client, auth_headers, test_user, test_admin):
+        """Test taking another user's email returns 409"""
+        response = client.put(self.ME_URL, json={"email": test_admin.email}, headers=auth_headers)
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    def test_duplicate_phone_conflict(self, client, auth_headers, test_user, test_admin):
+        """Test taking another user's phone returns 409"""
+        response = client.put(self.ME_URL, json={"phone": test_admin.phone}, headers=auth_headers)
+        assert response.status_code == status.HTTP_409_CONFLICT
+        # The session is usable again after the conflict
+        assert client.get(self.ME_URL, headers=auth_headers).status_code == status.HTTP_200_OK
+
+    def test_cannot_grant_self_admin(self, client, auth_headers, test_user):
+        """Test a regular user can't make themselves an admin"""
+        response = client.put(self.ME_URL, json={"admin": True}, headers=auth_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_update_emits_hook(self, client, auth_headers, test_user):
+        """Test invalidation hooks see the committed change"""
+        from app.core import hooks
+
+        seen = []
+
+        def record(user_id, version, changes):
+            seen.append((user_id, version, changes))
+
+        hooks.on("user.updated")(record)
+        try:
+            client.put(self.ME_URL, json={"username": "Hooked"}, headers=auth_headers)
+        finally:
+            hooks.remove("user.updated", record)
+        assert seen == [(test_user.id, 2, {"name": "Hooked"})]
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import pytest
+
+from app.core.config import settings
+from app.models.image import Image
+
+pytest.importorskip("moto.server")
+s3_async = pytest.importorskip("app.core.s3_async", reason="aioboto3 is not installed")
+
+
+def run(coro_fn):
+    """Run a coroutine function on a fresh loop, closing the client afterwards"""
+    async def wrapper():
+        try:
+            return await coro_fn()
+        finally:
+            await s3_async.close_s3_client()
+    return asyncio.run(wrapper())
+
+
+class TestAsyncS3Client:
+    """Test the shared async client"""
+
+    def test_client_is_shared_within_loop(self, s3_settings):
+        """Test repeated calls on one loop return the same client"""
+        async def scenario():
+            first = await s3_async.get_s3_client()
+            second = await s3_async.get_s3_client()
+            return first is second
+
+        assert run(scenario) is True
+
+    def test_close_resets_client(self, s3_settings):
+        """Test closing the client allows a new one to be created"""
+        async def scenario():
+            first = await s3_async.get_s3_client()
+            await s3_async.close_s3_client()
+            second = await s3_async.get_s3_client()
+            return first is not second
+
+        assert run(scenario) is True
+
+
+class TestAsyncUpload:
+    """Test async upload and presign"""
+
+    def test_upload_file_round_trip(self, s3_settings, s3_bucket):
+        """Test uploaded bytes can be read back"""
+        async def scenario():
+            key = await s3_async.upload_file(io.BytesIO(b"hello"), "a.txt", "text/plain")
+            client = await s3_async.get_s3_client()
+            obj = await client.get_object(Bucket=s3_bucket, Key=key)
+            body = await obj["Body"].read()
+            return key, body, obj["ContentType"]
+
+        key, body, content_type = run(scenario)
+        assert key.startswith("uploads/") and key.endswith("/a.txt")
+        assert body == b"hello"
+        assert content_type == "text/plain"
+
+    def test_upload_file_explicit_key(self, s3_settings):
+        """Test an explicit key is used as-is"""
+        async def scenario():
+            return await s3_async.upload_file(io.BytesIO(b"x"), "a.txt", "text/plain", s3_key="fixed/key")
+
+        assert run(scenario) == "fixed/key"
+
+    def test_concurrent_uploads(self, s3_settings, monkeypatch):
+        """Test many uploads complete without exceeding the concurrency bound"""
+        monkeypatch.setattr(settings, "S3_MAX_CONCURRENT_TRANSFERS", 2)
+        in_flight = peak = 0
+
+        async def scenario():
+            client = await s3_async.get_s3_client()
+            upload_fileobj = client.upload_fileobj
+
+            async def counting_upload(*args, **kwargs):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                try:
+                    await asyncio.sleep(0.01)
+                    return await upload_fileobj(*args, **kwargs)
+                finally:
+                    in_flight -= 1
+
+            client.upload_fileobj = counting_upload
+            return await asyncio.gather(*[
+                s3_async.upload_file(io.BytesIO(b"data"), f"{i}.bin", "application/octet-stream")
+                for i in range(8)
+            ])
+
+        keys = run(scenario)
+        assert len(set(keys)) == 8
+        assert peak == 2
+
+    def test_presigned_url(self, s3_settings, s3_bucket):
+        """Test presigned URL references the bucket and key"""
+        async def scenario():
+            return await s3_async.create_presigned_download_url("some/key.png", expires_in=60)
+
+        url = run(scenario)
+        assert s3_bucket in url
+        assert "some/key.png" in url
+
+
+class TestAsyncDeleteImage:
+    """Test async image deletion"""
+
+    def test_delete_missing_image(self, s3_settings, db_session):
+        """Test deleting an unknown image returns False"""
+        import uuid
+
+        async def scenario():
+            return await s3_async.delete_image(db_session, uuid.uuid4())
+
+        assert run(scenario) is False
+
+    def test_delete_existing_image(self, s3_settings, db_session, s3_bucket):
+        """Test deleting an image removes its S3 object"""
+        async def upload():
+            return await s3_async.upload_file(io.BytesIO(b"img"), "i.png", "image/png")
+
+        key = run(upload)
+        image = Image(s3_key=key, url=key)
+        db_session.add(image)
+        db_session.commit()
+
+        async def scenario():
+            deleted = await s3_async.delete_image(db_session, image.id)
+            client = await s3_async.get_s3_client()
+            listing = await client.list_objects_v2(Bucket=s3_bucket, Prefix=key)
+            return deleted, listing.get("KeyCount", 0)
+
+        deleted, remaining = run(scenario)
+        assert deleted is True
+        assert remaining == 0
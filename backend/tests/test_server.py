@@ -0,0 +1,119 @@
+import argparse
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from app import server
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                return response.status
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(url)
+
+
+class TestServerConfig:
+    """Test production server defaults"""
+
+    def test_default_workers(self):
+        """Test one worker per available core"""
+        assert server.default_workers() >= 1
+
+    def test_build_config(self):
+        """Test tuned options reach uvicorn"""
+        args = argparse.Namespace(
+            host="127.0.0.1", port=8000, backlog=4096, keep_alive=75,
+            graceful_timeout=10, forwarded_allow_ips="10.0.0.1",
+        )
+        config = server.build_config(args)
+        assert config.backlog == 4096
+        assert config.timeout_keep_alive == 75
+        assert config.timeout_graceful_shutdown == 10
+        assert config.server_header is False
+
+    def test_fast_implementations_preferred(self):
+        """Test uvloop and httptools are used when installed"""
+        pytest.importorskip("uvloop")
+        pytest.importorskip("httptools")
+        assert server.event_loop() == "uvloop"
+        assert server.http_protocol() == "httptools"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="prefork mode needs fork()")
+class TestServerProcess:
+    """Test the supervisor against real worker processes"""
+
+    @pytest.fixture
+    def running(self, tmp_path):
+        port = free_port()
+        env = {
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR,
+            "USE_SQLITE": "true",
+            "SECRET_KEY": os.environ.get("SECRET_KEY", "test-secret"),
+        }
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", "2", "--graceful-timeout", "5"],
+            cwd=tmp_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        url = f"http://127.0.0.1:{port}/api/openapi.json"
+        try:
+            wait_for(url)
+            yield process, url
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def worker_pids(self, process):
+        children = subprocess.run(
+            ["pgrep", "-P", str(process.pid)], capture_output=True, text=True
+        ).stdout.split()
+        return [int(pid) for pid in children]
+
+    def test_serves_and_drains(self, running):
+        """Test requests are served and SIGTERM shuts everything down cleanly"""
+        process, url = running
+        assert wait_for(url) == 200
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=15) == 0
+        assert "Application shutdown complete" in process.stdout.read()
+
+    @pytest.mark.skipif(shutil.which("pgrep") is None, reason="needs pgrep to find workers")
+    def test_dead_worker_replaced(self, running):
+        """Test the supervisor restarts a worker that dies"""
+        process, url = running
+        pids = self.worker_pids(process)
+        assert len(pids) == 2
+
+        os.kill(pids[0], signal.SIGKILL)
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            current = self.worker_pids(process)
+            if len(current) == 2 and pids[0] not in current:
+                break
+            time.sleep(0.2)
+        assert len(current) == 2 and pids[0] not in current
+        assert wait_for(url) == 200
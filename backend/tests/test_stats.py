@@ -0,0 +1,164 @@
+from datetime import datetime, UTC
+from fastapi import status
+from sqlalchemy import update
+
+from app.core import stats
+from app.core.config import settings
+from app.jobs import enqueue, run_pending
+from app.models.stats import StatCounter
+from app.models.user import User
+
+STATS_URL = f"{settings.API_V1_STR}/stats"
+
+
+def counters(db):
+    db.expire_all()
+    return {(c.metric, c.key): c.value for c in db.query(StatCounter).all() if c.value}
+
+
+class TestIncrementalCounters:
+    """Test counters follow user changes without rescans"""
+
+    def test_orm_insert_counted(self, db_session, test_user, test_admin):
+        """Test users added through the ORM are counted"""
+        summary = stats.get_summary(db_session, days=1)
+        assert summary["users_total"] == 2
+        assert summary["admins"] == 1
+        assert summary["users_by_parish"] == {"St. Andrew": 1, "St. James": 1}
+        assert summary["signups_per_day"][-1]["count"] == 2
+
+    def test_orm_update_and_delete(self, db_session, test_user):
+        """Test ORM updates move counts and deletes remove them"""
+        test_user.parish = "St. Mary"
+        test_user.admin = True
+        db_session.commit()
+        summary = stats.get_summary(db_session)
+        assert summary["users_by_parish"] == {"St. Mary": 1}
+        assert summary["admins"] == 1
+
+        db_session.delete(test_user)
+        db_session.commit()
+        assert stats.get_summary(db_session)["users_total"] == 0
+
+    def test_register_counted(self, client, db_session):
+        """Test registration updates counters in the same transaction"""
+        client.post(f"{settings.API_V1_STR}/auth/auth/register", json={
+            "email": "new@example.com",
+            "username": "new",
+            "password": "Secret123!",
+            "phone": "555-0142",
+            "parish": "St. Ann",
+            "admin": False,
+        })
+        summary = stats.get_summary(db_session)
+        assert summary["users_total"] == 1
+        assert summary["users_by_parish"] == {"St. Ann": 1}
+
+    def test_profile_update_counted(self, client, auth_headers, db_session, test_user):
+        """Test changing parish via PUT /me moves the user between parishes"""
+        client.put(f"{settings.API_V1_STR}/users/users/me", json={"parish": "St. Thomas"}, headers=auth_headers)
+        assert stats.get_summary(db_session)["users_by_parish"] == {"St. Thomas": 1}
+
+    def test_concurrent_profile_updates_keep_counts(self, client, auth_headers, db_session, test_user,
+                                                    session_factory):
+        """Test an update racing another one moves the user from the parish it really left"""
+        # Another request moves the user to St. Mary after this session loaded the row
+        other = session_factory()
+        other.get(User, test_user.id).parish = "St. Mary"
+        other.execute(update(User).where(User.id == test_user.id).values(version=User.version + 1))
+        other.commit()
+        other.close()
+        assert test_user.parish == "St. Andrew"  # stale in the request's session
+
+        response = client.put(f"{settings.API_V1_STR}/users/users/me", json={"parish": "St. Thomas"},
+                              headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert stats.get_summary(db_session)["users_by_parish"] == {"St. Thomas": 1}
+
+    def test_delete_job_counted(self, db_session, test_user, session_factory):
+        """Test the background user deletion decrements counters"""
+        enqueue(db_session, "users.delete", {"user_id": test_user.id})
+        run_pending(session_factory)
+        assert counters(db_session) == {}
+
+    def test_listings_counted(self, client, auth_headers, db_session, test_user):
+        """Test creating and deleting listings moves the listing counters"""
+        listings_url = f"{settings.API_V1_STR}/listings"
+        chair = client.post(listings_url, json={"title": "Chair"}, headers=auth_headers).json()
+        client.post(listings_url, json={"title": "Lamp", "parish": "St. Mary"}, headers=auth_headers)
+        summary = stats.get_summary(db_session, days=1)
+        assert summary["listings_total"] == 2
+        assert summary["listings_by_parish"] == {"St. Andrew": 1, "St. Mary": 1}
+        assert summary["listings_per_day"][-1]["count"] == 2
+
+        client.delete(f"{listings_url}/{chair['id']}", headers=auth_headers)
+        summary = stats.get_summary(db_session, days=1)
+        assert summary["listings_total"] == 1
+        assert summary["listings_by_parish"] == {"St. Mary": 1}
+
+    def test_delete_job_counts_listings(self, client, auth_headers, db_session, test_user, session_factory,
+                                        monkeypatch):
+        """Test the background user deletion also takes the user's listings off the counters, in one update"""
+        from app.jobs import tasks
+
+        for title in ("Chair", "Lamp"):
+            client.post(f"{settings.API_V1_STR}/listings", json={"title": title}, headers=auth_headers)
+        adjusted = []
+        adjust = tasks.adjust_counters
+
+        def counting_adjust(connection, deltas):
+            adjusted.append(dict(deltas))
+            adjust(connection, deltas)
+
+        monkeypatch.setattr(tasks, "adjust_counters", counting_adjust)
+        enqueue(db_session, "users.delete", {"user_id": test_user.id})
+        run_pending(session_factory)
+        assert counters(db_session) == {}
+        assert len(adjusted) == 1
+        assert adjusted[0][("listings.total", "")] == -2
+
+
+class TestRebuild:
+    """Test recomputing counters from scratch"""
+
+    def test_rebuild_repairs_drift(self, client, auth_headers, db_session, test_user, test_admin):
+        """Test rebuild restores counters after they are corrupted"""
+        client.post(f"{settings.API_V1_STR}/listings", json={"title": "Chair"}, headers=auth_headers)
+        expected = counters(db_session)
+        assert expected[("listings.by_parish", "St. Andrew")] == 1
+        db_session.query(StatCounter).update({StatCounter.value: 42})
+        db_session.commit()
+
+        stats.rebuild(db_session)
+        assert counters(db_session) == expected
+
+    def test_rebuild_counts_signup_days(self, db_session):
+        """Test signups are grouped by creation date"""
+        db_session.add(User(email="old@example.com", hashed_password="x", created_at=datetime(2024, 1, 2, 9)))
+        db_session.commit()
+        db_session.query(StatCounter).delete()
+        db_session.commit()
+
+        stats.rebuild(db_session)
+        assert counters(db_session)[("users.signups", "2024-01-02")] == 1
+
+
+class TestStatsEndpoint:
+    """Test the admin statistics endpoint"""
+
+    def test_stats_requires_admin(self, client, auth_headers):
+        """Test regular users are refused"""
+        assert client.get(STATS_URL, headers=auth_headers).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_stats_summary(self, client, admin_headers, test_user):
+        """Test admins get totals and a day-by-day signup series"""
+        response = client.get(f"{STATS_URL}?days=7", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["users_total"] == 2
+        assert body["admins"] == 1
+        assert len(body["signups_per_day"]) == 7
+        assert body["signups_per_day"][-1] == {
+            "date": datetime.now(UTC).date().isoformat(),
+            "count": 2,
+        }
@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import io
+import time
+import pytest
+from fastapi import status
+
+from app.core.config import settings
+from app.core.s3 import HASH_CHUNK_SIZE, hash_file, generate_content_key, release_image
+from app.core.storage import (
+    LocalStorage,
+    S3Storage,
+    get_storage,
+    store_image,
+    sign_local_url,
+    verify_local_url,
+)
+from app.models.image import Image, StoredObject
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request):
+    """Run a test against each storage backend"""
+    if request.param == "s3":
+        pytest.importorskip("moto.server")
+        request.getfixturevalue("s3_settings")
+        return get_storage()
+    return request.getfixturevalue("local_storage")
+
+
+def run(coro):
+    from app.core import s3_async
+
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await s3_async.close_s3_client()
+    return asyncio.run(wrapper())
+
+
+class TestGetStorage:
+    """Test backend selection"""
+
+    def test_local_backend_selected(self, local_storage):
+        """Test STORAGE_BACKEND=local returns a LocalStorage"""
+        assert isinstance(get_storage(), LocalStorage)
+
+    def test_s3_backend_selected(self, monkeypatch):
+        """Test STORAGE_BACKEND=s3 returns an S3Storage"""
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+        assert isinstance(get_storage(), S3Storage)
+
+    def test_unknown_backend(self, monkeypatch):
+        """Test an unknown backend name is rejected"""
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "floppy")
+        with pytest.raises(ValueError):
+            get_storage()
+
+
+class TestStorageBackends:
+    """Test the operations shared by all backends"""
+
+    def test_save_and_head(self, storage):
+        """Test saved objects report size and content type"""
+        run(storage.save("a/b.png", io.BytesIO(b"12345"), "image/png"))
+        info = run(storage.head("a/b.png"))
+        assert info.size == 5
+        assert info.content_type == "image/png"
+
+    def test_head_missing(self, storage):
+        """Test head returns None for missing objects"""
+        assert run(storage.head("missing/key")) is None
+
+    def test_delete(self, storage):
+        """Test deleted objects are gone and deleting twice is fine"""
+        run(storage.save("gone.png", io.BytesIO(b"x"), "image/png"))
+        run(storage.delete("gone.png"))
+        run(storage.delete("gone.png"))
+        assert run(storage.head("gone.png")) is None
+
+    def test_delete_many(self, storage):
+        """Test bulk deletion removes every key"""
+        keys = [f"bulk/{i}.png" for i in range(3)]
+        for key in keys:
+            run(storage.save(key, io.BytesIO(b"x"), "image/png"))
+        run(storage.delete_many(keys))
+        assert all(run(storage.head(key)) is None for key in keys)
+
+
+class TestLocalStorage:
+    """Test local-disk specifics"""
+
+    def test_key_cannot_escape_root(self, local_storage):
+        """Test keys with .. are rejected"""
+        with pytest.raises(ValueError):
+            local_storage.path_for("../outside")
+
+    def test_signed_download_url(self, local_storage):
+        """Test download URLs carry a verifiable signature"""
+        url = run(local_storage.download_url("k.png", expires_in=60))
+        assert url.startswith(f"{settings.API_V1_STR}/images/files/k.png?")
+
+    def test_verify_local_url(self):
+        """Test signatures are bound to key and expiry"""
+        expires = int(time.time()) + 60
+        signature = sign_local_url("k", expires)
+        assert verify_local_url("k", expires, signature)
+        assert not verify_local_url("other", expires, signature)
+        assert not verify_local_url("k", expires + 1, signature)
+        assert not verify_local_url("k", int(time.time()) - 1, sign_local_url("k", int(time.time()) - 1))
+
+
+class TestImageDeduplication:
+    """Test content-addressed storage and reference counting"""
+
+    def upload(self, db_session, data):
+        return run(store_image(db_session, io.BytesIO(data), "image/png"))
+
+    def delete(self, db_session, image_id):
+        """Delete an image as the route and its job do. Returns True if the object was removed."""
+        key = release_image(db_session, db_session.get(Image, image_id))
+        db_session.commit()
+        if key is None:
+            return False
+        run(get_storage().delete(key))
+        return True
+
+    def test_hash_file_streams_and_rewinds(self):
+        """Test hash_file returns digest and size and rewinds the file"""
+        data = b"x" * (HASH_CHUNK_SIZE + 10)
+        file_obj = io.BytesIO(data)
+
+        digest, size = hash_file(file_obj)
+
+        assert digest == hashlib.sha256(data).hexdigest()
+        assert size == len(data)
+        assert file_obj.tell() == 0
+
+    def test_identical_content_shares_object(self, storage, db_session):
+        """Test the same bytes map to one object with two references"""
+        first = self.upload(db_session, b"same-bytes")
+        second = self.upload(db_session, b"same-bytes")
+
+        assert first.id != second.id
+        assert first.s3_key == second.s3_key
+        assert first.s3_key.startswith(generate_content_key(first.content_hash).rsplit("/", 1)[0] + "/")
+        assert db_session.get(StoredObject, first.content_hash).ref_count == 2
+
+    def test_no_transaction_during_upload(self, local_storage, db_session, monkeypatch):
+        """Test new content is uploaded with no transaction (or write lock) held"""
+        in_transaction = []
+        save = local_storage.save
+
+        async def tracking_save(key, file_obj, content_type):
+            in_transaction.append(db_session.in_transaction())
+            await save(key, file_obj, content_type)
+
+        monkeypatch.setattr(local_storage, "save", tracking_save)
+        self.upload(db_session, b"new-bytes")
+        assert in_transaction == [False]
+
+    def test_different_content_separate_objects(self, local_storage, db_session):
+        """Test different bytes are stored separately"""
+        first = self.upload(db_session, b"one")
+        second = self.upload(db_session, b"two")
+        assert first.s3_key != second.s3_key
+
+    def test_delete_keeps_shared_object(self, storage, db_session):
+        """Test the object survives until the last reference is deleted"""
+        first = self.upload(db_session, b"shared")
+        second = self.upload(db_session, b"shared")
+        key, content_hash = first.s3_key, first.content_hash
+
+        assert self.delete(db_session, first.id) is False
+        assert run(storage.head(key)) is not None
+        assert db_session.get(StoredObject, content_hash).ref_count == 1
+
+        assert self.delete(db_session, second.id) is True
+        assert run(storage.head(key)) is None
+        assert db_session.get(StoredObject, content_hash) is None
+
+    def test_reupload_after_delete(self, local_storage, db_session):
+        """Test content can be stored again after its object was removed"""
+        image = self.upload(db_session, b"again")
+        self.delete(db_session, image.id)
+
+        again = self.upload(db_session, b"again")
+        assert again.s3_key != image.s3_key
+        assert run(local_storage.head(again.s3_key)) is not None
+        assert db_session.get(StoredObject, again.content_hash).ref_count == 1
+
+
+class TestLocalFileRoutes:
+    """Test serving and direct uploads with the local backend"""
+
+    def test_files_route_hidden_for_s3(self, client, monkeypatch):
+        """Test the local file routes 404 when using S3"""
+        monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+        response = client.get(f"{settings.API_V1_STR}/images/files/any.png")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_download_requires_signature(self, client, local_storage):
+        """Test unsigned downloads are refused"""
+        run(local_storage.save("k.png", io.BytesIO(b"data"), "image/png"))
+        response = client.get(f"{settings.API_V1_STR}/images/files/k.png")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_download_full_and_range(self, client, local_storage):
+        """Test signed downloads return the file and honour Range"""
+        run(local_storage.save("k.png", io.BytesIO(b"0123456789"), "image/png"))
+        url = run(local_storage.download_url("k.png"))
+
+        full = client.get(url)
+        assert full.status_code == status.HTTP_200_OK
+        assert full.content == b"0123456789"
+        assert full.headers["content-type"] == "image/png"
+
+        partial = client.get(url, headers={"Range": "bytes=2-5"})
+        assert partial.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert partial.content == b"2345"
+
+    def test_direct_upload_flow(self, client, auth_headers, test_user, local_storage):
+        """Test the presigned flow works end to end without S3"""
+        presigned = client.post(
+            f"{settings.API_V1_STR}/images/uploads",
+            json={"filename": "photo.png", "content_type": "image/png"},
+            headers=auth_headers,
+        ).json()
+
+        upload = client.post(
+            presigned["url"],
+            data=presigned["fields"],
+            files={"file": ("photo.png", b"local-bytes", "image/png")},
+        )
+        assert upload.status_code == status.HTTP_204_NO_CONTENT
+
+        response = client.post(
+            f"{settings.API_V1_STR}/images/uploads/complete",
+            json={"upload_token": presigned["upload_token"]},
+            headers=auth_headers,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["size"] == len(b"local-bytes")
+
+    def test_direct_upload_wrong_content_type(self, client, auth_headers, local_storage):
+        """Test the local upload target enforces the policy"""
+        presigned = client.post(
+            f"{settings.API_V1_STR}/images/uploads",
+            json={"filename": "photo.png", "content_type": "image/png"},
+            headers=auth_headers,
+        ).json()
+        fields = {**presigned["fields"], "Content-Type": "text/html"}
+
+        upload = client.post(presigned["url"], data=fields, files={"file": ("x", b"<script>", "text/html")})
+        assert upload.status_code == status.HTTP_400_BAD_REQUEST
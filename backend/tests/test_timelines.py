@@ -0,0 +1,114 @@
+from sqlalchemy import func, select
+
+from app.core import timelines
+from app.core.config import settings
+from app.models.listing import TimelineEntry
+from app.jobs.queue import run_pending
+
+
+def create(client, headers, title, **fields):
+    response = client.post("/api/listings", json={"title": title, **fields}, headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestListingRoutes:
+    """Tests for creating and deleting listings"""
+
+    def test_create_defaults_to_owner_parish(self, client, auth_headers, test_user):
+        """Test a listing without a parish goes to the owner's parish"""
+        listing = create(client, auth_headers, "Bicycle", price=15000)
+        assert listing["parish"] == "St. Andrew"
+        assert listing["owner_id"] == test_user.id
+
+    def test_create_requires_auth(self, client):
+        """Test anonymous users can't create listings"""
+        assert client.post("/api/listings", json={"title": "Bicycle"}).status_code == 401
+
+    def test_delete_removes_from_feed(self, client, auth_headers):
+        """Test deleted listings disappear from every timeline"""
+        listing = create(client, auth_headers, "Bicycle")
+        assert client.delete(f"/api/listings/{listing['id']}", headers=auth_headers).status_code == 204
+        assert client.get("/api/listings/feed", headers=auth_headers).json()["items"] == []
+        assert client.get("/api/listings/feed?all=true", headers=auth_headers).json()["items"] == []
+
+    def test_delete_other_users_listing_forbidden(self, client, auth_headers, admin_headers):
+        """Test only the owner or an admin can delete"""
+        listing = create(client, admin_headers, "Lamp")
+        assert client.delete(f"/api/listings/{listing['id']}", headers=auth_headers).status_code == 403
+        assert client.delete(f"/api/listings/{listing['id']}", headers=admin_headers).status_code == 204
+
+
+class TestFeed:
+    """Tests for reading parish timelines"""
+
+    def test_feed_is_per_parish(self, client, auth_headers, admin_headers):
+        """Test the feed shows the user's parish, newest first"""
+        create(client, auth_headers, "Old chair")
+        create(client, admin_headers, "James lamp")
+        create(client, auth_headers, "New chair")
+
+        titles = [item["title"] for item in client.get("/api/listings/feed", headers=auth_headers).json()["items"]]
+        assert titles == ["New chair", "Old chair"]
+
+        response = client.get("/api/listings/feed?parish=St.%20James", headers=auth_headers)
+        assert [item["title"] for item in response.json()["items"]] == ["James lamp"]
+
+        response = client.get("/api/listings/feed?all=true", headers=auth_headers)
+        assert len(response.json()["items"]) == 3
+
+    def test_keyset_paging(self, client, auth_headers):
+        """Test paging with next_before visits every listing once"""
+        ids = [create(client, auth_headers, f"item {i}")["id"] for i in range(5)]
+
+        seen = []
+        url = "/api/listings/feed?limit=2"
+        while True:
+            page = client.get(url, headers=auth_headers).json()
+            seen.extend(item["id"] for item in page["items"])
+            if page["next_before"] is None:
+                break
+            url = f"/api/listings/feed?limit=2&before={page['next_before']}"
+        assert seen == sorted(ids, reverse=True)
+
+    def test_timelines_are_capped(self, client, auth_headers, db_session, monkeypatch):
+        """Test each timeline keeps only the newest TIMELINE_MAX_ENTRIES"""
+        monkeypatch.setattr(settings, "TIMELINE_MAX_ENTRIES", 3)
+        ids = [create(client, auth_headers, f"item {i}")["id"] for i in range(5)]
+
+        entries = db_session.scalars(
+            select(TimelineEntry.listing_id).where(TimelineEntry.parish == "St. Andrew")
+        ).all()
+        assert sorted(entries) == ids[-3:]
+
+
+class TestTimelineMaintenance:
+    """Tests for rebuilding timelines and cleaning up after users"""
+
+    def test_rebuild_restores_timelines(self, client, auth_headers, admin_headers, db_session):
+        """Test rebuild recomputes every timeline from the listings table"""
+        create(client, auth_headers, "Chair")
+        create(client, admin_headers, "Lamp")
+        db_session.query(TimelineEntry).delete()
+        db_session.commit()
+
+        assert timelines.rebuild(db_session) == 4
+        response = client.get("/api/listings/feed", headers=auth_headers)
+        assert [item["title"] for item in response.json()["items"]] == ["Chair"]
+
+    def test_rebuild_one_parish(self, client, auth_headers, admin_headers, db_session):
+        """Test rebuilding one parish leaves the others alone"""
+        create(client, auth_headers, "Chair")
+        create(client, admin_headers, "Lamp")
+
+        assert timelines.rebuild(db_session, "St. Andrew") == 3
+        assert db_session.scalar(select(func.count()).select_from(TimelineEntry)) == 4
+
+    def test_user_deletion_removes_listings(self, client, auth_headers, admin_headers, test_user, session_factory):
+        """Test the users.delete job removes the user's listings from the feed"""
+        create(client, auth_headers, "Chair")
+        client.delete(f"/api/users/users/{test_user.id}", headers=admin_headers)
+        run_pending(session_factory)
+
+        response = client.get("/api/listings/feed?all=true", headers=admin_headers)
+        assert response.json()["items"] == []
@@ -0,0 +1,123 @@
+import time
+import pytest
+from jose import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from app.auth.tokens import ExpiredTokenError, TokenError, TokenService, b64encode
+
+
+def pem_pair(algorithm):
+    key = ed25519.Ed25519PrivateKey.generate() if algorithm == "EdDSA" else ec.generate_private_key(ec.SECP256R1())
+    private = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    return private, public
+
+
+class TestTokenService:
+    """Tests for signing and verifying tokens"""
+
+    @pytest.mark.parametrize("algorithm", ["HS256", "ES256", "EdDSA"])
+    def test_round_trip(self, algorithm):
+        """Test encoded claims come back from decode"""
+        if algorithm == "HS256":
+            service = TokenService(algorithm, secret="s3cret")
+        else:
+            service = TokenService(algorithm, private_key_pem=pem_pair(algorithm)[0])
+        token = service.encode({"sub": "7", "exp": time.time() + 60})
+        assert service.decode(token)["sub"] == "7"
+
+    @pytest.mark.parametrize("algorithm", ["ES256", "EdDSA"])
+    def test_public_key_only_verifies(self, algorithm):
+        """Test a service holding only the public key verifies but can't sign"""
+        private, public = pem_pair(algorithm)
+        token = TokenService(algorithm, private_key_pem=private).encode({"sub": "1"})
+        verifier = TokenService(algorithm, public_key_pem=public)
+        assert verifier.decode(token) == {"sub": "1"}
+        assert not verifier.can_sign
+        with pytest.raises(TokenError):
+            verifier.encode({"sub": "1"})
+
+    def test_expired(self):
+        """Test expired tokens raise ExpiredTokenError"""
+        service = TokenService("HS256", secret="s3cret")
+        with pytest.raises(ExpiredTokenError):
+            service.decode(service.encode({"sub": "1", "exp": time.time() - 1}))
+
+    def test_not_before(self):
+        """Test tokens aren't accepted before nbf"""
+        service = TokenService("HS256", secret="s3cret")
+        with pytest.raises(TokenError):
+            service.decode(service.encode({"sub": "1", "nbf": time.time() + 60}))
+
+    def test_tampered_payload(self):
+        """Test a modified payload fails the signature check"""
+        service = TokenService("HS256", secret="s3cret")
+        header, _, signature = service.encode({"sub": "1"}).split(".")
+        payload = b64encode(b'{"sub":"2"}').decode()
+        forged = f"{header}.{payload}.{signature}"
+        with pytest.raises(TokenError):
+            service.decode(forged)
+
+    def test_wrong_secret(self):
+        """Test tokens signed with another secret are rejected"""
+        token = TokenService("HS256", secret="other").encode({"sub": "1"})
+        with pytest.raises(TokenError):
+            TokenService("HS256", secret="s3cret").decode(token)
+
+    @pytest.mark.parametrize("token", ["", "abc", "a.b", "a.b.c.d", "é.b.c"])
+    def test_malformed(self, token):
+        """Test malformed tokens raise TokenError"""
+        with pytest.raises(TokenError):
+            TokenService("HS256", secret="s3cret").decode(token)
+
+    def test_rejects_other_algorithms(self):
+        """Test the token's header can't choose the algorithm"""
+        private, public = pem_pair("ES256")
+        service = TokenService("ES256", public_key_pem=public)
+        # HMAC signed with the public key, a classic key confusion attack
+        forged = TokenService("HS256", secret=public).encode({"sub": "1"})
+        with pytest.raises(TokenError):
+            service.decode(forged)
+        none_header = b64encode(b'{"alg":"none"}').decode()
+        unsigned = f"{none_header}.{b64encode(b'{}').decode()}."
+        with pytest.raises(TokenError):
+            service.decode(unsigned)
+
+    def test_interoperates_with_jose(self):
+        """Test tokens are standard JWTs in both directions"""
+        service = TokenService("HS256", secret="s3cret")
+        assert jwt.decode(service.encode({"sub": "1"}), "s3cret", algorithms=["HS256"]) == {"sub": "1"}
+        assert service.decode(jwt.encode({"sub": "2"}, "s3cret", algorithm="HS256")) == {"sub": "2"}
+
+        private, public = pem_pair("ES256")
+        token = TokenService("ES256", private_key_pem=private).encode({"sub": "3"})
+        assert jwt.decode(token, public, algorithms=["ES256"]) == {"sub": "3"}
+
+    def test_key_type_mismatch(self):
+        """Test configuring a key for the wrong algorithm fails early"""
+        with pytest.raises(ValueError):
+            TokenService("EdDSA", private_key_pem=pem_pair("ES256")[0])
+        with pytest.raises(ValueError):
+            TokenService("RS256", secret="s3cret")
+
+    def test_jwks(self):
+        """Test the public key is published as a JWK"""
+        private, _ = pem_pair("EdDSA")
+        keys = TokenService("EdDSA", private_key_pem=private, key_id="k1").jwks()["keys"]
+        assert keys[0]["kty"] == "OKP" and keys[0]["kid"] == "k1" and "d" not in keys[0]
+        assert TokenService("HS256", secret="s3cret").jwks() == {"keys": []}
+
+
+class TestJwksEndpoint:
+    """Tests for /.well-known/jwks.json"""
+
+    def test_hmac_has_no_public_keys(self, client):
+        """Test the default HMAC setup publishes no keys"""
+        response = client.get("/.well-known/jwks.json")
+        assert response.status_code == 200
+        assert response.json() == {"keys": []}